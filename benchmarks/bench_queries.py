@@ -0,0 +1,175 @@
+# benchmarks/bench_queries.py
+"""Бенчмарк запросов по записям на синтетическом расписании.
+
+Сравнивает построчный обход (как делали iterrows и str.contains по 40
+колонкам) с матрицей seat_codes из ScheduleIndex и проверяет, что ответы
+совпадают. Также сравнивает память прежнего снимка (строки листа, словари
+get_all_records(), списки мест каждой строки и записи каждого пользователя)
+с ScheduleIndex.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_queries.py --rows 20000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from schedule import SEAT_COLUMNS, ScheduleIndex, UserBooking, parse_student, week_key  # noqa: E402
+
+TARIFFS = ["Базовый", "Основной", "Тренинг"]
+HEADER = ['Тариф', 'Неделя', 'Дата', 'Время', 'Статус', 'Наставник'] + SEAT_COLUMNS
+
+
+def synthetic_records(rows: int, users: int, seed: int = 1):
+    """Записи листа 'Расписание': rows строк, места заняты случайными из users пользователей"""
+    rnd = random.Random(seed)
+    start = date(2025, 1, 6)
+    records = []
+    for i in range(rows):
+        tariff = rnd.choice(TARIFFS)
+        seats = 40 if tariff == "Тренинг" else (4 if tariff == "Базовый" else 3)
+        day = start + timedelta(days=i // 20)
+        record = {
+            'Тариф': tariff,
+            'Неделя': str(i // 140 + 1),
+            'Дата': day.isoformat(),
+            'Время': f"{10 + i % 8}:00",
+            'Статус': rnd.choice(["Активно", "активно", "закрыто"]),
+            'Наставник': "Наставник",
+        }
+        for col_num, col in enumerate(SEAT_COLUMNS, start=1):
+            if col_num <= seats and rnd.random() < 0.6:
+                user_id = rnd.randrange(1, users)
+                record[col] = f"{user_id}|Студент {user_id}|@user{user_id}"
+            else:
+                record[col] = ""
+        records.append(record)
+    return records
+
+
+def sheet_values(records):
+    """Записи → строки листа, как их отдает values_batch_get (первая - заголовки)"""
+    return [list(HEADER)] + [[record[col] for col in HEADER] for record in records]
+
+
+def fresh_copy(values):
+    """Копия строк листа с новыми объектами str, как после загрузки из API"""
+    return [[''.join(cell) for cell in row] for row in values]
+
+
+def raw_snapshot(values):
+    """Прежний снимок: строки листа, словари get_all_records(), места строк и записи пользователей"""
+    records = [dict(zip(values[0], row)) for row in values[1:]]
+    seats = [[str(record.get(col, '')).strip() for col in SEAT_COLUMNS] for record in records]
+    bookings = {}
+    for row_index, (record, cells) in enumerate(zip(records, seats), start=2):
+        for seat_num, cell in enumerate(cells, start=1):
+            student = parse_student(cell)
+            if student:
+                bookings.setdefault(student[0], []).append(
+                    UserBooking(row_index, week_key(record['Неделя']), record['Тариф'], seat_num)
+                )
+    return values, records, seats, bookings
+
+
+def retained_mb(build):
+    """Сколько памяти удерживает результат build()"""
+    tracemalloc.start()
+    result = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return size / 2 ** 20
+
+
+def rowwise_rows_with_user(records, user_id):
+    found = []
+    for row_index, record in enumerate(records, start=2):
+        for col in SEAT_COLUMNS:
+            student = parse_student(str(record.get(col, '')).strip())
+            if student and student[0] == user_id:
+                found.append(row_index)
+                break
+    return found
+
+
+def rowwise_booked_on_date(records, user_id, date_str):
+    rows = set(rowwise_rows_with_user(records, user_id))
+    return any(
+        row_index in rows and str(record['Дата']).split()[0] == date_str
+        for row_index, record in enumerate(records, start=2)
+    )
+
+
+def rowwise_nearest_week(index, tariff):
+    weeks = [
+        row.week for row in index.rows.values()
+        if row.tariff == tariff and row.status == "активно" and row.booked < row.max_seats and row.week is not None
+    ]
+    return min(weeks) if weeks else None
+
+
+def timed(func, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return result, (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=20)
+    args = parser.parse_args()
+
+    records = synthetic_records(args.rows, args.users)
+    values = sheet_values(records)
+    index, build_ms = timed(lambda: ScheduleIndex(values), 1)
+    print(f"Строк: {args.rows}, построение индекса: {build_ms:.1f} мс")
+
+    raw_mb = retained_mb(lambda: raw_snapshot(fresh_copy(values)))
+    index_mb = retained_mb(lambda: ScheduleIndex(fresh_copy(values)))
+    print(
+        f"Память снимка: прежний (строки, словари, места, записи) {raw_mb:.1f} МБ, "
+        f"ScheduleIndex {index_mb:.1f} МБ ({raw_mb / index_mb:.1f}x)"
+    )
+
+    rnd = random.Random(2)
+    user_ids = [rnd.randrange(1, args.users) for _ in range(args.queries)]
+    dates = [records[rnd.randrange(args.rows)]['Дата'] for _ in range(args.queries)]
+
+    cases = [
+        (
+            "строки пользователя",
+            lambda: [rowwise_rows_with_user(records, u) for u in user_ids],
+            lambda: [list(index.rows_with_user(u)) for u in user_ids],
+        ),
+        (
+            "запись на дату",
+            lambda: [rowwise_booked_on_date(records, u, d) for u, d in zip(user_ids, dates)],
+            lambda: [index.is_booked_on_date(u, d) for u, d in zip(user_ids, dates)],
+        ),
+        (
+            "ближайшая неделя",
+            lambda: [rowwise_nearest_week(index, t) for t in TARIFFS],
+            lambda: [index.nearest_week(t) for t in TARIFFS],
+        ),
+    ]
+
+    print(f"{'запрос':<22}{'построчно, мс':>16}{'массивы, мс':>14}{'ускорение':>12}")
+    for name, rowwise, vectorized in cases:
+        expected, rowwise_ms = timed(rowwise, 1)
+        actual, vectorized_ms = timed(vectorized, 3)
+        assert expected == actual, f"{name}: ответы не совпадают"
+        print(f"{name:<22}{rowwise_ms:>16.1f}{vectorized_ms:>14.2f}{rowwise_ms / vectorized_ms:>11.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+# benchmarks/bench_sheets.py
+"""Бенчмарк GoogleSheetsManager на локальной таблице без сети и ключей Google.
+
+Для каждого метода чтения и записи печатает время вызова, пик памяти и
+число запросов к API (по FakeSpreadsheet из fake_sheets.py). С --check
+завершается с кодом 1, если метод делает больше запросов к API, чем
+допускает CALL_BUDGET: время в CI шумит, а число запросов - нет.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_sheets.py --weeks 50 --slots 30 --seats 40 --check
+    python benchmarks/bench_sheets.py --latency 0.2 --json bench.json
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_startup import DUMMY_ENV  # noqa: E402
+from fake_sheets import make_spreadsheet  # noqa: E402
+
+for key, value in DUMMY_ENV.items():
+    os.environ.setdefault(key, value)
+# Квоту не ограничиваем: меряем стоимость самих методов, а не ожидание бюджета
+os.environ.setdefault("SHEETS_QUOTA_PER_MINUTE", "1000000")
+
+from gsheets import GoogleSheetsManager  # noqa: E402
+from quota import Priority  # noqa: E402
+
+# Сколько запросов к API допустимо на один вызов метода
+CALL_BUDGET = {
+    "refresh": 1,  # values_batch_get расписания и настроек
+    "book_slot": 0,  # запись принимается в журнал
+    "book_training": 0,
+    "flush_journal": 3,  # worksheet (один раз) + batch_get + batch_update
+}
+QUERY_BUDGET = 0  # чтения отвечают из снимка
+
+
+def new_manager(args) -> GoogleSheetsManager:
+    manager = GoogleSheetsManager()
+    manager.spreadsheet = make_spreadsheet(
+        args.weeks, args.slots, args.seats, current_week=args.week, latency=args.latency
+    )
+    # Снимок не устаревает за время замера - фоновые загрузки не смешиваются с вызовами
+    manager.CACHE_TTL = float("inf")
+    return manager
+
+
+def measure(manager, func, repeat: int):
+    """(мс на вызов, пик памяти КБ, запросов к API на вызов, последний результат).
+
+    Пик памяти - по первому вызову под tracemalloc, время - по остальным
+    без него (tracemalloc замедляет выделение памяти в разы).
+    """
+    spreadsheet = manager.spreadsheet
+    spreadsheet.reset_calls()
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    if repeat > 1:
+        started = time.perf_counter()
+        for _ in range(repeat - 1):
+            result = func()
+        elapsed = (time.perf_counter() - started) / (repeat - 1)
+    return elapsed * 1000, peak / 1024, spreadsheet.total_calls / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--weeks", type=int, default=50)
+    parser.add_argument("--slots", type=int, default=30, help="занятий в неделе")
+    parser.add_argument("--seats", type=int, default=40, help="мест на тренинге")
+    parser.add_argument("--week", type=int, default=1, help="текущая неделя (B3)")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка каждого запроса к API, сек")
+    parser.add_argument("--json", help="сохранить результаты в файл")
+    parser.add_argument("--check", action="store_true", help="код 1, если превышен CALL_BUDGET")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    manager = new_manager(args)
+    week = args.week
+    rows = args.weeks * args.slots
+    print(f"Таблица: {args.weeks} недель × {args.slots} занятий × до {args.seats} мест = {rows} строк")
+
+    # Первая загрузка (пользователь ждет), затем фоновые обновления снимка
+    results = [("refresh (холодный)", *measure(manager, lambda: manager.refresh(Priority.READ), 1))]
+    results.append(("refresh", *measure(manager, manager.refresh, 3)))
+
+    slots = manager.get_available_slots("Базовый", week) + manager.get_available_slots("Основной", week)
+    trainings = manager.get_available_trainings()
+    slot = slots[0]
+    slot_date = manager.get_index().rows[slot['row_index']].date_str
+    user_id = next(iter(manager.get_index().user_ids(slot['row_index'])), 1)
+
+    queries = [
+        ("get_available_tariffs", lambda: manager.get_available_tariffs()),
+        ("get_current_week_number", lambda: manager.get_current_week_number()),
+        ("get_training_week_number", lambda: manager.get_training_week_number()),
+        ("get_available_weeks", lambda: manager.get_available_weeks("Базовый")),
+        ("get_nearest_available_week", lambda: manager.get_nearest_available_week("Базовый")),
+        ("get_available_slots", lambda: manager.get_available_slots("Базовый", week)),
+        ("get_available_slots_for_user", lambda: manager.get_available_slots_for_user("Базовый", week, user_id)),
+        ("get_slots_view", lambda: manager.get_slots_view("Базовый", user_id)),
+        ("get_slot", lambda: manager.get_slot(slot['tariff'], week, slot['row_index'])),
+        ("get_user_bookings", lambda: manager.get_user_bookings(user_id, f"@user{user_id}", f"Студент {user_id}")),
+        ("is_user_already_booked", lambda: manager.is_user_already_booked(user_id, slot_date)),
+        ("can_user_book_this_week", lambda: manager.can_user_book_this_week(user_id, week)),
+        ("get_available_trainings", lambda: manager.get_available_trainings(user_id)),
+        ("get_training_details", lambda: manager.get_training_details(trainings[0]['row_index'] if trainings else 2)),
+        ("get_records", lambda: manager.get_records()),
+    ]
+    for name, func in queries:
+        results.append((name, *measure(manager, func, args.repeat)))
+
+    # Записи новыми пользователями по свободным слотам текущей недели, затем перенос в таблицу
+    next_user = iter(range(10 ** 9, 10 ** 9 + 10 ** 6))
+    slot_rows = [slot['row_index'] for slot in slots] or [2]
+    training_rows = [training['row_index'] for training in trainings] or [2]
+    booked = {"book_slot": 0, "book_training": 0}
+
+    def book(method, rows_cycle):
+        user = next(next_user)
+        ok = getattr(manager, method)(rows_cycle[user % len(rows_cycle)], user, f"Бенч {user}", f"@bench{user}")
+        booked[method] += ok
+        return ok
+
+    results.append(("book_slot", *measure(manager, lambda: book("book_slot", slot_rows), args.repeat)))
+    results.append(("book_training", *measure(manager, lambda: book("book_training", training_rows), args.repeat)))
+    results.append(("flush_journal", *measure(manager, manager.flush_journal, 1)))
+
+    print(f"{'метод':<32}{'мс/вызов':>10}{'пик, КБ':>10}{'API/вызов':>11}")
+    report = []
+    over_budget = []
+    for name, ms, peak_kb, calls, _ in results:
+        print(f"{name:<32}{ms:>10.3f}{peak_kb:>10.0f}{calls:>11.2f}")
+        budget = CALL_BUDGET.get(name.split()[0], QUERY_BUDGET)
+        report.append({"method": name, "ms": round(ms, 4), "peak_kb": round(peak_kb, 1), "api_calls": calls})
+        if calls > budget:
+            over_budget.append(f"{name}: {calls:.2f} > {budget}")
+
+    print(f"Принято записей: практики {booked['book_slot']}, тренинги {booked['book_training']}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"rows": rows, "latency": args.latency, "results": report}, f, ensure_ascii=False, indent=2)
+
+    if over_budget:
+        print("⚠️ Больше запросов к API, чем допускает CALL_BUDGET:\n  " + "\n  ".join(over_budget))
+        if args.check:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
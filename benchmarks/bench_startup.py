@@ -0,0 +1,82 @@
+# benchmarks/bench_startup.py
+"""Время холодного импорта модулей бота по python -X importtime.
+
+Импорт не должен ходить в сеть и тянуть gspread/google-auth: подключение к
+таблице выполняется в asheets.start(). Скрипт печатает самые дорогие
+импорты и завершается с кодом 1, если общее время больше --max-ms.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_startup.py --module main --max-ms 1500
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# config.py требует эти переменные; для замера импорта подойдут заглушки
+DUMMY_ENV = {
+    "BOT_TOKEN": "0:benchmark",
+    "SPREADSHEET_ID": "benchmark",
+    "GOOGLE_CREDENTIALS_JSON": "{}",
+    "JOURNAL_PATH": ":memory:",
+    "REMINDER_LEDGER_PATH": ":memory:",
+}
+LAZY_MODULES = ("gspread", "google.oauth2", "pandas")
+
+
+def parse_importtime(stderr: str):
+    """Строки 'import time: self | cumulative | name' → [(cumulative_us, name)]"""
+    result = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line.split("|", 2)
+        result.append((int(cumulative_us), name.rstrip()))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--module", default="gsheets")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--max-ms", type=float, default=0, help="порог общего времени импорта (0 - без проверки)")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    for key, value in DUMMY_ENV.items():
+        env.setdefault(key, value)
+
+    code = f"import sys, {args.module}; print(','.join(sorted(sys.modules)))"
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    wall_ms = (time.perf_counter() - started) * 1000
+    if proc.returncode != 0:
+        print(proc.stderr[-2000:])
+        sys.exit(proc.returncode)
+
+    timings = parse_importtime(proc.stderr)
+    total_ms = next((us for us, name in reversed(timings) if name.strip() == args.module), 0) / 1000
+
+    print(f"import {args.module}: {total_ms:.1f} мс (процесс целиком: {wall_ms:.0f} мс)")
+    print(f"{'cumulative, мс':>15}  модуль")
+    for us, name in sorted(timings, reverse=True)[:args.top]:
+        print(f"{us / 1000:>15.1f}  {name}")
+
+    loaded = set(proc.stdout.strip().split(","))
+    eager = [name for name in LAZY_MODULES if any(m == name or m.startswith(name + ".") for m in loaded)]
+    if eager:
+        print(f"⚠️ Загружены при импорте: {', '.join(eager)}")
+
+    if args.max_ms and total_ms > args.max_ms:
+        print(f"❌ Импорт дольше порога {args.max_ms:.0f} мс")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
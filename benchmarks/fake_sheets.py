@@ -0,0 +1,228 @@
+# benchmarks/fake_sheets.py
+"""Локальная замена gspread Spreadsheet/Worksheet для бенчмарков без сети.
+
+Поддерживает то, чем пользуется GoogleSheetsManager (values_batch_get,
+worksheet, get, batch_get, batch_update), и привычные методы gspread:
+get_all_values, get_all_records, cell, row_values, update_cell. Каждый
+вызов считается как один запрос к API (FakeSpreadsheet.calls) и может
+ждать latency секунд, как сетевой запрос. Значения отдаются так же, как
+их отдает API: строками и без пустых ячеек в конце строки.
+"""
+import random
+import re
+import time
+from collections import Counter
+from datetime import date, timedelta
+from typing import Dict, List, NamedTuple
+
+HEADER = ['Тариф', 'Неделя', 'Дата', 'Время', 'Статус', 'Наставник'] + [f"Студент{i}" for i in range(1, 41)]
+PRACTICE_SEATS = {"Базовый": 4, "Основной": 3}
+
+_A1 = re.compile(r"^([A-Z]*)(\d*)$")
+
+
+class FakeResponse(NamedTuple):
+    status_code: int
+
+
+class FakeAPIError(Exception):
+    """Ошибка API с response.status_code, как gspread.exceptions.APIError"""
+
+    def __init__(self, status_code: int):
+        super().__init__(f"Fake API error {status_code}")
+        self.response = FakeResponse(status_code)
+
+
+class FakeCell(NamedTuple):
+    row: int
+    col: int
+    value: str
+
+
+def _parse_a1(label: str):
+    """'G5' → (5, 7); 'G' → (None, 7); '5' → (5, None)"""
+    letters, digits = _A1.match(label.upper()).groups()
+    col = 0
+    for ch in letters:
+        col = col * 26 + ord(ch) - ord("A") + 1
+    return (int(digits) if digits else None), (col or None)
+
+
+def _trim(row: list) -> list:
+    row = list(row)
+    while row and row[-1] == "":
+        row.pop()
+    return row
+
+
+class FakeWorksheet:
+    def __init__(self, spreadsheet: "FakeSpreadsheet", title: str, values: List[List[str]]):
+        self.spreadsheet = spreadsheet
+        self.title = title
+        self.values = [[str(value) for value in row] for row in values]
+
+    def _range(self, name: str) -> List[List[str]]:
+        """Значения диапазона 'A2:AT2' / 'A:F' / 'B3' без обращения к счетчику"""
+        start, _, end = name.partition(":")
+        row1, col1 = _parse_a1(start)
+        row2, col2 = _parse_a1(end) if end else (row1, col1)
+        row1, col1 = row1 or 1, col1 or 1
+        row2 = row2 or len(self.values)
+        result = []
+        for row in self.values[row1 - 1:row2]:
+            result.append(_trim(row[col1 - 1:col2] if col2 else row[col1 - 1:]))
+        while result and not result[-1]:
+            result.pop()
+        return result
+
+    def _set(self, row: int, col: int, value):
+        while len(self.values) < row:
+            self.values.append([])
+        cells = self.values[row - 1]
+        while len(cells) < col:
+            cells.append("")
+        cells[col - 1] = str(value)
+
+    def get_all_values(self) -> List[List[str]]:
+        self.spreadsheet._call("get_all_values")
+        width = max((len(row) for row in self.values), default=0)
+        return [row + [""] * (width - len(row)) for row in self.values]
+
+    def get_all_records(self) -> List[Dict[str, str]]:
+        self.spreadsheet._call("get_all_records")
+        if not self.values:
+            return []
+        header = self.values[0]
+        return [dict(zip(header, row + [""] * (len(header) - len(row)))) for row in self.values[1:]]
+
+    def get(self, range_name: str) -> List[List[str]]:
+        self.spreadsheet._call("get")
+        return self._range(range_name)
+
+    def batch_get(self, ranges: List[str]) -> List[List[List[str]]]:
+        self.spreadsheet._call("batch_get")
+        return [self._range(name) for name in ranges]
+
+    def cell(self, row: int, col: int) -> FakeCell:
+        self.spreadsheet._call("cell")
+        try:
+            value = self.values[row - 1][col - 1]
+        except IndexError:
+            value = ""
+        return FakeCell(row, col, value)
+
+    def row_values(self, row: int) -> List[str]:
+        self.spreadsheet._call("row_values")
+        return _trim(self.values[row - 1]) if row <= len(self.values) else []
+
+    def update_cell(self, row: int, col: int, value):
+        self.spreadsheet._call("update_cell")
+        self._set(row, col, value)
+
+    def batch_update(self, data: List[dict], raw: bool = True):
+        self.spreadsheet._call("batch_update")
+        for update in data:
+            row, col = _parse_a1(update['range'].split(":")[0])
+            for i, values in enumerate(update['values']):
+                for j, value in enumerate(values):
+                    self._set(row + i, col + j, value)
+
+
+class FakeSpreadsheet:
+    """Таблица из листов в памяти со счетчиком запросов к API.
+
+    latency - задержка каждого запроса (сек); error_every - каждый N-й
+    запрос падает с error_status (например, 429), чтобы проверить повторы.
+    """
+
+    def __init__(self, sheets: Dict[str, List[List[str]]], latency: float = 0.0,
+                 error_every: int = 0, error_status: int = 429):
+        self.latency = latency
+        self.error_every = error_every
+        self.error_status = error_status
+        self.calls = Counter()
+        self._worksheets = {title: FakeWorksheet(self, title, values) for title, values in sheets.items()}
+
+    def _call(self, method: str):
+        self.calls[method] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.error_every and sum(self.calls.values()) % self.error_every == 0:
+            raise FakeAPIError(self.error_status)
+
+    @property
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+    def reset_calls(self):
+        self.calls.clear()
+
+    def worksheet(self, title: str) -> FakeWorksheet:
+        self._call("worksheet")
+        return self._worksheets[title]
+
+    def values_batch_get(self, ranges: List[str]) -> dict:
+        self._call("values_batch_get")
+        value_ranges = []
+        for name in ranges:
+            title, _, cells = name.partition("!")
+            worksheet = self._worksheets[title.strip("'")]
+            values = worksheet._range(cells) if cells else [_trim(row) for row in worksheet.values]
+            value_ranges.append({'range': name, 'majorDimension': 'ROWS', 'values': values})
+        return {'valueRanges': value_ranges}
+
+
+def synthetic_schedule(weeks: int = 50, slots_per_week: int = 30, seats: int = 40, fill: float = 0.6,
+                       users: int = 5000, start: date = None, seed: int = 1) -> List[List[str]]:
+    """Лист 'Расписание': weeks недель по slots_per_week занятий, у тренингов seats мест.
+
+    Каждое пятое занятие недели - тренинг, остальные - практики "Базовый" и
+    "Основной" со своими лимитами. Место занято с вероятностью fill.
+    Первая неделя начинается с start (по умолчанию завтра), так что все
+    занятия - в будущем.
+    """
+    rnd = random.Random(seed)
+    start = start or date.today() + timedelta(days=1)
+    rows = [list(HEADER)]
+    for week in range(1, weeks + 1):
+        for slot in range(slots_per_week):
+            if slot % 5 == 4:
+                tariff, capacity = "Тренинг", seats
+            else:
+                tariff = "Базовый" if slot % 2 else "Основной"
+                capacity = PRACTICE_SEATS[tariff]
+            day = start + timedelta(days=(week - 1) * 7 + slot * 7 // slots_per_week)
+            status = "закрыто" if rnd.random() < 0.05 else "активно"
+            students = []
+            for _ in range(capacity):
+                if rnd.random() < fill:
+                    user_id = rnd.randrange(1, users)
+                    students.append(f"{user_id}|Студент {user_id}|@user{user_id}")
+                else:
+                    students.append("")
+            rows.append(_trim([
+                tariff, str(week), day.isoformat(), f"{10 + slot % 10}:00", status, "Наставник"
+            ] + students))
+    return rows
+
+
+def synthetic_settings(current_week: int = 1, training_week: int = None) -> List[List[str]]:
+    """Лист 'Настройки': B3 - текущая неделя практик, B4 - неделя тренингов"""
+    return [
+        ["Параметр", "Значение"],
+        ["", ""],
+        ["Текущая неделя", str(current_week)],
+        ["Неделя тренингов", str(training_week or current_week)],
+    ]
+
+
+def make_spreadsheet(weeks: int = 50, slots_per_week: int = 30, seats: int = 40, current_week: int = 1,
+                     latency: float = 0.0, **kwargs) -> FakeSpreadsheet:
+    """Таблица с листами 'Расписание' и 'Настройки' из synthetic_schedule"""
+    return FakeSpreadsheet(
+        {
+            "Расписание": synthetic_schedule(weeks, slots_per_week, seats, **kwargs),
+            "Настройки": synthetic_settings(current_week),
+        },
+        latency=latency,
+    )
@@ -31,12 +31,85 @@ class Config:
     LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
     DEBUG = os.getenv("DEBUG", "False").lower() == "true"
 
-    # Rate limiting
+    # Rate limiting: дешевые действия и действия с таблицей (запись, мои записи), запросов в минуту и запас подряд
     MAX_REQUESTS_PER_MINUTE = int(os.getenv("MAX_REQUESTS_PER_MINUTE", "30"))
+    RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "10"))
+    EXPENSIVE_REQUESTS_PER_MINUTE = int(os.getenv("EXPENSIVE_REQUESTS_PER_MINUTE", "12"))
+    EXPENSIVE_RATE_LIMIT_BURST = int(os.getenv("EXPENSIVE_RATE_LIMIT_BURST", "4"))
 
     # Время ожидания для API
     REQUEST_TIMEOUT = int(os.getenv("REQUEST_TIMEOUT", "10"))
 
+    # Размер пула потоков для запросов к Google Sheets
+    SHEETS_MAX_WORKERS = int(os.getenv("SHEETS_MAX_WORKERS", "8"))
+    # Квота Google Sheets на сервисный аккаунт (запросов в минуту, на все процессы бота), сколько из нее
+    # недоступно фоновым загрузкам и сколько раз повторять запрос после 429/5xx
+    SHEETS_QUOTA_PER_MINUTE = int(os.getenv("SHEETS_QUOTA_PER_MINUTE", "60"))
+    SHEETS_QUOTA_RESERVE = int(os.getenv("SHEETS_QUOTA_RESERVE", "15"))
+    SHEETS_MAX_RETRIES = int(os.getenv("SHEETS_MAX_RETRIES", "5"))
+
+    # Окно (сек), за которое подтверждения записи собираются в один batch_update
+    BOOKING_BATCH_WINDOW = float(os.getenv("BOOKING_BATCH_WINDOW", "0.05"))
+
+    # Каталог локальных баз SQLite; по умолчанию - каталог бота, а не текущий каталог процесса
+    DATA_DIR = os.getenv("DATA_DIR", os.path.dirname(os.path.abspath(__file__)))
+
+    # Локальный журнал записей (SQLite) и его перенос в таблицу
+    JOURNAL_PATH = os.getenv("JOURNAL_PATH", os.path.join(DATA_DIR, "bookings.db"))
+    JOURNAL_FLUSH_INTERVAL = float(os.getenv("JOURNAL_FLUSH_INTERVAL", "5"))
+    JOURNAL_FLUSH_BATCH = int(os.getenv("JOURNAL_FLUSH_BATCH", "200"))
+    # Сколько секунд хранить перенесенные записи и как часто чистить журнал
+    JOURNAL_RETENTION = float(os.getenv("JOURNAL_RETENTION", "604800"))
+    JOURNAL_PRUNE_INTERVAL = float(os.getenv("JOURNAL_PRUNE_INTERVAL", "3600"))
+    # Чат администратора для сообщений о записях, которые не удалось перенести (пусто - не писать)
+    ADMIN_CHAT_ID = int(os.getenv("ADMIN_CHAT_ID", "0")) or None
+
+    # Период фонового обновления снимка таблицы (меньше CACHE_TTL = 60 с)
+    SNAPSHOT_REFRESH_INTERVAL = float(os.getenv("SNAPSHOT_REFRESH_INTERVAL", "45"))
+    # Как часто писать в лог загрузку квоты Sheets и статистику чтений (0 - не писать)
+    STATS_REPORT_INTERVAL = float(os.getenv("STATS_REPORT_INTERVAL", "600"))
+    # Прогреть снимок и пути просмотра перед запуском polling
+    WARMUP_ON_START = os.getenv("WARMUP_ON_START", "True").lower() == "true"
+
+    # Рассылка напоминаний: общий лимит Telegram (~30 сообщений/с) и число одновременных отправок
+    NOTIFY_RATE_PER_SECOND = int(os.getenv("NOTIFY_RATE_PER_SECOND", "25"))
+    NOTIFY_CONCURRENCY = int(os.getenv("NOTIFY_CONCURRENCY", "20"))
+    # Сколько секунд не писать в чаты, заблокировавшие бота
+    BLOCKED_CHAT_TTL = int(os.getenv("BLOCKED_CHAT_TTL", "86400"))
+
+    # Напоминания: за сколько часов до занятия, допустимое опоздание (мин),
+    # как часто сверяться со снимком (сек) и где хранить журнал отправленных
+    REMINDER_LEAD_HOURS = float(os.getenv("REMINDER_LEAD_HOURS", "24"))
+    REMINDER_GRACE_MINUTES = float(os.getenv("REMINDER_GRACE_MINUTES", "60"))
+    REMINDER_SYNC_INTERVAL = float(os.getenv("REMINDER_SYNC_INTERVAL", "60"))
+    REMINDER_LEDGER_PATH = os.getenv("REMINDER_LEDGER_PATH", os.path.join(DATA_DIR, "reminders.db"))
+
+    # Хранилище состояний FSM: "sqlite" (общее для процессов, переживает перезапуск) или "memory"
+    FSM_STORAGE = os.getenv("FSM_STORAGE", "sqlite").lower()
+    FSM_DB_PATH = os.getenv("FSM_DB_PATH", os.path.join(DATA_DIR, "fsm.db"))
+    # Брошенный диалог записи забывается через столько секунд без изменений
+    FSM_STATE_TTL = float(os.getenv("FSM_STATE_TTL", "21600"))
+    # Окно (сек), за которое изменения состояний собираются в одну транзакцию
+    FSM_FLUSH_DELAY = float(os.getenv("FSM_FLUSH_DELAY", "0.05"))
+
+    # Прием апдейтов: "polling" (один процесс) или "webhook" (aiohttp за reverse proxy)
+    RUN_MODE = os.getenv("RUN_MODE", "polling").lower()
+    # Публичный адрес бота (без пути); пустой - вебхук в Telegram не регистрируется
+    WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+    WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+    WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+    WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "127.0.0.1")
+    WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+    # Процессов на одном порту (SO_REUSEPORT, только Linux) и одновременных соединений от Telegram
+    WEBHOOK_PROCESSES = int(os.getenv("WEBHOOK_PROCESSES", "1"))
+    WEBHOOK_REUSE_PORT = os.getenv("WEBHOOK_REUSE_PORT", "True").lower() == "true"
+    WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+    # Обработчиков апдейтов на процесс и очередь перед ними (переполнение - 503, Telegram повторит)
+    WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "32"))
+    WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "256"))
+    # Сколько секунд при остановке дообрабатывать принятые апдейты
+    WEBHOOK_DRAIN_TIMEOUT = float(os.getenv("WEBHOOK_DRAIN_TIMEOUT", "10"))
+
 
 config = Config()
 
@@ -0,0 +1,135 @@
+# dates.py
+import logging
+from collections import Counter
+from datetime import datetime
+from functools import lru_cache
+from typing import Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MONTHS = {
+    1: "января", 2: "февраля", 3: "марта", 4: "апреля",
+    5: "мая", 6: "июня", 7: "июля", 8: "августа",
+    9: "сентября", 10: "октября", 11: "ноября", 12: "декабря"
+}
+
+ISO_DATE = "%Y-%m-%d"
+DATE_FORMATS = (ISO_DATE, "%d.%m.%Y", "%d/%m/%Y", "%d-%m-%Y")
+
+# Дат в таблице - сотни, а разбираются они на каждый снимок, слот и напоминание
+CACHE_SIZE = 4096
+DETECT_SAMPLE = 50
+
+
+def _strptime(value: str, fmt: str) -> datetime:
+    if fmt == ISO_DATE and len(value) == 10 and value[4] == '-' and value[7] == '-':
+        # fromisoformat в разы быстрее strptime; остальные формы ('2024-1-5') - через strptime
+        return datetime.fromisoformat(value)
+    return datetime.strptime(value, fmt)
+
+
+def _formats(hint: Optional[str]) -> Tuple[str, ...]:
+    """Форматы в порядке проверки: сначала формат колонки, если он известен"""
+    if hint is None:
+        return DATE_FORMATS
+    return (hint,) + tuple(fmt for fmt in DATE_FORMATS if fmt != hint)
+
+
+def _date_part(value) -> str:
+    """'2024-12-10 0:00:00' → '2024-12-10'"""
+    parts = str(value).strip().split()
+    return parts[0] if parts else ""
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _parse_date(date_part: str, hint: Optional[str]) -> Optional[datetime]:
+    for fmt in _formats(hint):
+        try:
+            return _strptime(date_part, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def parse_date(value, hint: str = None) -> Optional[datetime]:
+    """Дата (на полночь) или None, если не подходит ни один формат"""
+    date_part = _date_part(value)
+    if not date_part:
+        return None
+    return _parse_date(date_part, hint)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _parse_time(time_part: str) -> Optional[Tuple[int, int]]:
+    try:
+        time_obj = datetime.strptime(time_part, "%H:%M")
+    except ValueError:
+        return None
+    return time_obj.hour, time_obj.minute
+
+
+def parse_time(value) -> Optional[Tuple[int, int]]:
+    """'10:00:00' → (10, 0) или None"""
+    return _parse_time(str(value).strip()[:5])  # Берем только часы:минуты
+
+
+def parse_start(date_str, time_str, hint: str = None) -> Optional[datetime]:
+    """Дата и время начала занятия или None, если дату не распарсить (время по умолчанию 00:00)"""
+    parsed_date = parse_date(date_str, hint)
+    if parsed_date is None:
+        return None
+
+    parsed_time = parse_time(time_str)
+    if parsed_time is None:
+        return parsed_date
+    return parsed_date.replace(hour=parsed_time[0], minute=parsed_time[1])
+
+
+def detect_format(values: Iterable) -> Optional[str]:
+    """Формат колонки дат по первым непустым значениям (один раз на снимок)"""
+    votes = Counter()
+    sampled = 0
+    for value in values:
+        date_part = _date_part(value)
+        if not date_part:
+            continue
+        for fmt in DATE_FORMATS:
+            try:
+                _strptime(date_part, fmt)
+            except ValueError:
+                continue
+            votes[fmt] += 1
+            break
+        sampled += 1
+        if sampled >= DETECT_SAMPLE:
+            break
+
+    if not votes:
+        return None
+    fmt, _ = votes.most_common(1)[0]
+    logger.debug(f"📅 Формат дат в снимке: {fmt} ({votes[fmt]}/{sampled})")
+    return fmt
+
+
+def format_day(dt: datetime) -> str:
+    """datetime → '10 декабря'"""
+    return f"{dt.day} {MONTHS[dt.month]}"
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _format_date(date_str: str, hint: Optional[str]) -> str:
+    if not any(c.isdigit() for c in date_str):
+        return date_str
+
+    parsed_date = parse_date(date_str, hint)
+    if parsed_date is None:
+        return date_str
+    return format_day(parsed_date)
+
+
+def format_date(date_str, hint: str = None) -> str:
+    """Форматируем дату: '2024-12-10' → '10 декабря' (нераспознанную возвращаем как есть)"""
+    try:
+        return _format_date(str(date_str), hint)
+    except Exception:
+        return date_str
@@ -1,55 +1,580 @@
 
-import gspread
-import pandas as pd
+import asyncio
+import functools
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, NamedTuple
+
 import logging
-from google.oauth2.service_account import Credentials
 from config import config
 from datetime import datetime
 import time
 
+from dates import format_date, parse_start
+from journal import PENDING, BookingJournal, JournalEntry
+from quota import Priority, QuotaGovernor
+
+from schedule import (
+    ScheduleIndex,
+    SheetSettings,
+    ACTIVE_STATUS,
+    TRAINING_TARIFF,
+    FIRST_SEAT_COLUMN,
+    LAST_SEAT_COLUMN,
+    parse_student,
+    short_time,
+    practice_max_seats,
+    rowcol_to_a1,
+    week_key
+)
+
 logger = logging.getLogger(__name__)
 
 
+class _PlannedSeat(NamedTuple):
+    n: int  # номер запроса в пачке
+    kind: str
+    user_id: int
+    week: float
+    seat_num: int
+
+
+class SlotsView(NamedTuple):
+    """Ответ на выбор тарифа, собранный из одного снимка"""
+    version: int  # версия снимка - сохраняется в FSM для проверки при подтверждении
+    week: int
+    slots: list  # слоты, доступные пользователю
+    already_booked: bool  # пользователь уже записан на практику этой недели
+
+
+class BookingRequest(NamedTuple):
+    """Запрос на запись студента в строку расписания"""
+    kind: str  # "practice" | "training"
+    row_index: int
+    user_id: int
+    full_name: str
+    username: str
+
+
+class DroppedBooking(NamedTuple):
+    """Запись, подтвержденная пользователю, но не перенесенная в таблицу: в строке не осталось мест"""
+    entry: JournalEntry
+    tariff: str
+    date_str: str
+    time_str: str
+
+
 class GoogleSheetsManager:
-    def __init__(self):
+    def __init__(self, journal_path: str = None):
         self.client = None
         self.spreadsheet = None
-        self._full_data_cache = None
         self._full_data_time = 0
-        self._current_week_cache = None
-        self._cache_time = 0
+        self._fetched_at = 0  # когда начиналась загрузка текущего снимка
+        self._settings = SheetSettings()
+        self._worksheets = {}
+        self._index = None
+        # Версия снимка растет при каждой загрузке и каждой правке на месте
+        self._version = 0
         self.CACHE_TTL = 60  # 1 минута (было 5 минут)
-        self.connect()
+        self.REFRESH_RETRY = 5  # пауза после неудачной загрузки, сек
+        # Методы вызываются из пула потоков AsyncGoogleSheetsManager,
+        # поэтому замену и правку снимка защищаем блокировкой
+        self._cache_lock = threading.Lock()
+        # Одновременно идет не больше одной загрузки таблицы
+        self._refresh_lock = threading.Lock()
+        self._refresh_failed_at = 0
+        # Выбор мест и фиксация пачки в журнале выполняются под одной блокировкой;
+        # под ней же снимок заменяется свежим (порядок: _booking_lock, журнал, _cache_lock)
+        self._booking_lock = threading.Lock()
+        # Подключение к Google - при первом обращении к таблице, а не при импорте модуля
+        self._connect_lock = threading.Lock()
+        # Файл журнала открывается при первой записи или переносе, не при импорте модуля
+        self.journal = BookingJournal(journal_path or config.JOURNAL_PATH)
+        # Все запросы к Google идут через общий бюджет квоты с приоритетами. Квота
+        # одна на сервисный аккаунт, а процессы вебхука считают ее каждый сам -
+        # поэтому каждому достается своя доля
+        processes = config.WEBHOOK_PROCESSES if config.RUN_MODE == "webhook" else 1
+        self.quota = QuotaGovernor(
+            max(1, config.SHEETS_QUOTA_PER_MINUTE // processes),
+            config.SHEETS_QUOTA_RESERVE // processes,
+            config.SHEETS_MAX_RETRIES
+        )
+
+    def _api(self, priority: Priority, func, *args, **kwargs):
+        """Вызов gspread в рамках квоты (с повторами на 429/5xx)"""
+        return self.quota.call(priority, func, *args, **kwargs)
+
+    def _get_full_data(self, priority: Priority = Priority.READ):
+        """Текущий снимок данных таблицы.
+
+        Устаревший снимок отдается сразу, а свежий загружается в фоне
+        (stale-while-revalidate). Ждать загрузку приходится только при
+        холодном старте, когда снимка еще нет.
+        """
+        index = self._index
+        if index is None:
+            self.refresh(priority)
+            return self._index or ScheduleIndex([])
+
+        if time.time() - self._full_data_time >= self.CACHE_TTL:
+            self._refresh_in_background(max(priority, Priority.REFRESH))
+        else:
+            logger.debug("✅ Использую кэш всех данных")
+        return index
 
-    def _get_full_data(self):
-        """Получить данные таблицы"""
-        import time
+    def _refresh_in_background(self, priority: Priority = Priority.REFRESH):
+        if self._refresh_lock.locked() or time.time() - self._refresh_failed_at < self.REFRESH_RETRY:
+            return
+        threading.Thread(target=self.refresh, args=(priority,), name="gsheets-refresh", daemon=True).start()
 
-        # Если кэш есть и не устарел
-        if self._full_data_cache and (time.time() - self._full_data_time < self.CACHE_TTL):
-            logger.debug("✅ Использую кэш всех данных")
-            return self._full_data_cache
+    def refresh(self, priority: Priority = Priority.REFRESH) -> bool:
+        """Загрузить свежий снимок: расписание и настройки одним batchGet.
+
+        Single-flight: если загрузка уже идет, вызов дожидается её и не
+        запускает свою. Индекс строится здесь же, вне пользовательских запросов.
+        """
+        if not self._refresh_lock.acquire(blocking=False):
+            with self._refresh_lock:
+                return self._index is not None
 
-        # Загружаем свежие данные
-        logger.debug("🔄 Загружаю свежие данные из таблицы")
         try:
-            worksheet = self.spreadsheet.worksheet("Расписание")
-            self._full_data_cache = worksheet.get_all_records()
-            self._full_data_time = time.time()
-            logger.info(f"📊 Данные закэшированы: {len(self._full_data_cache)} строк")
-            return self._full_data_cache
+            logger.debug("🔄 Загружаю свежие данные из таблицы")
+            spreadsheet = self._ensure_connected(priority)
+            # Записи, перенесенные в таблицу после этого момента, могли не попасть в ответ
+            fetch_started = time.time()
+            response = self._api(priority, spreadsheet.values_batch_get, ["Расписание", "Настройки"])
+            schedule_range, settings_range = response.get('valueRanges', [{}, {}])
+
+            settings = SheetSettings.from_values(settings_range.get('values', []))
+            # Снимок хранится только индексом: исходные строки листа после разбора не нужны
+            index = ScheduleIndex(schedule_range.get('values', []))
+
+            # Записи из журнала, еще не перенесенные в таблицу, должны быть видны сразу.
+            # Журнал читается под _booking_lock: запись, принятая между чтением
+            # журнала и заменой снимка, иначе осталась бы только в старом индексе
+            with self._booking_lock:
+                entries = self.journal.overlay(fetch_started)
+                with self._cache_lock:
+                    self._apply_pending(index, entries)
+                    self._settings = settings
+                    self._index = index
+                    self._fetched_at = fetch_started
+                    self._full_data_time = time.time()
+                    self._version += 1
+
+            logger.info(f"📊 Данные закэшированы: {len(index.rows)} строк, версия {self._version}")
+            return True
+
         except Exception as e:
+            self._refresh_failed_at = time.time()
             logger.error(f"Ошибка загрузки данных: {e}")
-            return []
+            return False
+
+        finally:
+            self._refresh_lock.release()
+
+    def _worksheet(self, name: str, priority: Priority = Priority.READ):
+        """Лист по имени (хэндл запоминается, без повторного запроса метаданных)"""
+        worksheet = self._worksheets.get(name)
+        if worksheet is None:
+            worksheet = self._api(priority, self._ensure_connected(priority).worksheet, name)
+            self._worksheets[name] = worksheet
+        return worksheet
+
+    @staticmethod
+    def _pad_row(values) -> list:
+        """Значения строки A:AT, дополненные пустыми до Студент40"""
+        row_values = [str(value).strip() for value in (values[0] if values else [])]
+        return row_values + [''] * (LAST_SEAT_COLUMN - len(row_values))
+
+    def _read_row(self, row_index: int) -> list:
+        """Строка A:AT одним запросом"""
+        return self._pad_row(self._api(Priority.READ, self._worksheet("Расписание").get, f"A{row_index}:AT{row_index}"))
+
+    @staticmethod
+    def _user_in_row(row_values: list, user_id: int) -> bool:
+        for cell_value in row_values[FIRST_SEAT_COLUMN - 1:LAST_SEAT_COLUMN]:
+            student = parse_student(cell_value)
+            if student and student[0] == user_id:
+                return True
+        return False
+
+    @staticmethod
+    def _free_seat(row_values: list, max_seats: int):
+        """Номер первого свободного места (1..max_seats) или None"""
+        for seat_num in range(1, max_seats + 1):
+            if not row_values[FIRST_SEAT_COLUMN - 2 + seat_num]:
+                return seat_num
+        return None
+
+    @staticmethod
+    def _max_seats(kind: str, tariff: str) -> int:
+        """Сколько мест Студент* доступно для записи: тренинг - все 40, практика - по тарифу"""
+        if kind == "training":
+            return LAST_SEAT_COLUMN - FIRST_SEAT_COLUMN + 1
+        return practice_max_seats(tariff)
+
+    def _plan_practice(self, request: BookingRequest, row_values: list, planned: list):
+        """Проверки записи на практику по прочитанной строке; возвращает номер места или None"""
+        row_index, user_id = request.row_index, request.user_id
+
+        # 1. Определяем неделю (колонка B)
+        week = week_key(row_values[1])
+        if week is None:
+            logger.error(f"Не могу определить неделю в строке {row_index}: '{row_values[1]}'")
+            return None
+
+        # 2. Проверяем, не записан ли уже на эту неделю (в том числе в этой же пачке)
+        already_planned = any(
+            p.user_id == user_id and p.week == week and p.kind == "practice" for p in planned
+        )
+        if already_planned or not self.can_user_book_this_week(user_id, week):
+            logger.warning(f"Пользователь {user_id} уже записан на неделю {week}")
+            return None
+
+        # 3. Проверяем, не записан ли уже в этой строке
+        if self._user_in_row(row_values, user_id):
+            logger.warning(f"❌ Пользователь {user_id} уже записан в строке {row_index}")
+            return None
+
+        # 4. Ищем свободное место среди мест тарифа (колонка A)
+        max_seats = self._max_seats(request.kind, row_values[0])
+        seat_num = self._free_seat(row_values, max_seats)
+        if seat_num is None:
+            logger.warning(f"❌ Нет свободных мест в строке {row_index}")
+            return None
+
+        logger.info(f"✅ Запись: строка {row_index}, место {seat_num}/{max_seats}, ID={user_id}")
+        return seat_num
+
+    def _plan_training(self, request: BookingRequest, row_values: list, planned: list):
+        """Проверки записи на тренинг по прочитанной строке; возвращает номер места или None"""
+        row_index, user_id = request.row_index, request.user_id
+        week = week_key(row_values[1])
+
+        # 1. Проверяем неделю тренинга в строке
+        if week is not None:
+            # Текущая неделя тренингов из B4
+            current_training_week = self.get_training_week_number()
+
+            # Строгое сравнение недель
+            if abs(week - current_training_week) > 0.01:
+                logger.warning(
+                    f"❌ Тренинг недели {week} не доступен "
+                    f"(текущая неделя тренингов из B4: {current_training_week})"
+                )
+                return None
+
+        # 2. Проверяем, не прошедший ли тренинг
+        date_str, time_str = row_values[2], row_values[3]
+        if not self.is_future_date(date_str, time_str):
+            logger.warning(f"❌ Попытка записаться на прошедший тренинг: {date_str} {time_str}")
+            return None
+
+        # 3. Проверяем, не записан ли уже
+        if self._user_in_row(row_values, user_id):
+            logger.warning(f"❌ Пользователь {user_id} уже записан на этот тренинг")
+            return None
+
+        # 4. Проверяем неделю для ограничения записи (тренинг или практика, в том числе в этой же пачке)
+        if week is not None:
+            already_planned = any(p.user_id == user_id and p.week == week for p in planned)
+            if already_planned or not self.can_user_book_this_week(user_id, week, check_only_practice=False):
+                logger.warning(f"Пользователь {user_id} уже записан на неделю {week} (тренинг или практика)")
+                return None
+
+        # 5. Ищем свободное место среди Студент1-40
+        max_seats = self._max_seats(request.kind, row_values[0])
+        seat_num = self._free_seat(row_values, max_seats)
+        if seat_num is None:
+            logger.warning(f"❌ Нет свободных мест на тренинге (строка {row_index})")
+            return None
+
+        logger.info(f"✅ Запись на тренинг: строка {row_index}, место {seat_num}/{max_seats}")
+        return seat_num
+
+    def _snapshot_row(self, row_index: int):
+        """Копия строки A:AT из снимка или None, если такой строки нет"""
+        return self._get_full_data().row_values(row_index)
+
+    def book_batch(self, requests: List[BookingRequest]) -> List[bool]:
+        """Принять пачку записей: места выбираются по снимку, записи фиксируются в журнале.
+
+        Места распределяются по порядку запросов, поэтому два пользователя
+        в одной пачке не получат одно и то же место. Выбор мест идет внутри
+        транзакции журнала, после наложения записей всех процессов бота, так
+        что и процессы с разными снимками не отдадут одно место. В таблицу
+        записи переносит flush_journal, пользователь ответа не ждет.
+        """
+        results = [False] * len(requests)
+        if not requests:
+            return results
+
+        try:
+            # Холодный старт - до блокировок: refresh сам берет _booking_lock
+            self._get_full_data()
+            if self._index is None:
+                logger.error("❌ Нет снимка таблицы, записи не приняты")
+                return results
+
+            with self._booking_lock:
+                planned = []
+                duplicates = []
+
+                def plan(recent: List[JournalEntry]) -> List[JournalEntry]:
+                    # Записи других процессов и перенесенные после загрузки снимка
+                    with self._cache_lock:
+                        if self._apply_pending(self._index, recent):
+                            self._version += 1
+                    pending_keys = {entry.key for entry in recent if entry.status == PENDING}
+
+                    rows = {}
+                    entries = []
+                    first_of_key = {}
+                    for n, request in enumerate(requests):
+                        # Повторное подтверждение той же записи (двойное нажатие) получает тот же ответ
+                        key = JournalEntry.make_key(request.kind, request.row_index, request.user_id)
+                        if key in first_of_key:
+                            duplicates.append((n, first_of_key[key]))
+                            continue
+                        first_of_key[key] = n
+
+                        if key in pending_keys:
+                            logger.info(f"🔁 Запись {key} уже в журнале")
+                            results[n] = True
+                            continue
+
+                        if request.row_index not in rows:
+                            rows[request.row_index] = self._snapshot_row(request.row_index)
+                        row_values = rows[request.row_index]
+                        if row_values is None:
+                            logger.error(f"❌ Строка {request.row_index} не найдена в расписании")
+                            continue
+
+                        if request.kind == "training":
+                            seat_num = self._plan_training(request, row_values, planned)
+                        else:
+                            seat_num = self._plan_practice(request, row_values, planned)
+                        if seat_num is None:
+                            continue
+
+                        username = request.username or 'нет'
+                        row_values[FIRST_SEAT_COLUMN - 2 + seat_num] = f"{request.user_id}|{request.full_name}|{username}"
+                        planned.append(_PlannedSeat(n, request.kind, request.user_id, week_key(row_values[1]), seat_num))
+                        entries.append(JournalEntry(
+                            key, request.kind, request.row_index, request.user_id, request.full_name, username, seat_num
+                        ))
+                    return entries
+
+                # Фиксируем всю пачку в журнале одной транзакцией
+                entries = self.journal.reserve(self._fetched_at, plan)
+
+                # Обновляем кэш и индекс на месте вместо сброса
+                for p, entry in zip(planned, entries):
+                    self._record_booking(
+                        entry.row_index, entry.seat_num, entry.user_id, entry.full_name, entry.username
+                    )
+                    results[p.n] = True
+
+                for n, first in duplicates:
+                    results[n] = results[first]
+
+                logger.info(f"📒 Принято записей: {len(entries)} из {len(requests)}, ожидают переноса в таблицу")
+
+        except Exception as e:
+            logger.error(f"❌ Ошибка записи: {e}")
+
+        return results
+
+    def _is_external_edit(self, row_index: int, sheet_row: list, entries) -> bool:
+        """Строка в таблице отличается от снимка не только нашими еще не перенесенными записями.
+
+        Ячейки сравниваются без пробелов по краям: строка из таблицы уже
+        очищена _pad_row, а в снимке значения хранятся как их отдал API.
+        """
+        snapshot_row = self._snapshot_row(row_index)
+        if snapshot_row is None:
+            return True
+
+        ours = {f"{e.user_id}|{e.full_name}|{e.username}".strip() for e in entries if e.row_index == row_index}
+        for sheet_cell, cached_cell in zip(sheet_row, snapshot_row):
+            sheet_cell, cached_cell = str(sheet_cell).strip(), str(cached_cell).strip()
+            if sheet_cell == cached_cell:
+                continue
+            if not sheet_cell and cached_cell in ours:
+                continue
+            return True
+        return False
+
+    def flush_journal(self) -> int:
+        """Перенести ожидающие записи журнала в таблицу: один batch_get и один batch_update.
+
+        Если место, выбранное по снимку, в таблице уже занято кем-то другим,
+        берется следующее свободное место строки. Ошибки API пробрасываются
+        наружу, чтобы JournalFlusher повторил попытку позже.
+        """
+        entries = self.journal.pending(limit=config.JOURNAL_FLUSH_BATCH)
+        if not entries:
+            return 0
+
+        # Перенос записей - самый важный трафик: фоновые загрузки его не вытесняют
+        worksheet = self._worksheet("Расписание", Priority.WRITE)
+        try:
+            # 1. Читаем все затронутые строки A:AT одним запросом
+            row_indexes = sorted({entry.row_index for entry in entries})
+            ranges = self._api(Priority.WRITE, worksheet.batch_get, [f"A{i}:AT{i}" for i in row_indexes])
+            rows = {i: self._pad_row(values) for i, values in zip(row_indexes, ranges)}
+
+            # Таблицу правили в обход бота - снимок нужно перезагрузить целиком
+            if any(self._is_external_edit(i, rows[i], entries) for i in row_indexes):
+                logger.info("✏️ Обнаружена правка таблицы в обход бота, снимок будет обновлен")
+                self.invalidate_cache()
+
+            updates = []
+            flushed = []
+            dropped = []
+            moved = {}
+            for entry in entries:
+                row_values = rows[entry.row_index]
+
+                # Уже в таблице (перенесено до перезапуска или вписано вручную)
+                if self._user_in_row(row_values, entry.user_id):
+                    flushed.append(entry.key)
+                    continue
+
+                seat_num = entry.seat_num
+                if row_values[FIRST_SEAT_COLUMN - 2 + seat_num]:
+                    seat_num = self._free_seat(row_values, self._max_seats(entry.kind, row_values[0]))
+                    if seat_num is None:
+                        logger.error(
+                            f"❌ Запись {entry.key} не перенесена: в строке {entry.row_index} нет свободных мест"
+                        )
+                        dropped.append(entry.key)
+                        continue
+                    logger.warning(f"⚠️ Место {entry.seat_num} в строке {entry.row_index} занято, пишем в {seat_num}")
+                    moved[entry.key] = seat_num
+
+                student_info = f"{entry.user_id}|{entry.full_name}|{entry.username}"
+                row_values[FIRST_SEAT_COLUMN - 2 + seat_num] = student_info
+                updates.append({
+                    'range': rowcol_to_a1(entry.row_index, FIRST_SEAT_COLUMN - 1 + seat_num),
+                    'values': [[student_info]],
+                })
+                flushed.append(entry.key)
+
+            # 2. Записываем все места одним запросом
+            if updates:
+                self._api(Priority.WRITE, worksheet.batch_update, updates, raw=False)
+
+        except Exception as e:
+            # Ничего не записано: вся пачка, включая записи без места, остается в ожидании
+            self.journal.record_attempt([entry.key for entry in entries], str(e))
+            raise
+
+        self.journal.mark_flushed(flushed, moved)
+        # Отклоняем только после успешной записи, иначе повтор пачки отклонил бы их еще раз
+        self.journal.mark_dropped(dropped)
+        logger.info(f"📤 Перенесено в таблицу: {len(updates)} мест одним batch_update")
+        return len(flushed)
+
+    def take_dropped(self) -> List[DroppedBooking]:
+        """Записи, которые flush_journal не смог перенести и о которых студентам еще не сообщили.
+
+        Они хранятся в журнале до mark_dropped_reported, поэтому сообщение
+        не теряется при остановке бота.
+        """
+        index = self.get_index(Priority.WRITE)
+        dropped = []
+        for entry in self.journal.dropped():
+            row = index.rows.get(entry.row_index)
+            if row is None:
+                dropped.append(DroppedBooking(entry, "", "", ""))
+            else:
+                dropped.append(DroppedBooking(entry, row.tariff, row.date_str, row.time_str))
+        return dropped
+
+    def mark_dropped_reported(self, dropped: List[DroppedBooking]):
+        self.journal.mark_reported([booking.entry.key for booking in dropped])
+
+    def prune_journal(self):
+        """Удалить из журнала давно перенесенные записи"""
+        self.journal.prune(config.JOURNAL_RETENTION)
+
+    def get_settings(self) -> SheetSettings:
+        """Настройки из того же снимка, что и расписание"""
+        self._get_full_data()
+        return self._settings
+
+    def get_records(self, priority: Priority = Priority.READ):
+        """Строки листа 'Расписание' из текущего снимка (словари, как get_all_records)"""
+        return self._get_full_data(priority).records()
+
+    @property
+    def snapshot_version(self) -> int:
+        """Версия текущего снимка (меняется при загрузке и при каждой записи)"""
+        return self._version
+
+    def _snapshot(self):
+        """Версия, индекс и настройки одного и того же снимка"""
+        self._get_full_data()
+        with self._cache_lock:
+            return self._version, self._index or ScheduleIndex([]), self._settings
+
+    def get_index(self, priority: Priority = Priority.READ) -> ScheduleIndex:
+        """Индекс текущего снимка: новый объект после каждой полной загрузки"""
+        return self._get_full_data(priority)
 
     def invalidate_cache(self):
-        """Очистить кэш (вызывать после записи)"""
-        self._full_data_cache = None
+        """Пометить снимок устаревшим: следующий запрос запустит фоновую загрузку"""
         self._full_data_time = 0
-        logger.debug("🧹 Кэш очищен")
+        logger.debug("🧹 Кэш помечен устаревшим")
+
+    def _apply_pending(self, index: ScheduleIndex, entries: List[JournalEntry]) -> int:
+        """Наложить на снимок записи журнала, которых может не быть в таблице (вызывать под _cache_lock).
+
+        entries - journal.overlay(): кроме ожидающих, это и записи, перенесенные
+        после начала загрузки снимка, - batchGet мог прочитать строку до их
+        batch_update. Возвращает число наложенных записей.
+        """
+        applied = 0
+        for entry in entries:
+            row = index.rows.get(entry.row_index)
+            if row is None or index.user_in_row(entry.user_id, entry.row_index):
+                continue
+
+            seat_num = entry.seat_num
+            if index.cell(entry.row_index, seat_num):
+                seat_num = index.free_seat(entry.row_index, self._max_seats(entry.kind, row.tariff))
+                if seat_num is None:
+                    continue
 
-    def connect(self):
+            index.add_booking(entry.row_index, seat_num, entry.user_id, entry.full_name, entry.username)
+            applied += 1
+        return applied
+
+    def _record_booking(self, row_index: int, seat_num: int, user_id: int, full_name: str, username: str):
+        """Отразить успешную запись в индексе снимка без перезагрузки таблицы"""
+        with self._cache_lock:
+            if self._index is None or self._index.user_in_row(user_id, row_index):
+                return  # нет снимка или уже наложено из журнала при загрузке снимка
+            self._index.add_booking(row_index, seat_num, user_id, full_name, username)
+            self._version += 1
+
+    def _ensure_connected(self, priority: Priority = Priority.READ):
+        """Таблица; подключение выполняется один раз, при первом обращении"""
+        if self.spreadsheet is None:
+            with self._connect_lock:
+                if self.spreadsheet is None:
+                    self.connect(priority)
+        return self.spreadsheet
+
+    def connect(self, priority: Priority = Priority.READ):
         """ Подключение к Google Sheets"""
+        # gspread и google-auth тяжелые - импортируем только при подключении
+        import gspread
+        from google.oauth2.service_account import Credentials
+
         try:
             logger.info(f"🔐 Подключение к таблице...")
 
@@ -64,7 +589,7 @@ class GoogleSheetsManager:
             )
 
             self.client = gspread.authorize(credentials)
-            self.spreadsheet = self.client.open_by_key(config.SPREADSHEET_ID)
+            self.spreadsheet = self._api(priority, self.client.open_by_key, config.SPREADSHEET_ID)
 
             logger.info("✅ Подключение к Google Sheets успешно")
 
@@ -72,43 +597,35 @@ class GoogleSheetsManager:
             logger.error(f"❌ Ошибка подключения: {e}")
             raise
 
+    def warmup(self):
+        """Прогрев до запуска polling: снимок, индекс и кэши дат для текущей недели"""
+        started = time.time()
+        tariffs = self.get_available_tariffs()
+        week = self.get_current_week_number()
+        slots = sum(len(self.get_available_slots(tariff, week)) for tariff in tariffs)
+        trainings = len(self.get_available_trainings())
+        logger.info(
+            f"🔥 Прогрев: {len(tariffs)} тарифов, {slots} слотов, {trainings} тренингов "
+            f"за {time.time() - started:.2f} с"
+        )
+
     def get_available_tariffs(self):
         """Получить тарифы из кэша"""
         try:
-            data = self._get_full_data()
-            logger.info(f"📊 Загружено записей для тарифов: {len(data) if data else 0}")
+            index = self.get_index()
+            logger.info(f"📊 Загружено записей для тарифов: {len(index.rows)}")
 
-            if not data:
+            if not index.rows:
                 logger.warning("❌ Нет данных в таблице Расписание")
                 return []
 
-            tariffs = set()
             current_week = self.get_current_week_number()
-            
-            for row in data:
-                tariff = str(row.get('Тариф', '')).strip()
-                status = str(row.get('Статус', '')).strip().lower()
-                
-                # Пропускаем тренинги и неактивные
-                if not tariff or tariff == "Тренинг":
-                    continue
-                    
-                # Проверяем неделю - показываем только тарифы текущей недели
-                try:
-                    row_week = float(str(row.get('Неделя', 0)).strip())
-                except:
-                    continue
-                    
-                if abs(row_week - current_week) > 0.01:
-                    continue
-                    
-                # Проверяем статус
-                if status != 'активно':
-                    continue
-                    
-                tariffs.add(tariff)
 
-            result = list(tariffs)
+            # Показываем только активные тарифы текущей недели, без тренингов
+            result = [
+                tariff for tariff in index.tariffs(current_week, ACTIVE_STATUS)
+                if tariff != TRAINING_TARIFF
+            ]
             logger.info(f"✅ Тарифы для недели {current_week}: {result}")
             return result
 
@@ -117,47 +634,16 @@ class GoogleSheetsManager:
             return []
 
     def get_current_week_number(self) -> int:
-        """Читает текущую неделю из Google Sheets (B3), возвращает как есть (даже 0)"""
-        try:
-            settings_ws = self.spreadsheet.worksheet("Настройки")
-            week_cell = settings_ws.cell(3, 2).value  # B3
-
-            if week_cell is None or str(week_cell).strip() == "":
-                logger.warning("B3 пустая, возвращаем 0")
-                return 0
-
-            try:
-                # Возвращаем как есть, даже если 0
-                current_week = int(float(str(week_cell).strip()))
-                logger.info(f"📅 Текущая неделя из B3: {current_week}")
-                return current_week
-            except (ValueError, TypeError) as e:
-                logger.error(f"Не число в B3: '{week_cell}', ошибка: {e}")
-                return 0
-        except Exception as e:
-            logger.error(f"Не удалось получить неделю из таблицы: {e}")
-            return 0
+        """Текущая неделя из Настройки!B3, возвращает как есть (даже 0)"""
+        current_week = self.get_settings().current_week
+        logger.debug(f"📅 Текущая неделя из B3: {current_week}")
+        return current_week
 
     def get_training_week_number(self) -> int:
-        """Читает неделю тренингов из B4, если пусто - берет B3"""
-        try:
-            settings_ws = self.spreadsheet.worksheet("Настройки")
-            week_cell = settings_ws.cell(4, 2).value  # B4
-
-            if week_cell is None or str(week_cell).strip() == "":
-                logger.warning("B4 пустая, используем B3")
-                return self.get_current_week_number()
-
-            try:
-                training_week = int(float(str(week_cell).strip()))
-                logger.info(f"📅 Неделя тренингов из B4: {training_week}")
-                return training_week
-            except (ValueError, TypeError) as e:
-                logger.error(f"Не число в B4: '{week_cell}', ошибка: {e}")
-                return self.get_current_week_number()
-        except Exception as e:
-            logger.error(f"Ошибка чтения B4: {e}")
-            return self.get_current_week_number()
+        """Неделя тренингов из Настройки!B4, если пусто - берет B3"""
+        training_week = self.get_settings().training_week
+        logger.debug(f"📅 Неделя тренингов из B4: {training_week}")
+        return training_week
 
     def get_available_weeks(self, tariff: str):
         """Возвращает только текущую неделю из B3 (даже если 0)"""
@@ -170,47 +656,15 @@ class GoogleSheetsManager:
             return []
 
     def get_nearest_available_week(self, tariff: str):
-        """Найти ближайшую неделю"""
+        """Найти ближайшую неделю, где у тарифа есть активные слоты со свободными местами"""
         try:
             logger.debug(f"Поиск ближайшей недели для тарифа '{tariff}'")
 
-            worksheet = self.spreadsheet.worksheet("Расписание")
-            data = worksheet.get_all_records()
-            df = pd.DataFrame(data)
-
-            if df.empty:
-                return None
-
-            # Нормализуем данные
-            df['Тариф_норм'] = df['Тариф'].astype(str).str.strip()
-            df['Статус_норм'] = df['Статус'].astype(str).str.strip().str.lower()
-            df['Студент_норм'] = df['Студент'].fillna('').astype(str).str.strip()
-
-            # Функция для преобразования недели
-            def try_float(x):
-                try:
-                    return float(str(x).strip())
-                except:
-                    return None
-
-            df['Неделя_норм'] = df['Неделя'].apply(try_float)
-
-            # Фильтр
-            mask = (
-                    (df['Тариф_норм'] == tariff.strip()) &
-                    (df['Статус_норм'] == 'Активно') &
-                    (df['Студент_норм'] == '') &
-                    df['Неделя_норм'].notna()
-            )
-
-            filtered_df = df[mask]
-
-            if filtered_df.empty:
+            nearest_week = self.get_index().nearest_week(tariff)
+            if nearest_week is None:
                 logger.info(f"Для тарифа '{tariff}' нет свободных слотов")
                 return None
 
-            nearest_week = filtered_df['Неделя_норм'].min()
-
             logger.info(f"Для тарифа '{tariff}' ближайшая неделя: {nearest_week}")
             return nearest_week
 
@@ -218,90 +672,48 @@ class GoogleSheetsManager:
             logger.error(f"Ошибка поиска недели: {e}", exc_info=True)
             return None
 
+    @staticmethod
+    def _slot(row, tariff: str, week: float, now: datetime):
+        """Слот для показа или None, если занятие прошло или мест нет"""
+        # Только будущие
+        if not row.is_future(now):
+            return None
+
+        # Если все места заняты - пропускаем
+        if row.booked >= row.max_seats:
+            return None
+
+        return {
+            'row_index': row.row_index,
+            'date': row.date_display,
+            'time': row.time_display,
+            'mentor': row.mentor,
+            'tariff': tariff,
+            'week': week,
+            'booked': row.booked,
+            'available': row.available,
+            'max_seats': row.max_seats
+        }
+
+    def _slots(self, index: ScheduleIndex, tariff: str, week: float) -> list:
+        now = datetime.now()
+        slots = []
+        for row in index.rows_for(week, tariff, ACTIVE_STATUS):
+            slot = self._slot(row, tariff, week, now)
+            if slot:
+                slots.append(slot)
+        return slots
+
     def get_available_slots(self, tariff: str, week: float):
         """Получить слоты на указанной неделе (строгое равенство)"""
         try:
-            worksheet = self.spreadsheet.worksheet("Расписание")
-            data = worksheet.get_all_records()
+            index = self.get_index()
 
-            if not data:
+            if not index.rows:
                 logger.info(f"📭 Таблица 'Расписание' пустая")
                 return []
 
-            slots = []
-
-            for idx, row in enumerate(data, start=2):  # start=2 потому что первая строка заголовки
-                # Проверяем неделю (строгое равенство)
-                row_week_raw = str(row.get('Неделя', '')).strip()
-
-                try:
-                    row_week = float(row_week_raw)
-                except (ValueError, TypeError):
-                    continue  # Пропускаем если неделя не число
-
-                # СТРОГОЕ РАВЕНСТВО недель
-                if abs(row_week - float(week)) > 0.01:
-                    continue
-
-                # Проверяем тариф
-                row_tariff = str(row.get('Тариф', '')).strip()
-                if row_tariff != tariff.strip():
-                    continue
-
-                # Проверяем статус
-                status = str(row.get('Статус', '')).strip().lower()
-                if status != 'активно':
-                    continue
-
-                # Проверяем дату (только будущие)
-                date_str = str(row.get('Дата', '')).split()[0]
-                time_str = str(row.get('Время', ''))
-
-                if not self.is_future_date(date_str, time_str):
-                    continue
-
-                # Определяем лимит мест
-                if tariff == "Базовый":
-                    max_seats = 4
-                    student_columns = ['Студент1', 'Студент2', 'Студент3', 'Студент4']
-                elif tariff == "Основной":
-                    max_seats = 3
-                    student_columns = ['Студент1', 'Студент2', 'Студент3']
-                else:
-                    max_seats = 1
-                    student_columns = ['Студент1']
-
-                # Считаем занятые места
-                booked_count = 0
-                for col in student_columns:
-                    cell_value = str(row.get(col, '')).strip()
-                    if cell_value and cell_value.strip():
-                        booked_count += 1
-
-                # Если все места заняты - пропускаем
-                if booked_count >= max_seats:
-                    continue
-
-                # Форматируем дату и время
-                date_display = self.format_date(date_str)
-                time_str = str(row.get('Время', ''))
-                if ' ' in time_str:
-                    time_str = time_str.split()[0][:5]
-                else:
-                    time_str = time_str[:5]
-
-                slots.append({
-                    'row_index': idx,
-                    'date': date_display,
-                    'time': time_str,
-                    'mentor': row.get('Наставник', ''),
-                    'tariff': tariff,
-                    'week': week,
-                    'booked': booked_count,
-                    'available': max_seats - booked_count,
-                    'max_seats': max_seats
-                })
-
+            slots = self._slots(index, tariff, week)
             logger.info(f"Для тарифа '{tariff}', неделя {week} найдено слотов: {len(slots)}")
             return slots
 
@@ -311,66 +723,65 @@ class GoogleSheetsManager:
 
     def get_available_slots_for_user(self, tariff: str, week: float, user_id: int):
         """Возвращает слоты доступные для конкретного пользователя"""
-        all_slots = self.get_available_slots(tariff, week)
-
-        if not all_slots:
+        try:
+            _, index, _ = self._snapshot()
+            return self._user_slots(index, tariff, week, user_id)
+        except Exception as e:
+            logger.error(f"Ошибка поиска слотов пользователя: {e}", exc_info=True)
             return []
 
-        # Проверяем, может ли пользователь записаться на эту неделю
-        if not self.can_user_book_this_week(user_id, week):
+    def _user_slots(self, index: ScheduleIndex, tariff: str, week: float, user_id: int) -> list:
+        # Пользователь уже записан на практику этой недели
+        if index.is_booked_in_week(user_id, week):
             return []
 
-        user_slots = []
-        user_id_str = str(user_id)
+        return [
+            slot for slot in self._slots(index, tariff, week)
+            if not index.user_in_row(user_id, slot['row_index'])
+        ]
 
-        worksheet = self.spreadsheet.worksheet("Расписание")
-        all_data = worksheet.get_all_values()
+    def get_slots_view(self, tariff: str, user_id: int) -> SlotsView:
+        """Неделя из B3, слоты тарифа и фильтр пользователя - все из одного снимка"""
+        try:
+            version, index, settings = self._snapshot()
+            week = settings.current_week
+            if week <= 0:
+                return SlotsView(version, week, [], False)
 
-        for slot in all_slots:
-            row_index = slot['row_index']
-            row = all_data[row_index - 1] if row_index - 1 < len(all_data) else []
+            already_booked = index.is_booked_in_week(user_id, week) is not None
+            slots = [] if already_booked else self._user_slots(index, tariff, week, user_id)
 
-            # Проверяем, записан ли пользователь в этой строке
-            user_in_this_row = False
-            for col in range(6, 46):  # Колонки 7-46 (G-AT) - Студент1-40
-                if col < len(row):
-                    cell_value = str(row[col]).strip()
-                    if cell_value and f"{user_id_str}|" in cell_value:
-                        user_in_this_row = True
-                        break
+            logger.info(
+                f"Для тарифа '{tariff}', неделя {week}, user_id={user_id} "
+                f"найдено слотов: {len(slots)} (снимок v{version})"
+            )
+            return SlotsView(version, week, slots, already_booked)
 
-            if not user_in_this_row:
-                user_slots.append(slot)
+        except Exception as e:
+            logger.error(f"Ошибка поиска слотов: {e}", exc_info=True)
+            return SlotsView(self._version, 0, [], False)
 
-        return user_slots
+    def get_slot(self, tariff: str, week: float, row_index: int):
+        """Один слот из текущего снимка или None, если он больше не доступен"""
+        try:
+            _, index, _ = self._snapshot()
+            row = index.rows.get(row_index)
+            if row is None or row not in index.rows_for(week, tariff, ACTIVE_STATUS):
+                return None
+            return self._slot(row, tariff, week, datetime.now())
+        except Exception as e:
+            logger.error(f"Ошибка получения слота: {e}", exc_info=True)
+            return None
 
     def is_future_date(self, date_str: str, time_str: str) -> bool:
         """Проверяет, что дата и время в будущем"""
         try:
-            # Парсим дату
-            date_part = str(date_str).strip().split()[0]
-            time_part = str(time_str).strip()[:5]  # Берем только часы:минуты
-
-            date_formats = ["%Y-%m-%d", "%d.%m.%Y", "%d/%m/%Y"]
-
-            parsed_date = None
-            for fmt in date_formats:
-                try:
-                    parsed_date = datetime.strptime(date_part, fmt)
-                    break
-                except ValueError:
-                    continue
+            parsed_date = parse_start(date_str, time_str)
 
             if not parsed_date:
                 logger.warning(f"Не удалось распарсить дату: '{date_str}'")
                 return True
 
-            try:
-                time_obj = datetime.strptime(time_part, "%H:%M")
-                parsed_date = parsed_date.replace(hour=time_obj.hour, minute=time_obj.minute)
-            except:
-                parsed_date = parsed_date.replace(hour=0, minute=0)
-
             # Сравниваем с текущим временем
             now = datetime.now()
             is_future = parsed_date > now
@@ -384,148 +795,29 @@ class GoogleSheetsManager:
 
     def book_slot(self, row_index: int, user_id: int, full_name: str, username: str) -> bool:
         """Запись студента на практику"""
-        try:
-            worksheet = self.spreadsheet.worksheet("Расписание")
-
-            # 1. Определяем неделю
-            week_cell = worksheet.cell(row_index, 2).value  # Колонка B - "Неделя"
-            if not week_cell:
-                logger.error(f"Не могу определить неделю в строке {row_index}")
-                return False
-
-            try:
-                week = float(week_cell)
-            except:
-                logger.error(f"Неверный формат недели: {week_cell}")
-                return False
-
-            # 2. Проверяем, не записан ли уже на эту неделю
-            if not self.can_user_book_this_week(user_id, week):
-                logger.warning(f"Пользователь {user_id} уже записан на неделю {week}")
-                return False
-
-            # 3. Проверяем, не записан ли уже в этой строке
-            row_values = worksheet.row_values(row_index)
-            user_id_str = str(user_id)
-
-            for col in range(7, 47):  # Студент1-40 (колонки G-AT)
-                if col - 1 < len(row_values):
-                    cell_value = str(row_values[col - 1]).strip()
-                    if cell_value and f"{user_id_str}|" in cell_value:
-                        logger.warning(f"❌ Пользователь {user_id} уже записан в строке {row_index}")
-                        return False
-
-            # 4. Определяем тариф и макс. места
-            tariff = worksheet.cell(row_index, 1).value
-            if tariff == "Базовый":
-                max_seats = 4
-            elif tariff == "Основной":
-                max_seats = 3
-            else:
-                max_seats = 1
-
-            # 5. Ищем свободное место
-            for seat_num in range(1, max_seats + 1):
-                col = 6 + seat_num  # 7, 8, 9... (G, H, I...)
-                cell_value = worksheet.cell(row_index, col).value
-
-                if not cell_value or str(cell_value).strip() == '':
-                    # Записываем
-                    student_info = f"{user_id}|{full_name}|{username or 'нет'}"
-                    worksheet.update_cell(row_index, col, student_info)
-
-                    logger.info(f"✅ Запись: строка {row_index}, место {seat_num}/{max_seats}, ID={user_id}")
-
-                    # ОЧИЩАЕМ КЭШ ПОСЛЕ УСПЕШНОЙ ЗАПИСИ
-                    self.invalidate_cache()
-
-                    return True
-
-            logger.warning(f"❌ Нет свободных мест в строке {row_index}")
-            return False
-
-        except Exception as e:
-            logger.error(f"❌ Ошибка записи: {e}")
-            return False
+        return self.book_batch([BookingRequest("practice", row_index, user_id, full_name, username)])[0]
 
     def format_date(self, date_str: str) -> str:
         """Форматируем дату: '2024-12-10' → '10 декабря'"""
-        try:
-            if not any(c.isdigit() for c in date_str):
-                return date_str
-
-            date_part = date_str.split()[0]
-
-            # Пробуем разные форматы
-            for fmt in ("%Y-%m-%d", "%d.%m.%Y", "%d/%m/%Y", "%d-%m-%Y"):
-                try:
-                    dt = datetime.strptime(date_part, fmt)
-                    break
-                except ValueError:
-                    continue
-            else:
-                return date_str
-
-            months = {
-                1: "января", 2: "февраля", 3: "марта", 4: "апреля",
-                5: "мая", 6: "июня", 7: "июля", 8: "августа",
-                9: "сентября", 10: "октября", 11: "ноября", 12: "декабря"
-            }
-
-            return f"{dt.day} {months[dt.month]}"
-
-        except Exception:
-            return date_str
+        return format_date(date_str)
 
     def get_user_bookings(self, user_id: int, username: str = "", full_name: str = ""):
         """Найти записи пользователя"""
         try:
-            worksheet = self.spreadsheet.worksheet("Расписание")
-            data = worksheet.get_all_records()
-            df = pd.DataFrame(data)
-
-            if df.empty:
-                return []
-
+            index = self.get_index()
             bookings = []
 
-            for _, row in df.iterrows():
-                for i in range(1, 41):  # Студент1-40
-                    seat_col = f"Студент{i}"
-                    student_cell = str(row.get(seat_col, '')).strip()
-
-                    if not student_cell or '|' not in student_cell:
-                        continue
-
-                    # данные студента: "user_id|full_name|username"
-                    parts = student_cell.split('|')
-                    if len(parts) < 3:
-                        continue
-
-                    cell_user_id = parts[0].strip()
-                    cell_full_name = parts[1].strip()
-                    cell_username = parts[2].strip()
-
-                    # совпадение
-                    if (cell_user_id == str(user_id) or
-                            (username and f"@{username}" in cell_username) or
-                            (full_name and full_name.lower() in cell_full_name.lower())):
-
-                        date_str = str(row['Дата']).split()[0]
-                        date_display = self.format_date(date_str)
-
-                        time_str = str(row['Время'])
-                        if ' ' in time_str:
-                            time_str = time_str.split()[0][:5]
-                        else:
-                            time_str = time_str[:5]
+            # совпадение по user_id, @username или ФИО - через обратный индекс
+            for booking in index.find_bookings(user_id, username, full_name):
+                row = index.rows[booking.row_index]
+                if row.week is None:
+                    continue
 
-                        bookings.append({
-                            'date': date_display,
-                            'time': time_str,
-                            'week': row.get('Неделя', ''),
-                        })
-                        break
+                bookings.append({
+                    'date': row.date_display,
+                    'time': row.time_display,
+                    'week': row.week,
+                })
 
             logger.info(f"Найдено записей для user_id={user_id}: {len(bookings)}")
             return bookings
@@ -537,27 +829,9 @@ class GoogleSheetsManager:
     def is_user_already_booked(self, user_id: int, date_str: str) -> bool:
         """Проверяет, записан ли пользователь уже на эту дату"""
         try:
-            worksheet = self.spreadsheet.worksheet("Расписание")
-            data = worksheet.get_all_records()
-            df = pd.DataFrame(data)
-
-            if df.empty:
-                return False
-
-            # Проверяем все столбцы Студент1-40
-            for i in range(1, 41):
-                seat_col = f"Студент{i}"
-                # Фильтруем строки где в этом столбце есть наш user_id
-                mask = df[seat_col].astype(str).str.contains(str(user_id))
-                matching_rows = df[mask]
-
-                # Проверяем даты в найденных строках
-                for _, row in matching_rows.iterrows():
-                    row_date = str(row['Дата']).split()[0]
-                    if row_date == date_str.split()[0]:
-                        logger.info(f"Пользователь {user_id} уже записан на {date_str}")
-                        return True
-
+            if self.get_index().is_booked_on_date(user_id, date_str):
+                logger.info(f"Пользователь {user_id} уже записан на {date_str}")
+                return True
             return False
 
         except Exception as e:
@@ -567,60 +841,15 @@ class GoogleSheetsManager:
     def can_user_book_this_week(self, user_id: int, week: float, check_only_practice=True) -> bool:
         """Может ли пользователь записаться на эту неделю"""
         try:
-            data = self._get_full_data()
-            user_id_str = str(user_id)
-
             logger.info(f"🔍 ПРОВЕРКА недели {week} для user_id={user_id}")
-            logger.info(f"📊 Всего записей в кэше: {len(data)}")
-
-            found_in_week = False
-
-            for idx, row in enumerate(data, 1):
-                # 1. Получаем неделю из строки
-                row_week_raw = str(row.get('Неделя', '')).strip()
-                logger.debug(f"Строка {idx}: неделя='{row_week_raw}'")
-
-                try:
-                    row_week = float(row_week_raw)
-                except:
-                    continue  # Не число
-
-                # 2. Сравниваем недели
-                if abs(row_week - float(week)) > 0.01:  # Допуск для float
-                    continue
-
-                found_in_week = True
-                logger.info(f"📅 Нашли запись недели {week}: строка {idx}")
-                logger.info(f"   Тариф: '{row.get('Тариф', '')}'")
-
-                # 3. Проверяем все 10 колонок студентов
-                user_found_in_row = False
-                for i in range(1, 26):
-                    col_name = f"Студент{i}"
-                    cell_value = str(row.get(col_name, '')).strip()
-
-                    if cell_value and f"{user_id_str}|" in cell_value:
-                        user_found_in_row = True
-                        logger.info(f"   ❌ Найден в {col_name}: '{cell_value}'")
-                        break
-
-                # 4. Если пользователь найден в этой строке
-                if user_found_in_row:
-                    tariff = str(row.get('Тариф', '')).strip()
-
-                    if tariff == "Тренинг":
-                        if check_only_practice:
-                            logger.info(f"   📘 Это тренинг, игнорируем для проверки практики")
-                            continue
-                        else:
-                            logger.info(f"   ❌ Уже записан на тренинг недели {week}")
-                            return False
-                    else:
-                        logger.info(f"   ❌ Уже записан на практику недели {week} (тариф: {tariff})")
-                        return False
 
-            if not found_in_week:
-                logger.info(f"📭 Вообще не найдено записей недели {week}")
+            booking = self.get_index().is_booked_in_week(user_id, week, check_only_practice)
+            if booking:
+                if booking.tariff == TRAINING_TARIFF:
+                    logger.info(f"   ❌ Уже записан на тренинг недели {week} (строка {booking.row_index})")
+                else:
+                    logger.info(f"   ❌ Уже записан на практику недели {week} (тариф: {booking.tariff})")
+                return False
 
             logger.info(f"✅ Пользователь {user_id} может записаться на неделю {week}")
             return True
@@ -641,68 +870,29 @@ class GoogleSheetsManager:
                 logger.info("📭 Неделя тренингов = 0, возвращаем пустой список")
                 return []
 
-            data = self._get_full_data()
+            index = self.get_index()
 
-            if not data:
+            if not index.rows:
                 return []
 
             trainings = []
-            MAX_SEATS = 25
-
-            for idx, row in enumerate(data, start=2):
-                # Проверяем тариф
-                tariff = str(row.get('Тариф', '')).strip()
-                if tariff != "Тренинг":
-                    continue
-
-                # Проверяем неделю (строгое равенство)
-                try:
-                    row_week = float(str(row.get('Неделя', 0)))
-                except:
-                    continue
-
-                if abs(row_week - current_week) > 0.01:
-                    continue
-
-                # Проверяем статус
-                status = str(row.get('Статус', '')).strip().lower()
-                if status != 'активно':
-                    continue
-
-                # Проверка даты
-                date_str = str(row.get('Дата', '')).split()[0]
-                time_str = str(row.get('Время', ''))
+            now = datetime.now()
 
-                if not self.is_future_date(date_str, time_str):
-                    logger.info(f"Пропускаем прошедший тренинг: {date_str} {time_str}")
+            for row in index.rows_for(current_week, TRAINING_TARIFF, ACTIVE_STATUS):
+                if not row.is_future(now):
+                    logger.info(f"Пропускаем прошедший тренинг: {row.date_str} {row.time_str}")
                     continue
 
                 # НЕ проверяем user_id здесь - это делается в хендлере
                 # Это позволяет показать корректное сообщение "вы уже записаны"
 
-                # Форматируем дату и время
-                date_display = self.format_date(date_str)
-                if ' ' in time_str:
-                    time_str = time_str.split()[0][:5]
-                else:
-                    time_str = time_str[:5]
-
-                # Считаем занятые места
-                booked = 0
-                for i in range(1, 41):  # Студент1-40
-                    col_name = f"Студент{i}"
-                    cell_value = str(row.get(col_name, '')).strip()
-                    if cell_value:
-                        booked += 1
-
-                available = MAX_SEATS - booked
-                if available > 0:
+                if row.available > 0:
                     trainings.append({
-                        'row_index': idx,
-                        'date': date_display,
-                        'time': time_str,
-                        'available': available,
-                        'max_seats': MAX_SEATS,
+                        'row_index': row.row_index,
+                        'date': row.date_display,
+                        'time': row.time_display,
+                        'available': row.available,
+                        'max_seats': row.max_seats,
                         'week': current_week,
                     })
 
@@ -714,25 +904,24 @@ class GoogleSheetsManager:
             return []
 
     def get_training_details(self, row_index: int):
+        """Дата и время тренинга из снимка, без запроса к таблице"""
         try:
-            worksheet = self.spreadsheet.worksheet("Расписание")
-            row_values = worksheet.row_values(row_index)
-
-            if len(row_values) < 5:
+            row = self.get_index().rows.get(row_index)
+            if row is not None:
+                return {
+                    'date': row.date_display,
+                    'time': row.time_display,
+                    'row_index': row_index
+                }
+
+            row_values = self._read_row(row_index)
+            if not any(row_values[:5]):
                 return None
 
-            date_str = row_values[2].split()[0] if len(row_values) > 2 else ""
-            date_display = self.format_date(date_str)
-
-            time_str = row_values[3] if len(row_values) > 3 else ""
-            if ' ' in time_str:
-                time_str = time_str.split()[0][:5]
-            else:
-                time_str = time_str[:5]
-
+            date_parts = row_values[2].split()
             return {
-                'date': date_display,
-                'time': time_str,
+                'date': self.format_date(date_parts[0] if date_parts else ""),
+                'time': short_time(row_values[3]),
                 'row_index': row_index
             }
 
@@ -742,81 +931,346 @@ class GoogleSheetsManager:
 
     def book_training(self, row_index: int, user_id: int, full_name: str, username: str) -> bool:
         """Запись на тренинг с проверкой недели из B4"""
-        try:
-            worksheet = self.spreadsheet.worksheet("Расписание")
-
-            # 1. Проверяем неделю тренинга в строке
-            week_cell = worksheet.cell(row_index, 2).value
-            if week_cell:
-                try:
-                    training_week_in_row = float(week_cell)
-                    # Получаем текущую неделю тренингов ИЗ B4
-                    current_training_week = self.get_training_week_number()
-
-                    # Строгое сравнение недель
-                    if abs(training_week_in_row - current_training_week) > 0.01:
-                        logger.warning(
-                            f"❌ Тренинг недели {training_week_in_row} не доступен "
-                            f"(текущая неделя тренингов из B4: {current_training_week})"
-                        )
-                        return False
-                except Exception as e:
-                    logger.error(f"Ошибка проверки недели: {e}")
+        return self.book_batch([BookingRequest("training", row_index, user_id, full_name, username)])[0]
 
-            # 2. Проверяем, не прошедший ли тренинг
-            date_str = worksheet.cell(row_index, 3).value
-            time_str = worksheet.cell(row_index, 4).value
 
-            if not self.is_future_date(date_str, time_str):
-                logger.warning(f"❌ Попытка записаться на прошедший тренинг: {date_str} {time_str}")
-                return False
+class BookingQueue:
+    """Очередь подтверждений записи.
 
-            # 3. Проверяем, не записан ли уже
-            row_values = worksheet.row_values(row_index)
-            user_id_str = str(user_id)
+    Собирает записи разных пользователей за короткое окно и отправляет их
+    одним вызовом GoogleSheetsManager.book_batch; каждый вызывающий получает
+    свой результат через future.
+    """
 
-            for col in range(7, 47):  # Студент1-40 (колонки G-AT)
-                if col - 1 < len(row_values):
-                    cell_value = str(row_values[col - 1]).strip()
-                    if cell_value and f"{user_id_str}|" in cell_value:
-                        logger.warning(f"❌ Пользователь {user_id} уже записан на этот тренинг")
-                        return False
+    def __init__(self, run, book_batch, window: float):
+        self._run = run
+        self._book_batch = book_batch
+        self.window = window
+        self._pending = []
+        self._flush_task = None
 
-            # 4. Проверяем неделю для ограничения записи
-            if week_cell:
-                try:
-                    week = float(week_cell)
-                    if not self.can_user_book_this_week(user_id, week, check_only_practice=False):
-                        logger.warning(f"Пользователь {user_id} уже записан на неделю {week} (тренинг или практика)")
-                        return False
-                except Exception as e:
-                    logger.error(f"Ошибка проверки ограничения недели: {e}")
+    async def submit(self, request: BookingRequest) -> bool:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((request, future))
 
-            # 5. Ищем свободное место
-            MAX_SEATS = 40  # Студент1-40
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
 
-            for seat_num in range(1, MAX_SEATS + 1):
-                col = 6 + seat_num  # 7, 8, 9, ..., 46 (G-AT)
-                cell_value = worksheet.cell(row_index, col).value
+        return await future
 
-                if not cell_value or str(cell_value).strip() == '':
-                    # Записываем
-                    student_info = f"{user_id}|{full_name}|{username or 'нет'}"
-                    worksheet.update_cell(row_index, col, student_info)
+    async def _flush_later(self):
+        await asyncio.sleep(self.window)
 
-                    logger.info(f"✅ Запись на тренинг: строка {row_index}, место {seat_num}/{MAX_SEATS}")
+        batch, self._pending = self._pending, []
+        self._flush_task = None
 
-                    # Очищаем кэш
-                    self.invalidate_cache()
+        try:
+            results = await self._run(self._book_batch, [request for request, _ in batch])
+        except Exception as e:
+            logger.error(f"❌ Ошибка пакетной записи: {e}")
+            results = [False] * len(batch)
+
+        for (_, future), success in zip(batch, results):
+            if not future.done():
+                future.set_result(success)
+
+
+class JournalFlusher:
+    """Фоновая задача: переносит записи из журнала в таблицу.
+
+    Просыпается после каждой принятой записи или раз в interval секунд
+    (так же досылаются записи, оставшиеся в журнале после перезапуска).
+    При ошибках API повторяет попытки с экспоненциальной задержкой.
+    """
+
+    def __init__(self, run, flush, interval: float, take_dropped=None, mark_reported=None, prune=None,
+                 prune_interval: float = 3600, max_backoff: float = 60):
+        self._run = run
+        self._flush = flush
+        self._take_dropped = take_dropped
+        self._mark_reported = mark_reported
+        self._prune = prune
+        self.interval = interval
+        self.prune_interval = prune_interval
+        self.max_backoff = max_backoff
+        # async-обработчик записей, не перенесенных из-за нехватки мест (сообщить пользователю)
+        self.on_dropped = None
+        self._wakeup = None
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._loop())
+
+    def notify(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
 
-                    return True
+        # Последняя попытка перенести записи перед остановкой
+        try:
+            await self._run(self._flush)
+        except Exception as e:
+            logger.warning(f"⚠️ Записи остались в журнале до следующего запуска: {e}")
+        await self._report_dropped()
 
-            logger.warning(f"❌ Нет свободных мест на тренинге (строка {row_index})")
-            return False
+    async def _report_dropped(self):
+        """Сообщить о записях без места; не сообщенные остаются в журнале до следующей попытки"""
+        if self._take_dropped is None or self.on_dropped is None:
+            return
+        try:
+            dropped = await self._run(self._take_dropped)
+            if dropped:
+                await self.on_dropped(dropped)
+                await self._run(self._mark_reported, dropped)
+        except Exception as e:
+            logger.error(f"❌ Не удалось сообщить о непринятых записях, повтор позже: {e}")
 
+    async def _prune_if_due(self, pruned_at: float) -> float:
+        """Почистить журнал, если пора; возвращает время последней чистки"""
+        if self._prune is None or time.monotonic() - pruned_at < self.prune_interval:
+            return pruned_at
+        try:
+            await self._run(self._prune)
         except Exception as e:
-            logger.error(f"❌ Ошибка записи на тренинг: {e}")
-            return False
+            logger.warning(f"⚠️ Не удалось почистить журнал записей: {e}")
+        return time.monotonic()
+
+    async def _loop(self):
+        delay = self.interval
+        # Первая чистка - при старте
+        pruned_at = float("-inf")
+        while True:
+            try:
+                if delay > self.interval:
+                    await asyncio.sleep(delay)
+                else:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            try:
+                while await self._run(self._flush) >= config.JOURNAL_FLUSH_BATCH:
+                    pass
+                delay = self.interval
+            except Exception as e:
+                delay = min(max(delay, 1) * 2, self.max_backoff)
+                logger.warning(f"⚠️ Не удалось перенести записи в таблицу, повтор через {delay:.0f} с: {e}")
+
+            await self._report_dropped()
+            pruned_at = await self._prune_if_due(pruned_at)
+
+
+class SnapshotRefresher:
+    """Фоновая задача: обновляет снимок таблицы раньше, чем он устареет.
+
+    Раз в report_interval секунд пишет в лог строку report() - загрузку квоты и статистику чтений.
+    """
+
+    def __init__(self, run, refresh, interval: float, report=None, report_interval: float = 0):
+        self._run = run
+        self._refresh = refresh
+        self.interval = interval
+        self._report = report
+        self.report_interval = report_interval
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _loop(self):
+        reported_at = time.monotonic()
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self._run(self._refresh)
+            except Exception as e:
+                logger.error(f"❌ Ошибка фонового обновления снимка: {e}")
+            reported_at = self._report_if_due(reported_at)
+
+    def _report_if_due(self, reported_at: float) -> float:
+        now = time.monotonic()
+        if self._report is None or self.report_interval <= 0 or now - reported_at < self.report_interval:
+            return reported_at
+        try:
+            logger.info(f"📈 {self._report()}")
+        except Exception as e:
+            logger.error(f"❌ Ошибка отчета о квоте и чтениях: {e}")
+        return now
+
+
+class AsyncGoogleSheetsManager:
+    """Асинхронный фасад над GoogleSheetsManager.
+
+    Блокирующие вызовы gspread выполняются в ограниченном пуле потоков,
+    поэтому хендлеры не останавливают event loop на время запросов к Google,
+    а запросы разных пользователей выполняются параллельно.
+    """
+
+    def __init__(self, manager: GoogleSheetsManager, max_workers: int = None):
+        self.manager = manager
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or config.SHEETS_MAX_WORKERS,
+            thread_name_prefix="gsheets"
+        )
+        self._bookings = BookingQueue(self._run, manager.book_batch, config.BOOKING_BATCH_WINDOW)
+        self._flusher = JournalFlusher(
+            self._run, manager.flush_journal, config.JOURNAL_FLUSH_INTERVAL,
+            take_dropped=manager.take_dropped, mark_reported=manager.mark_dropped_reported,
+            prune=manager.prune_journal,
+            prune_interval=config.JOURNAL_PRUNE_INTERVAL
+        )
+        self._refresher = SnapshotRefresher(
+            self._run, manager.refresh, config.SNAPSHOT_REFRESH_INTERVAL,
+            report=self.stats_report, report_interval=config.STATS_REPORT_INTERVAL
+        )
+        # Одинаковые чтения, которые уже выполняются, - общая задача на всех ожидающих
+        self._inflight = {}
+        self.calls = Counter()
+        self.coalesced = Counter()
+
+    async def _run(self, func, *args, **kwargs):
+        """Выполнить синхронный метод менеджера в пуле потоков"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def _shared(self, func, *args):
+        """Выполнить чтение или присоединиться к такому же, уже идущему (метод + аргументы).
+
+        Когда после смены недели все разом жмут "Запись на практику", в пул
+        потоков уходит один вызов на каждую уникальную пару метод/аргументы.
+        Результат общий для всех ожидающих - менять его нельзя.
+        """
+        name = func.__name__
+        key = (name, args)
+        self.calls[name] += 1
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._run(func, *args))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced[name] += 1
+        # shield: отмена одного ожидающего не отменяет вызов для остальных
+        return await asyncio.shield(task)
+
+    def coalescing_stats(self) -> dict:
+        """Сколько чтений запрошено и сколько из них присоединилось к уже идущим, по методам"""
+        return {name: {"calls": self.calls[name], "coalesced": self.coalesced[name]} for name in self.calls}
+
+    def stats_report(self) -> str:
+        """Строка для лога: загрузка квоты Sheets и чтения по методам, самые частые первыми"""
+        stats = sorted(self.coalescing_stats().items(), key=lambda item: -item[1]["calls"])
+        reads = ", ".join(f"{name} {s['calls']} (общих {s['coalesced']})" for name, s in stats)
+        return f"{self.manager.quota.report()}; чтения: {reads or 'нет'}"
+
+    async def start(self, flush_journal: bool = True, on_dropped=None):
+        """Подключиться, загрузить первый снимок и запустить фоновые задачи:
+        обновление снимка и перенос журнала в таблицу (в том числе записей с прошлого запуска).
+
+        Если процессов несколько, журнал переносит только один из них (flush_journal=True),
+        иначе два процесса могут вписать разных студентов в одно и то же место.
+        on_dropped(list[DroppedBooking]) - async-обработчик записей, для которых
+        при переносе не нашлось места.
+        """
+        self._flusher.on_dropped = on_dropped
+        await self._run(self.manager._ensure_connected)
+        await self._run(self.manager.refresh, Priority.READ)
+        self._refresher.start()
+        if flush_journal:
+            self._flusher.start()
+            self._flusher.notify()
+
+    async def warmup(self):
+        """Прогреть пути просмотра до приема апдейтов (первый пользователь не ждет)"""
+        await self._run(self.manager.warmup)
+
+    async def close(self):
+        """Дописать журнал в таблицу и остановить фоновые задачи и пул потоков"""
+        await self._refresher.stop()
+        await self._flusher.stop()
+        self._executor.shutdown(wait=False)
+
+    async def get_available_tariffs(self):
+        return await self._shared(self.manager.get_available_tariffs)
+
+    async def get_current_week_number(self) -> int:
+        return await self._shared(self.manager.get_current_week_number)
+
+    async def get_training_week_number(self) -> int:
+        return await self._shared(self.manager.get_training_week_number)
+
+    async def get_available_weeks(self, tariff: str):
+        return await self._shared(self.manager.get_available_weeks, tariff)
+
+    async def get_available_slots(self, tariff: str, week: float):
+        return await self._shared(self.manager.get_available_slots, tariff, week)
+
+    async def get_available_slots_for_user(self, tariff: str, week: float, user_id: int):
+        return await self._shared(self.manager.get_available_slots_for_user, tariff, week, user_id)
+
+    async def get_slots_view(self, tariff: str, user_id: int) -> SlotsView:
+        return await self._shared(self.manager.get_slots_view, tariff, user_id)
+
+    async def get_slot(self, tariff: str, week: float, row_index: int):
+        return await self._shared(self.manager.get_slot, tariff, week, row_index)
+
+    @property
+    def snapshot_version(self) -> int:
+        return self.manager.snapshot_version
+
+    async def get_records(self, priority: Priority = Priority.READ):
+        return await self._shared(self.manager.get_records, priority)
+
+    async def get_index(self, priority: Priority = Priority.READ) -> ScheduleIndex:
+        return await self._shared(self.manager.get_index, priority)
+
+    async def can_user_book_this_week(self, user_id: int, week: float, check_only_practice=True) -> bool:
+        return await self._shared(self.manager.can_user_book_this_week, user_id, week, check_only_practice)
+
+    async def get_available_trainings(self, user_id: int = None):
+        return await self._shared(self.manager.get_available_trainings, user_id)
+
+    async def get_training_details(self, row_index: int):
+        return await self._shared(self.manager.get_training_details, row_index)
+
+    async def get_user_bookings(self, user_id: int, username: str = "", full_name: str = ""):
+        return await self._shared(self.manager.get_user_bookings, user_id, username, full_name)
+
+    async def book_slot(self, row_index: int, user_id: int, full_name: str, username: str) -> bool:
+        return await self._book(BookingRequest("practice", row_index, user_id, full_name, username))
+
+    async def book_training(self, row_index: int, user_id: int, full_name: str, username: str) -> bool:
+        return await self._book(BookingRequest("training", row_index, user_id, full_name, username))
+
+    async def _book(self, request: BookingRequest) -> bool:
+        success = await self._bookings.submit(request)
+        if success:
+            self._flusher.notify()
+        return success
 
 
 gsheets = GoogleSheetsManager()
+asheets = AsyncGoogleSheetsManager(gsheets)
@@ -1,15 +1,15 @@
 
+import asyncio
 import logging
 from aiogram import Router, types, F
 from aiogram.fsm.context import FSMContext
 from aiogram.filters import StateFilter
 
 from states import BookingStates
-from gsheets import gsheets
+from gsheets import asheets
+from views import view_cache
 from keyboards import (
-    tariffs_keyboard,
     weeks_keyboard,
-    slots_keyboard,
     confirm_keyboard,
     main_menu,
     trainings_keyboard
@@ -30,7 +30,7 @@ async def start_booking(callback: types.CallbackQuery, state: FSMContext):
     logger.info(f"Начало записи для пользователя {callback.from_user.id}")
 
     # Получаем доступные тарифы из Google Sheets
-    tariffs = gsheets.get_available_tariffs()
+    tariffs = await asheets.get_available_tariffs()
     logger.info(f"Получены тарифы: {tariffs}")
 
     if not tariffs:
@@ -47,7 +47,7 @@ async def start_booking(callback: types.CallbackQuery, state: FSMContext):
 
     await callback.message.edit_text(
         "📋 Выберите тариф:",
-        reply_markup=tariffs_keyboard(tariffs)
+        reply_markup=view_cache.tariffs(tariffs)
     )
 
 
@@ -60,20 +60,13 @@ async def choose_tariff(callback: types.CallbackQuery, state: FSMContext):
     await callback.answer()
 
     tariff = callback.data.split(":")[1]
-    logger.info(f"Пользователь {callback.from_user.id} выбрал тариф: {tariff}")
-
-    weeks = gsheets.get_available_weeks(tariff)
-
-    if not weeks:
-        await callback.message.edit_text(
-            f"❌ Нет доступных слотов для тарифа '{tariff}'.\n"
-            "Попробуйте на следующей неделе!",
-            reply_markup=main_menu()
-        )
-        await state.clear()
-        return
+    user_id = callback.from_user.id
+    logger.info(f"Пользователь {user_id} выбрал тариф: {tariff}")
 
-    current_week = weeks[0]
+    # Неделя, слоты и проверка пользователя - из одного снимка таблицы
+    view = await asheets.get_slots_view(tariff, user_id)
+    current_week = view.week
+    slots = view.slots
 
     # ПРОВЕРКА: если неделя = 0
     if current_week <= 0:
@@ -84,14 +77,11 @@ async def choose_tariff(callback: types.CallbackQuery, state: FSMContext):
         await state.clear()
         return
 
-    await state.update_data(tariff=tariff, week=current_week)
+    await state.update_data(tariff=tariff, week=current_week, snapshot_version=view.version)
     await state.set_state(BookingStates.choose_slot)
 
-    user_id = callback.from_user.id
-    slots = gsheets.get_available_slots_for_user(tariff, current_week, user_id)
-
     if not slots:
-        if not gsheets.can_user_book_this_week(user_id, current_week):
+        if view.already_booked:
             # Пользователь уже записан на эту неделю
             await callback.message.edit_text(
                 f"❌ Вы уже записаны на практику на неделе {int(current_week)}!",
@@ -108,16 +98,12 @@ async def choose_tariff(callback: types.CallbackQuery, state: FSMContext):
         await state.clear()
         return
 
-    slots_text = "\n".join([
-        f"{i}. {slot['date']} {slot['time']} ({slot['available']}/{slot['max_seats']} мест)"
-        for i, slot in enumerate(slots, 1)
-    ])
+    # Текст и клавиатура - общие для всех, кто видит те же слоты в этой версии снимка
+    text, keyboard = view_cache.slots(tariff, view)
 
     await callback.message.edit_text(
-        f"📅 Тариф: <b>{tariff}</b>\n"
-        f"🗓️ Неделя: <b>{int(current_week)}</b>\n\n"
-        f"🕐 Выберите удобное время:\n\n{slots_text}",
-        reply_markup=slots_keyboard(slots, tariff, current_week),
+        text,
+        reply_markup=keyboard,
         parse_mode="HTML"
     )
 
@@ -140,18 +126,19 @@ async def choose_slot(callback: types.CallbackQuery, state: FSMContext):
 
     logger.info(f"Пользователь {callback.from_user.id} выбрал слот: строка {row_index}")
 
-    # Сохраняем всё в состояние
+    # Получаем детали слота для подтверждения из текущего снимка
+    version = asheets.snapshot_version
+    selected_slot = await asheets.get_slot(tariff, week, row_index)
+
+    # Сохраняем всё в состояние вместе с версией снимка, по которой проверен слот
     await state.update_data(
         tariff=tariff,
         week=week,
-        row_index=row_index
+        row_index=row_index,
+        snapshot_version=version
     )
     await state.set_state(BookingStates.confirm_booking)
 
-    # Получаем детали слота для подтверждения
-    slots = gsheets.get_available_slots(tariff, week)
-    selected_slot = next((s for s in slots if s['row_index'] == row_index), None)
-
     if not selected_slot:
         await callback.message.edit_text("❌ Этот слот больше не доступен")
         await state.clear()
@@ -192,13 +179,13 @@ async def back_to_tariffs(callback: types.CallbackQuery, state: FSMContext):
     tariffs = data.get('tariffs', [])
 
     if not tariffs:
-        tariffs = gsheets.get_available_tariffs()
+        tariffs = await asheets.get_available_tariffs()
 
     await state.set_state(BookingStates.choose_tariff)
 
     await callback.message.edit_text(
         "📋 Выберите тариф:",
-        reply_markup=tariffs_keyboard(tariffs)
+        reply_markup=view_cache.tariffs(tariffs)
     )
 
 
@@ -227,7 +214,18 @@ async def confirm_booking(callback: types.CallbackQuery, state: FSMContext):
     full_name = user.full_name
     username = user.username or ""
 
-    if gsheets.book_slot(row_index, user.id, full_name, username):
+    # Снимок изменился с момента выбора слота - перепроверяем слот (поиск в памяти, без запроса к таблице)
+    data = await state.get_data()
+    if data.get('snapshot_version') != asheets.snapshot_version:
+        if not await asheets.get_slot(tariff, week, row_index):
+            await callback.message.edit_text(
+                "❌ Этот слот больше не доступен",
+                reply_markup=main_menu()
+            )
+            await state.clear()
+            return
+
+    if await asheets.book_slot(row_index, user.id, full_name, username):
         await callback.message.edit_text(
             f"✅ <b>Вы записаны!</b>\n\n"
             f"Неделя: <b>{int(week)}</b>\n"
@@ -274,7 +272,7 @@ async def show_trainings(callback: types.CallbackQuery):
     logger.info(f"Пользователь {user.id} смотрит тренинги")
 
     # Проверяем неделю из B4
-    training_week = gsheets.get_training_week_number()
+    training_week = await asheets.get_training_week_number()
 
     if training_week <= 0:
         await callback.message.edit_text(
@@ -284,7 +282,7 @@ async def show_trainings(callback: types.CallbackQuery):
         return
 
     # Проверяем, может ли пользователь вообще записаться (ДО получения списка)
-    if not gsheets.can_user_book_this_week(user.id, training_week, check_only_practice=False):
+    if not await asheets.can_user_book_this_week(user.id, training_week, check_only_practice=False):
         await callback.message.edit_text(
             f"❌ Вы уже записаны на тренинг или практику на неделе {int(training_week)}!",
             reply_markup=main_menu()
@@ -292,7 +290,7 @@ async def show_trainings(callback: types.CallbackQuery):
         return
 
     # Получаем тренинги (без проверки user_id, т.к. уже проверили выше)
-    trainings = gsheets.get_available_trainings()
+    trainings = await asheets.get_available_trainings()
 
     if not trainings:
         await callback.message.edit_text(
@@ -320,15 +318,18 @@ async def book_training(callback: types.CallbackQuery):
     logger.info(f"Пользователь {user.id} записывается на тренинг: строка {row_index}")
 
     # Записываем сразу
-    success = gsheets.book_training(row_index, user.id, user.full_name, user.username or "")
+    success = await asheets.book_training(row_index, user.id, user.full_name, user.username or "")
 
     if success:
-        # Получаем детали тренинга для сообщения
-        training = gsheets.get_training_details(row_index)
+        # Получаем детали тренинга и неделю для сообщения параллельно
+        training, training_week = await asyncio.gather(
+            asheets.get_training_details(row_index),
+            asheets.get_training_week_number()
+        )
         if training:
             message = (
                 f"🎓 <b>Вы записаны на тренинг!</b>\n\n"
-                f"Неделя: <b>{int(gsheets.get_training_week_number())}</b>\n"
+                f"Неделя: <b>{int(training_week)}</b>\n"
                 f"Дата: <b>{training['date']}</b>\n"
                 f"Время: <b>{training['time']}</b>\n"
             )
@@ -3,7 +3,7 @@ import logging
 from aiogram import Router, types, F
 from aiogram.fsm.context import FSMContext
 
-from gsheets import gsheets
+from gsheets import asheets
 from keyboards import main_menu
 
 router = Router()
@@ -17,7 +17,7 @@ async def show_my_bookings(callback: types.CallbackQuery):
     await callback.answer()
 
     user = callback.from_user
-    bookings = gsheets.get_user_bookings(
+    bookings = await asheets.get_user_bookings(
         user_id=user.id,
         username=user.username or "",
         full_name=user.full_name
@@ -0,0 +1,185 @@
+# journal.py
+import logging
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+FLUSHED = "flushed"
+FAILED = "failed"
+DROPPED = "dropped"  # при переносе не нашлось места, студенту еще не сообщили
+
+
+class JournalEntry(NamedTuple):
+    """Запись студента, подтвержденная пользователю, но, возможно, еще не перенесенная в таблицу"""
+    key: str  # идемпотентный ключ kind:row_index:user_id
+    kind: str  # "practice" | "training"
+    row_index: int
+    user_id: int
+    full_name: str
+    username: str
+    seat_num: int
+    status: str = PENDING
+    attempts: int = 0
+
+    @staticmethod
+    def make_key(kind: str, row_index: int, user_id: int) -> str:
+        return f"{kind}:{row_index}:{user_id}"
+
+
+class BookingJournal:
+    """Локальный журнал записей (SQLite в режиме WAL).
+
+    Запись считается принятой, как только она зафиксирована в журнале;
+    в Google Sheets её переносит фоновый JournalFlusher. Ожидающие записи
+    переживают перезапуск и досылаются при старте.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None  # файл базы открывается при первом обращении, а не при импорте
+
+    def _db(self) -> sqlite3.Connection:
+        """Соединение с журналом (вызывать под self._lock)"""
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS bookings (
+                    key TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    row_index INTEGER NOT NULL,
+                    user_id INTEGER NOT NULL,
+                    full_name TEXT NOT NULL,
+                    username TEXT NOT NULL,
+                    seat_num INTEGER NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS bookings_status ON bookings (status)")
+            (waiting,) = conn.execute("SELECT COUNT(*) FROM bookings WHERE status = ?", (PENDING,)).fetchone()
+            logger.info(f"📒 Журнал записей: {self.path}, ожидают переноса: {waiting}")
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def _select(conn: sqlite3.Connection, where: str, params: tuple, limit: Optional[int] = None) -> List[JournalEntry]:
+        """Записи по условию в порядке поступления"""
+        query = (
+            "SELECT key, kind, row_index, user_id, full_name, username, seat_num, status, attempts "
+            f"FROM bookings WHERE {where} ORDER BY created_at"
+        )
+        if limit:
+            query += " LIMIT ?"
+            params += (limit,)
+        rows = conn.execute(query, params).fetchall()
+        return [JournalEntry(*row) for row in rows]
+
+    def reserve(self, since: float,
+                plan: Callable[[List[JournalEntry]], List[JournalEntry]]) -> List[JournalEntry]:
+        """Выбрать места и зафиксировать записи одной транзакцией BEGIN IMMEDIATE.
+
+        plan получает overlay(since) - записи всех процессов, которых может
+        не быть в снимке, - и возвращает новые записи. Пока он работает,
+        другие процессы не пишут в журнал, поэтому два процесса не отдадут
+        одно место по своим снимкам. Повтор по тому же ключу заменяет старую запись.
+        """
+        with self._lock:
+            conn = self._db()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                entries = plan(self._select(conn, *self._overlay_filter(since)))
+                now = time.time()
+                conn.executemany(
+                    "INSERT OR REPLACE INTO bookings "
+                    "(key, kind, row_index, user_id, full_name, username, seat_num, status, attempts, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0, ?, ?)",
+                    [
+                        (e.key, e.kind, e.row_index, e.user_id, e.full_name, e.username, e.seat_num, PENDING, now, now)
+                        for e in entries
+                    ]
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return entries
+
+    def pending(self, limit: Optional[int] = None) -> List[JournalEntry]:
+        """Ожидающие переноса записи в порядке поступления"""
+        with self._lock:
+            return self._select(self._db(), "status = ?", (PENDING,), limit)
+
+    @staticmethod
+    def _overlay_filter(since: float):
+        return "status = ? OR (status = ? AND updated_at >= ?)", (PENDING, FLUSHED, since)
+
+    def overlay(self, since: float) -> List[JournalEntry]:
+        """Записи, которых может не быть в снимке, загруженном с момента since:
+        ожидающие и перенесенные в таблицу после since"""
+        with self._lock:
+            return self._select(self._db(), *self._overlay_filter(since))
+
+    def _set_status(self, keys: List[str], status: str, error: str = None, attempt: bool = False):
+        if not keys:
+            return
+        now = time.time()
+        with self._lock:
+            self._db().executemany(
+                "UPDATE bookings SET status = ?, error = ?, updated_at = ?, "
+                "attempts = attempts + ? WHERE key = ?",
+                [(status, error, now, int(attempt), key) for key in keys]
+            )
+
+    def mark_flushed(self, keys: List[str], seats: Dict[str, int] = None):
+        """Отметить перенесенными; seats - место, в которое запись легла на самом деле"""
+        if seats:
+            with self._lock:
+                self._db().executemany(
+                    "UPDATE bookings SET seat_num = ? WHERE key = ?",
+                    [(seat_num, key) for key, seat_num in seats.items()]
+                )
+        self._set_status(keys, FLUSHED)
+
+    def mark_failed(self, key: str, error: str):
+        self._set_status([key], FAILED, error)
+
+    def mark_dropped(self, keys: List[str]):
+        """Места не нашлось: запись ждет, пока о ней сообщат студенту (переживает перезапуск)"""
+        self._set_status(keys, DROPPED, "no free seat")
+
+    def dropped(self) -> List[JournalEntry]:
+        """Записи без места, о которых студентам еще не сообщили"""
+        with self._lock:
+            return self._select(self._db(), "status = ?", (DROPPED,))
+
+    def mark_reported(self, keys: List[str]):
+        """Студенту сообщили, что запись не сохранена"""
+        self._set_status(keys, FAILED, "no free seat")
+
+    def record_attempt(self, keys: List[str], error: str):
+        """Неудачная попытка переноса - запись остается в ожидании"""
+        self._set_status(keys, PENDING, error, attempt=True)
+
+    def prune(self, older_than: float):
+        """Удалить перенесенные и окончательно отклоненные записи старше older_than секунд"""
+        with self._lock:
+            self._db().execute(
+                "DELETE FROM bookings WHERE status IN (?, ?) AND updated_at < ?",
+                (FLUSHED, FAILED, time.time() - older_than)
+            )
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -1,8 +1,12 @@
 # keyboards.py
+from functools import lru_cache
+
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
+@lru_cache(maxsize=1)
 def main_menu() -> InlineKeyboardMarkup:
+    """Главное меню (не меняется - строим один раз)"""
     builder = InlineKeyboardBuilder()
     builder.button(text="🧑‍🏫 Запись на практику", callback_data="book_practice")
     builder.button(text="🎓 Запись на тренинг", callback_data="book_training")
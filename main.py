@@ -1,19 +1,23 @@
 
 import asyncio
 import logging
+import multiprocessing
 from aiogram import Bot, Dispatcher
 from aiogram.fsm.storage.memory import MemoryStorage
-from notifier import Notifier
-import threading
+from notifier import Notifier, ReminderScheduler
 from aiogram.filters import Command
 from aiogram.types import Message
 from aiogram import types
 from aiogram import Router
 
 from config import config
+from gsheets import asheets
+from storage import SQLiteStorage
+from webhook import run_webhook
 from handlers.start import router as start_router
 from handlers.booking import router as booking_router
 from handlers.mybookings import router as my_bookings_router
+from middleware.rate_limit import RateLimitMiddleware
 # from middleware.chat_member import ChatMembershipMiddleware
 
 logging.basicConfig(
@@ -25,52 +29,47 @@ logging.basicConfig(
 notify_router = Router()
 
 @notify_router.message(Command("notify"))
-async def cmd_notify(message: types.Message):
+async def cmd_notify(message: types.Message, notifier: Notifier):
     """Ручной запуск уведомлений"""
-    notifier = Notifier()
     await notifier.run()
     await message.answer("✅ Уведомления проверены и отправлены")
 
-def run_notifier_in_thread():
-    """Запускает notifier в отдельном потоке"""
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-
-    async def task():
-        logger = logging.getLogger(__name__)
-        while True:
-            try:
-                logger.info("🔍 Notifier: checking for reminders...")
-                notifier = Notifier()
-                await notifier.run()
-            except Exception as e:
-                logger.error(f"❌ Notifier error: {e}")
-            await asyncio.sleep(7201)
-
-    loop.run_until_complete(task())
-
-
-
-async def main():
+async def main(process_index: int = 0):
     logger = logging.getLogger(__name__)
-    logger.info("🚀 Запуск бота...")
+    logger.info(f"🚀 Запуск бота ({config.RUN_MODE}, процесс {process_index})...")
+    # Основной процесс регистрирует вебхук, рассылает напоминания и переносит журнал в таблицу
+    primary = process_index == 0
 
     # хранилище состояний FSM
-    storage = MemoryStorage()
+    if config.FSM_STORAGE == "memory":
+        storage = MemoryStorage()
+    else:
+        # Соседние апдейты одного диалога могут попасть в разные процессы - пишем сразу
+        flush_delay = 0 if config.RUN_MODE == "webhook" and config.WEBHOOK_PROCESSES > 1 else config.FSM_FLUSH_DELAY
+        storage = SQLiteStorage(config.FSM_DB_PATH, config.FSM_STATE_TTL, flush_delay)
 
     # диспетчер с хранилищем
     bot = Bot(token=config.BOT_TOKEN)
     dp = Dispatcher(storage=storage)
 
+    # Напоминания и ручной /notify работают в том же event loop и с сессией основного бота
+    notifier = Notifier(bot)
+    dp["notifier"] = notifier
+    reminders = ReminderScheduler(notifier)
+    # Останавливаем до закрытия сессии бота (ее закрывает start_polling или сервер вебхука)
+    dp.shutdown.register(reminders.stop)
+    # Последний перенос журнала и сообщения о записях без места - тоже до закрытия сессии
+    dp.shutdown.register(asheets.close)
+
     dp.include_router(start_router)  # 1. Старт и помощь
     dp.include_router(my_bookings_router)  # 2. Мои записи
     dp.include_router(booking_router)  # 3. Бронирование
     dp.include_router(notify_router)
 
-    notifier_thread = threading.Thread(target=run_notifier_in_thread, daemon=True)
-    notifier_thread.start()
-    logger.info("✅ Фоновые уведомления запущены")
-
+    # Один экземпляр на оба типа событий: общий лимит пользователя
+    rate_limit = RateLimitMiddleware()
+    dp.message.middleware(rate_limit)
+    dp.callback_query.middleware(rate_limit)
 
     # dp.message.middleware(ChatMembershipMiddleware())
     # dp.callback_query.middleware(ChatMembershipMiddleware())
@@ -78,9 +77,57 @@ async def main():
     logger.info(f"✅ Бот создан. Токен: {config.BOT_TOKEN[:10]}...")
     logger.info("📱 Бот запускается...")
 
-
-    await dp.start_polling(bot)
+    # Первый снимок таблицы, фоновое обновление снимка и перенос журнала записей
+    # Если при переносе места в строке уже заняты, студенту сообщает notifier
+    await asheets.start(flush_journal=primary, on_dropped=notifier.notify_dropped)
+    if config.WARMUP_ON_START:
+        await asheets.warmup()
+
+    if primary:
+        reminders.start()
+        logger.info("✅ Фоновые уведомления запущены")
+
+    try:
+        if config.RUN_MODE == "webhook":
+            await run_webhook(dp, bot, primary=primary)
+        else:
+            # getUpdates не работает, пока у бота зарегистрирован вебхук
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
+    finally:
+        # Если shutdown диспетчера не дошел до asheets.close (ошибка при запуске)
+        await asheets.close()
+
+
+def run_process(process_index: int):
+    """Точка входа дополнительного процесса вебхука"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f'%(asctime)s - [{process_index}] %(name)s - %(levelname)s - %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S',
+        force=True,  # basicConfig уже вызван при импорте модуля
+    )
+    asyncio.run(main(process_index))
+
+
+def run():
+    """Запуск в текущем процессе; в режиме webhook - еще WEBHOOK_PROCESSES - 1 процессов на том же порту"""
+    processes = []
+    if config.RUN_MODE == "webhook" and config.WEBHOOK_PROCESSES > 1:
+        ctx = multiprocessing.get_context("spawn")
+        for process_index in range(1, config.WEBHOOK_PROCESSES):
+            process = ctx.Process(target=run_process, args=(process_index,), name=f"webhook-{process_index}")
+            process.start()
+            processes.append(process)
+
+    try:
+        asyncio.run(main())
+    finally:
+        for process in processes:
+            process.terminate()  # SIGTERM - процесс дообработает очередь и закроется
+        for process in processes:
+            process.join()
 
 
 if __name__ == '__main__':
-    asyncio.run(main())
\ No newline at end of file
+    run()
\ No newline at end of file
@@ -3,17 +3,66 @@ from aiogram import BaseMiddleware
 from aiogram.types import Message, CallbackQuery
 from typing import Dict, Any, Callable, Awaitable
 import time
-from collections import defaultdict
 from config import config
 
+# Действия, которые читают или пишут таблицу, - у них отдельный, более строгий лимит
+EXPENSIVE_CALLBACKS = ("book_practice", "book_training", "my_bookings", "tariff:", "slot:", "confirm:", "training:")
+EXPENSIVE_COMMANDS = ("/notify",)
+
+
+class UserRateLimiter:
+    """Лимит частоты на пользователя (token bucket в форме GCRA).
+
+    На пользователя хранится одно число - теоретическое время следующего
+    запроса. Если оно уже в прошлом, бакет полон и запись не нужна, поэтому
+    раз в evict_interval секунд такие записи удаляются: в памяти остаются
+    только активные пользователи. clock подменяется в тестах.
+    """
+
+    def __init__(self, per_minute: int, burst: int, evict_interval: float = 60, clock=time.monotonic):
+        self.interval = 60 / per_minute
+        self.burst = max(1, burst)
+        self.evict_interval = evict_interval
+        self._clock = clock
+        self._tat: Dict[int, float] = {}
+        self._evicted_at = clock()
+
+    def hit(self, user_id: int) -> float:
+        """Учесть запрос; 0 - разрешен, иначе сколько секунд подождать"""
+        now = self._clock()
+        if now - self._evicted_at > self.evict_interval:
+            self._evict(now)
+
+        tat = max(self._tat.get(user_id, now), now)
+        wait = tat - now - (self.burst - 1) * self.interval
+        if wait > 0:
+            return wait
+        self._tat[user_id] = tat + self.interval
+        return 0.0
+
+    def _evict(self, now: float):
+        self._tat = {user_id: tat for user_id, tat in self._tat.items() if tat > now}
+        self._evicted_at = now
+
+    def __len__(self):
+        return len(self._tat)
+
 
 class RateLimitMiddleware(BaseMiddleware):
-    """Middleware для ограничения запросов"""
+    """Middleware для ограничения запросов: отдельно дешевые действия и обращения к таблице.
+
+    Лимиты считаются в каждом процессе бота отдельно.
+    """
 
     def __init__(self):
-        self.requests = defaultdict(list)
-        self.limit = config.MAX_REQUESTS_PER_MINUTE
-        self.window = 60  # 1 минута
+        self.cheap = UserRateLimiter(config.MAX_REQUESTS_PER_MINUTE, config.RATE_LIMIT_BURST)
+        self.expensive = UserRateLimiter(config.EXPENSIVE_REQUESTS_PER_MINUTE, config.EXPENSIVE_RATE_LIMIT_BURST)
+
+    @staticmethod
+    def is_expensive(event: Message | CallbackQuery) -> bool:
+        if isinstance(event, CallbackQuery):
+            return (event.data or "").startswith(EXPENSIVE_CALLBACKS)
+        return (event.text or "").startswith(EXPENSIVE_COMMANDS)
 
     async def __call__(
             self,
@@ -21,26 +70,23 @@ class RateLimitMiddleware(BaseMiddleware):
             event: Message | CallbackQuery,
             data: Dict[str, Any]
     ) -> Any:
-        user_id = event.from_user.id
-        current_time = time.time()
+        if event.from_user is None:
+            return await handler(event, data)
 
-        # Очистка старых запросов
-        self.requests[user_id] = [
-            req_time for req_time in self.requests[user_id]
-            if current_time - req_time < self.window
-        ]
+        limiter = self.expensive if self.is_expensive(event) else self.cheap
+        wait = limiter.hit(event.from_user.id)
 
         # Проверка лимита
-        if len(self.requests[user_id]) >= self.limit:
-            if isinstance(event, Message):
+        if wait > 0:
+            seconds = max(1, round(wait))
+            if isinstance(event, CallbackQuery):
+                await event.answer(f"⏳ Слишком часто, подождите {seconds} с", show_alert=False)
+            else:
                 await event.answer(
                     "⚠️ <b>Слишком много запросов</b>\n"
-                    "Пожалуйста, подождите 1 минуту.",
+                    f"Пожалуйста, подождите {seconds} с.",
                     parse_mode="HTML"
                 )
             return
 
-        # Добавляем запрос
-        self.requests[user_id].append(current_time)
-
-        return await handler(event, data)
\ No newline at end of file
+        return await handler(event, data)
@@ -1,13 +1,23 @@
 
 import asyncio
+import heapq
+import html
 import logging
+import sqlite3
+import threading
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterable, List, NamedTuple, Set
 import sys
+import time
 from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
 from config import config
-from gsheets import GoogleSheetsManager
-from gsheets import gsheets
+from dates import format_day, parse_date, parse_time
+from gsheets import AsyncGoogleSheetsManager, DroppedBooking
+from gsheets import asheets
+from quota import Priority
+from schedule import ScheduleIndex
+from throttling import TokenBucket
 
 
 def setup_logging(debug: bool = False):
@@ -36,55 +46,186 @@ def setup_logging(debug: bool = False):
 logger = setup_logging(debug=False)
 
 
-class Notifier:
-    """Класс для отправки уведомлений о практике и тренингах"""
+class BlockedChats:
+    """Чаты, куда доставка невозможна (бот заблокирован, чат удален).
 
-    def __init__(self):
-        self.bot: Optional[Bot] = None
-        self.gs: Optional[GoogleSheetsManager] = None
+    Такие чаты пропускаются в следующих проходах; через ttl секунд отметка
+    снимается, чтобы пользователь, разблокировавший бота, снова получал напоминания.
+    """
 
-    async def setup(self):
-        """Инициализация ресурсов"""
-        try:
-            self.bot = Bot(token=config.BOT_TOKEN)
-            self.gs = GoogleSheetsManager()
-            logger.info("✅ Ресурсы инициализированы")
-        except Exception as e:
-            logger.error(f"❌ Ошибка инициализации: {e}")
-            raise
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._until: Dict[int, float] = {}
 
-    async def cleanup(self):
-        """Очистка ресурсов"""
-        if self.bot:
-            try:
-                await self.bot.session.close()
-                logger.debug("Сессия бота закрыта")
-            except Exception as e:
-                logger.error(f"Ошибка закрытия сессии: {e}")
+    def add(self, chat_id: int):
+        self._until[chat_id] = time.monotonic() + self.ttl
 
-    @staticmethod
-    def parse_datetime(date_str: str, time_str: str) -> Optional[datetime]:
-        """Парсинг даты и времени из различных форматов"""
-        try:
-            date_str = str(date_str).strip().split()[0]  # дата
-            time_str = str(time_str).strip()[:5]  # ЧЧ:ММ
+    def __contains__(self, chat_id: int) -> bool:
+        until = self._until.get(chat_id)
+        if until is None:
+            return False
+        if until < time.monotonic():
+            self._until.pop(chat_id, None)
+            return False
+        return True
+
+    def __len__(self) -> int:
+        return len(self._until)
+
+
+# Общие для всех рассылок: лимит Telegram (~30 сообщений/с) и кэш заблокированных чатов
+telegram_limiter = TokenBucket(config.NOTIFY_RATE_PER_SECOND, burst=config.NOTIFY_RATE_PER_SECOND)
+blocked_chats = BlockedChats(config.BLOCKED_CHAT_TTL)
+
+
+class FanOutSender:
+    """Рассылка: много send_message одновременно в пределах общего лимита"""
+
+    MAX_ATTEMPTS = 3
+
+    def __init__(self, bot: Bot, limiter: TokenBucket = telegram_limiter, blocked: BlockedChats = blocked_chats,
+                 concurrency: int = None):
+        self.bot = bot
+        self.limiter = limiter
+        self.blocked = blocked
+        self._semaphore = asyncio.Semaphore(concurrency or config.NOTIFY_CONCURRENCY)
 
-            formats = [
-                ("%Y-%m-%d %H:%M", "ISO"),
-                ("%d.%m.%Y %H:%M", "европейский"),
-                ("%d/%m/%Y %H:%M", "другой"),
-            ]
+    async def send(self, chat_id: int, text: str, **kwargs) -> bool:
+        if chat_id in self.blocked:
+            logger.debug(f"⏭️ Пропуск user_id={chat_id}: бот недоступен для этого чата")
+            return False
 
-            for fmt, name in formats:
+        async with self._semaphore:
+            for attempt in range(1, self.MAX_ATTEMPTS + 1):
+                await self.limiter.acquire()
                 try:
-                    dt = datetime.strptime(f"{date_str} {time_str}", fmt)
-                    logger.debug(f"Дата распарсена ({name}): {dt}")
-                    return dt
-                except ValueError:
-                    continue
+                    await self.bot.send_message(chat_id, text, **kwargs)
+                    return True
 
-            logger.error(f"Не удалось распарсить дату: '{date_str} {time_str}'")
-            return None
+                except TelegramRetryAfter as e:
+                    # Telegram просит подождать - останавливаем всю рассылку, а не только этот чат
+                    logger.warning(f"⏳ RetryAfter {e.retry_after} с (user_id={chat_id}, попытка {attempt})")
+                    self.limiter.pause(e.retry_after)
+
+                except TelegramForbiddenError as e:
+                    logger.info(f"🚫 user_id={chat_id} заблокировал бота: {e}")
+                    self.blocked.add(chat_id)
+                    return False
+
+                except TelegramBadRequest as e:
+                    if "chat not found" in str(e).lower():
+                        self.blocked.add(chat_id)
+                    logger.error(f"❌ Ошибка отправки user_id={chat_id}: {e}")
+                    return False
+
+                except Exception as e:
+                    logger.error(f"❌ Ошибка отправки user_id={chat_id}: {e}")
+                    return False
+
+        logger.error(f"❌ Не удалось отправить user_id={chat_id} после {self.MAX_ATTEMPTS} попыток")
+        return False
+
+
+class ReminderLedger:
+    """Журнал отправленных напоминаний (SQLite).
+
+    Ключ - строка таблицы, время начала занятия и user_id: после перезапуска
+    или ручного /notify напоминание не уходит повторно, а если занятие
+    перенесли на другое время, о нем напомнят заново.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None  # файл базы открывается при первом обращении, а не при импорте
+
+    def _db(self) -> sqlite3.Connection:
+        """Соединение с базой напоминаний (вызывать под self._lock)"""
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS reminders (
+                    row_index INTEGER NOT NULL,
+                    starts_at TEXT NOT NULL,
+                    user_id INTEGER NOT NULL,
+                    sent_at REAL NOT NULL,
+                    PRIMARY KEY (row_index, starts_at, user_id)
+                )
+            """)
+            self._conn = conn
+        return self._conn
+
+    def sent(self, row_index: int, starts_at: datetime) -> Set[int]:
+        """Кому уже напомнили об этом занятии"""
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT user_id FROM reminders WHERE row_index = ? AND starts_at = ?",
+                (row_index, starts_at.isoformat())
+            ).fetchall()
+        return {user_id for (user_id,) in rows}
+
+    def mark_sent(self, row_index: int, starts_at: datetime, user_ids: Iterable[int]):
+        now = time.time()
+        with self._lock:
+            self._db().executemany(
+                "INSERT OR IGNORE INTO reminders (row_index, starts_at, user_id, sent_at) VALUES (?, ?, ?, ?)",
+                [(row_index, starts_at.isoformat(), user_id, now) for user_id in user_ids]
+            )
+
+    def prune(self, before: datetime):
+        """Удалить отметки о занятиях, начавшихся раньше before"""
+        with self._lock:
+            self._db().execute("DELETE FROM reminders WHERE starts_at < ?", (before.isoformat(),))
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+reminder_ledger = ReminderLedger(config.REMINDER_LEDGER_PATH)
+
+
+def event_type(tariff: str) -> str:
+    """Тип занятия по тарифу: practice, training, или other"""
+    tariff = str(tariff).strip()
+    if tariff in ["Базовый", "Основной"]:
+        return "practice"
+    elif tariff == "Тренинг":
+        return "training"
+    return "other"
+
+
+class Notifier:
+    """Класс для отправки уведомлений о практике и тренингах.
+
+    Долгоживущий компонент: использует переданный бот (его HTTP-сессию)
+    и общий снимок таблицы через асинхронный фасад, поэтому проход
+    напоминаний не открывает новых соединений, не скачивает таблицу заново
+    и не блокирует event loop бота.
+    """
+
+    def __init__(self, bot: Bot, sheets: AsyncGoogleSheetsManager = asheets,
+                 ledger: ReminderLedger = reminder_ledger):
+        self.bot = bot
+        self.sheets = sheets
+        self.ledger = ledger
+        self.sender = FanOutSender(bot)
+
+    @staticmethod
+    def parse_datetime(date_str: str, time_str: str) -> Optional[datetime]:
+        """Парсинг даты и времени из различных форматов (результаты кэшируются в dates)"""
+        try:
+            parsed_date = parse_date(date_str)
+            parsed_time = parse_time(time_str)
+            if parsed_date is None or parsed_time is None:
+                logger.error(f"Не удалось распарсить дату: '{date_str} {time_str}'")
+                return None
+
+            return parsed_date.replace(hour=parsed_time[0], minute=parsed_time[1])
 
         except Exception as e:
             logger.error(f"Ошибка парсинга даты: {e}")
@@ -105,13 +246,7 @@ class Notifier:
     @staticmethod
     def format_practice_notification(practice_dt: datetime, time_str: str, tariff: str) -> str:
         """Форматируем сообщение уведомления о ПРАКТИКЕ"""
-        months = {
-            1: "января", 2: "февраля", 3: "марта", 4: "апреля",
-            5: "мая", 6: "июня", 7: "июля", 8: "августа",
-            9: "сентября", 10: "октября", 11: "ноября", 12: "декабря"
-        }
-
-        date_display = f"{practice_dt.day} {months[practice_dt.month]}"
+        date_display = format_day(practice_dt)
 
         return (
             f"⏰ <b>НАПОМИНАНИЕ О ПРАКТИКЕ</b>\n\n"
@@ -121,13 +256,7 @@ class Notifier:
     @staticmethod
     def format_training_notification(training_dt: datetime, time_str: str) -> str:
         """Форматируем сообщение уведомления о ТРЕНИНГЕ"""
-        months = {
-            1: "января", 2: "февраля", 3: "марта", 4: "апреля",
-            5: "мая", 6: "июня", 7: "июля", 8: "августа",
-            9: "сентября", 10: "октября", 11: "ноября", 12: "декабря"
-        }
-
-        date_display = f"{training_dt.day} {months[training_dt.month]}"
+        date_display = format_day(training_dt)
 
         return (
             f"🎓 <b>НАПОМИНАНИЕ О ТРЕНИНГЕ</b>\n\n"
@@ -163,14 +292,74 @@ class Notifier:
 
     def get_record_type(self, record: Dict) -> str:
         """Определяет тип записи: practice, training, или other"""
-        tariff = str(record.get('Тариф', '')).strip()
-
-        if tariff in ["Базовый", "Основной"]:
-            return "practice"
-        elif tariff == "Тренинг":
-            return "training"
-        else:
-            return "other"
+        return event_type(record.get('Тариф', ''))
+
+    async def send_reminder(self, row_index: int, event_dt: datetime, record_type: str,
+                            clean_time: str, tariff: str, user_ids: List[int]) -> int:
+        """Напомнить студентам строки, которым еще не напоминали; возвращает число доставленных"""
+        # SQLite - в потоке, чтобы не останавливать event loop
+        already_sent = await asyncio.to_thread(self.ledger.sent, row_index, event_dt)
+        recipients = [user_id for user_id in dict.fromkeys(user_ids) if user_id not in already_sent]
+        if not recipients:
+            logger.debug(f"Строка {row_index}: всем уже напомнили")
+            return 0
+
+        if record_type == "practice":
+            message = self.format_practice_notification(event_dt, clean_time, tariff)
+            event_name = "практика"
+        else:  # training
+            message = self.format_training_notification(event_dt, clean_time)
+            event_name = "тренинг"
+
+        # Отправляем параллельно, в пределах общего лимита
+        results = await asyncio.gather(*(
+            self.sender.send(user_id, message, parse_mode="HTML") for user_id in recipients
+        ))
+        delivered = [user_id for user_id, ok in zip(recipients, results) if ok]
+        await asyncio.to_thread(self.ledger.mark_sent, row_index, event_dt, delivered)
+
+        logger.info(
+            f"✅ Уведомления отправлены: {len(delivered)}/{len(recipients)}, "
+            f"{event_name}, дата={event_dt.date()} {clean_time}"
+        )
+        return len(delivered)
+
+    async def notify_dropped(self, dropped: List[DroppedBooking]) -> int:
+        """Сообщить студентам (и администратору), что подтвержденная запись не попала в таблицу:
+        пока она ждала переноса, места в строке заняли. Возвращает число доставленных студентам"""
+        messages = []
+        for booking in dropped:
+            entry = booking.entry
+            event_name = "тренинг" if entry.kind == "training" else "практику"
+            when = f"{booking.date_str} {booking.time_str}".strip()
+            event_dt = self.parse_datetime(booking.date_str, booking.time_str)
+            if event_dt is not None:
+                when = f"{format_day(event_dt)} в {booking.time_str}"
+
+            messages.append(self.sender.send(
+                entry.user_id,
+                f"😔 <b>Запись не сохранена</b>\n\n"
+                f"Ваша запись на {event_name} <b>{when}</b> не попала в расписание: "
+                f"места заняли раньше. Пожалуйста, выберите другое время.",
+                parse_mode="HTML"
+            ))
+            logger.warning(f"⚠️ Запись {entry.key} не перенесена в таблицу, сообщаю студенту")
+
+        # Отправляем параллельно, в пределах общего лимита
+        delivered = sum(await asyncio.gather(*messages))
+
+        if config.ADMIN_CHAT_ID and dropped:
+            lines = "\n".join(
+                f"• {html.escape(b.entry.full_name)} ({html.escape(b.entry.username)}, ID {b.entry.user_id}): "
+                f"{b.tariff} {b.date_str} {b.time_str}, строка {b.entry.row_index}"
+                for b in dropped
+            )
+            await self.sender.send(
+                config.ADMIN_CHAT_ID,
+                f"⚠️ <b>Записи не перенесены в таблицу - нет мест</b>\n\n{lines}",
+                parse_mode="HTML"
+            )
+        return delivered
 
     async def process_record(self, record: Dict, index: int) -> bool:
         """Обрабатывает одну запись, отправляет соответствующие уведомления"""
@@ -212,31 +401,12 @@ class Notifier:
             if not self.should_notify(event_dt, now):
                 return False
 
-            # 7. Форматируем соответствующее сообщение
+            # 7. Отправляем студентам, которым еще не напоминали (index - номер строки в таблице)
             clean_time = str(time_str).strip()[:5]
-
-            if record_type == "practice":
-                tariff = str(record.get('Тариф', '')).strip()
-                message = self.format_practice_notification(event_dt, clean_time, tariff)
-                event_type = "практика"
-            else:  # training
-                message = self.format_training_notification(event_dt, clean_time)
-                event_type = "тренинг"
-
-            # 8. Отправляем студентам в этой записи
-            notifications_sent = 0
-            for user_id in user_ids:
-                try:
-                    await self.bot.send_message(user_id, message, parse_mode="HTML")
-                    logger.info(
-                        f"✅ Уведомление отправлено: user_id={user_id}, {event_type}, дата={event_dt.date()} {clean_time}")
-                    notifications_sent += 1
-
-                    # Пауза между отправками
-                    await asyncio.sleep(0.3)
-
-                except Exception as e:
-                    logger.error(f"❌ Ошибка отправки user_id={user_id}: {e}")
+            tariff = str(record.get('Тариф', '')).strip()
+            notifications_sent = await self.send_reminder(
+                index, event_dt, record_type, clean_time, tariff, user_ids
+            )
 
             return notifications_sent > 0
 
@@ -249,23 +419,19 @@ class Notifier:
         logger.info("🔍 Запуск проверки уведомлений")
 
         try:
-            self.gs = gsheets
-            await self.setup()
-
-            # Получаем данные из таблицы
-            worksheet = self.gs.spreadsheet.worksheet("Расписание")
-            records = worksheet.get_all_records()
-            logger.info(f"📊 Загружено записей: {len(records)}")
+            # Берем строки из общего снимка таблицы
+            records = await self.sheets.get_records(Priority.NOTIFY)
+            logger.info(f"📊 Записей в снимке: {len(records)}")
 
             # Фильтруем только практики и тренинги
             valid_records = []
             practice_count = 0
             training_count = 0
 
-            for record in records:
+            for row_index, record in enumerate(records, start=2):  # первая строка - заголовки
                 record_type = self.get_record_type(record)
                 if record_type in ["practice", "training"]:
-                    valid_records.append(record)
+                    valid_records.append((row_index, record))
 
                     if record_type == "practice":
                         practice_count += 1
@@ -278,14 +444,18 @@ class Notifier:
             practice_notifications = 0
             training_notifications = 0
 
-            for i, record in enumerate(valid_records, start=1):
-                record_type = self.get_record_type(record)
+            # Записи обрабатываются параллельно, темп отправки держит общий лимит
+            results = await asyncio.gather(*(
+                self.process_record(record, row_index) for row_index, record in valid_records
+            ))
 
-                if await self.process_record(record, i):
-                    if record_type == "practice":
-                        practice_notifications += 1
-                    else:
-                        training_notifications += 1
+            for (_, record), sent in zip(valid_records, results):
+                if not sent:
+                    continue
+                if self.get_record_type(record) == "practice":
+                    practice_notifications += 1
+                else:
+                    training_notifications += 1
 
             logger.info(f"✅ Проверка завершена.")
             logger.info(f"   📝 Практик: {practice_notifications} уведомлений")
@@ -295,14 +465,157 @@ class Notifier:
         except Exception as e:
             logger.error(f"❌ Notifier error: {e}")
 
-        finally:
-            await self.cleanup()
+
+class ReminderEvent(NamedTuple):
+    """Элемент очереди напоминаний"""
+    remind_at: datetime
+    row_index: int
+    starts_at: datetime
+
+
+class ReminderScheduler:
+    """Напоминания точно в срок: очередь (heap) ближайших занятий из снимка.
+
+    Работает фоновой задачей в event loop бота (start/stop вместе с polling).
+    Цикл спит до ближайшего напоминания, но не дольше sync_interval, чтобы
+    заметить изменения в таблице. Очередь обновляется инкрементально: при
+    новом снимке в heap добавляются только строки, у которых время начала
+    появилось или изменилось, а устаревшие элементы отбрасываются при
+    извлечении. Кому напоминание уже ушло, хранит ReminderLedger.
+    """
+
+    def __init__(self, notifier: Notifier, lead_hours: float = None, grace_minutes: float = None,
+                 sync_interval: float = None):
+        self.notifier = notifier
+        self.sheets = notifier.sheets
+        self.lead = timedelta(hours=lead_hours or config.REMINDER_LEAD_HOURS)
+        self.grace = timedelta(minutes=grace_minutes or config.REMINDER_GRACE_MINUTES)
+        self.sync_interval = sync_interval or config.REMINDER_SYNC_INTERVAL
+        self._heap: List[ReminderEvent] = []
+        self._events: Dict[int, datetime] = {}  # row_index → актуальное время начала
+        self._done: Set[tuple] = set()  # (row_index, starts_at) уже обработанных событий
+        self._index: Optional[ScheduleIndex] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def sync(self, now: datetime = None) -> int:
+        """Сверить очередь с текущим снимком; возвращает число добавленных событий"""
+        index = await self.sheets.get_index(Priority.NOTIFY)
+        if index is self._index:
+            return 0  # тот же снимок (записи меняют только студентов, не время)
+        self._index = index
+        now = now or datetime.now()
+
+        events = {}
+        added = 0
+        for row in index.upcoming(now):
+            if event_type(row.tariff) == "other":
+                continue
+
+            remind_at = row.starts_at - self.lead
+            if remind_at + self.grace < now:
+                continue  # поздно напоминать
+
+            events[row.row_index] = row.starts_at
+            if self._events.get(row.row_index) != row.starts_at and (row.row_index, row.starts_at) not in self._done:
+                heapq.heappush(self._heap, ReminderEvent(remind_at, row.row_index, row.starts_at))
+                added += 1
+
+        self._events = events
+        self._done = {key for key in self._done if key[1] > now}
+        await asyncio.to_thread(self.notifier.ledger.prune, now - timedelta(days=1))
+
+        if added:
+            logger.info(f"🗓️ В очередь напоминаний добавлено: {added}, всего занятий впереди: {len(events)}")
+        return added
+
+    async def run_due(self) -> int:
+        """Отправить все наступившие напоминания; возвращает число доставленных"""
+        now = datetime.now()
+        await self.sync(now)
+
+        delivered = 0
+        while self._heap and self._heap[0].remind_at <= now:
+            event = heapq.heappop(self._heap)
+            key = (event.row_index, event.starts_at)
+            if self._events.get(event.row_index) != event.starts_at or key in self._done:
+                continue  # занятие перенесли или удалили
+            self._done.add(key)
+
+            if now - event.remind_at > self.grace:
+                logger.warning(f"⏭️ Напоминание для строки {event.row_index} опоздало, пропускаем")
+                continue
+
+            delivered += await self._fire(event)
+        return delivered
+
+    async def _fire(self, event: ReminderEvent) -> int:
+        # Студентов берем из актуального снимка: с момента постановки в очередь могли записаться новые
+        index = await self.sheets.get_index(Priority.NOTIFY)
+        row = index.rows.get(event.row_index)
+        if row is None or row.starts_at != event.starts_at:
+            return 0
+
+        record_type = event_type(row.tariff)
+        if record_type == "other":
+            return 0
+
+        user_ids = index.user_ids(row.row_index)
+        if not user_ids:
+            return 0
+
+        return await self.notifier.send_reminder(
+            row.row_index, row.starts_at, record_type, row.time_display, row.tariff, user_ids
+        )
+
+    def next_delay(self) -> float:
+        """Сколько спать до ближайшего напоминания (не дольше sync_interval)"""
+        if not self._heap:
+            return self.sync_interval
+        delay = (self._heap[0].remind_at - datetime.now()).total_seconds()
+        return min(max(delay, 0.0), self.sync_interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run_forever(), name="reminders")
+            self._task.add_done_callback(self._on_done)
+
+    async def stop(self):
+        if self._task is None:
+            return
+        task, self._task = self._task, None
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    def _on_done(self, task: asyncio.Task):
+        """Перезапуск, если цикл завершился сам (а не через stop)"""
+        if task is not self._task:
+            return
+        self._task = None
+        if not task.cancelled():
+            logger.error(f"💥 Планировщик напоминаний остановился: {task.exception()!r}, перезапуск")
+            self.start()
+
+    async def run_forever(self):
+        logger.info("⏰ Планировщик напоминаний запущен")
+        while True:
+            try:
+                await self.run_due()
+            except Exception as e:
+                logger.error(f"❌ Ошибка планировщика напоминаний: {e}")
+            await asyncio.sleep(self.next_delay())
 
 
 async def main():
     """Точка входа"""
-    notifier = Notifier()
-    await notifier.run()
+    bot = Bot(token=config.BOT_TOKEN)
+    try:
+        await Notifier(bot).run()
+    finally:
+        await asheets.close()
+        await bot.session.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,151 @@
+# quota.py
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from collections import deque
+from enum import IntEnum
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+WINDOW = 60  # квота Google Sheets считается за минуту
+
+
+class Priority(IntEnum):
+    """Очередность запросов к таблице: меньше - важнее"""
+    WRITE = 0  # перенос записей в таблицу
+    READ = 1  # пользователь ждет ответа (холодный старт)
+    REFRESH = 2  # фоновое обновление снимка
+    NOTIFY = 3  # обновление снимка для напоминаний
+
+
+def api_status(error: Exception):
+    """HTTP-статус ошибки gspread (APIError.response) или None"""
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None)
+
+
+class QuotaGovernor:
+    """Единый бюджет запросов к Google Sheets в минуту для всех потоков.
+
+    Каждый вызов gspread проходит через call(): ждет свободного места в
+    скользящем минутном окне, причем ожидающие обслуживаются по приоритету,
+    а фоновые запросы (REFRESH, NOTIFY) не могут занять последние reserve
+    мест - они остаются записям и пользователям. На 429 и 5xx вызов
+    повторяется с экспоненциальной задержкой и jitter; после 429 пауза
+    действует на всех, чтобы не добивать квоту соседними запросами.
+
+    clock, sleep и uniform подменяются в тестах (часы, пауза перед повтором, jitter).
+    """
+
+    def __init__(self, per_minute: int, reserve: int, max_retries: int = 5,
+                 base_delay: float = 1.0, max_delay: float = 32.0,
+                 clock=time.monotonic, sleep=time.sleep, uniform=random.uniform):
+        self.per_minute = per_minute
+        self.reserve = min(reserve, per_minute - 1)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._clock = clock
+        self._sleep = sleep
+        self._uniform = uniform
+        self._calls = deque()  # время выдачи разрешений за последнюю минуту
+        self._waiting = []  # куча (priority, seq)
+        self._seq = itertools.count()
+        self._paused_until = 0.0
+        self._cond = threading.Condition()
+        self.stats = {"calls": 0, "retries": 0, "throttled": 0, "failed": 0}
+
+    def _limit(self, priority: Priority) -> int:
+        return self.per_minute - self.reserve if priority >= Priority.REFRESH else self.per_minute
+
+    def _expire(self, now: float):
+        while self._calls and self._calls[0] <= now - WINDOW:
+            self._calls.popleft()
+
+    def acquire(self, priority: Priority):
+        """Дождаться разрешения на один запрос"""
+        with self._cond:
+            ticket = (priority, next(self._seq))
+            heapq.heappush(self._waiting, ticket)
+            waited = False
+            try:
+                while True:
+                    now = self._clock()
+                    self._expire(now)
+                    if self._waiting[0] == ticket and now >= self._paused_until:
+                        if len(self._calls) < self._limit(priority):
+                            break
+                        wake_at = self._calls[len(self._calls) - self._limit(priority)] + WINDOW
+                    elif self._waiting[0] == ticket:
+                        wake_at = self._paused_until
+                    else:
+                        wake_at = None  # разбудит notify_all, когда очередь дойдет
+                    waited = True
+                    self._cond.wait(None if wake_at is None else max(0.0, wake_at - now))
+                self._calls.append(now)
+                self.stats["calls"] += 1
+                if waited:
+                    self.stats["throttled"] += 1
+            finally:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+
+    def _count(self, name: str):
+        with self._cond:
+            self.stats[name] += 1
+
+    def pause(self, seconds: float):
+        """Не выдавать разрешения ближайшие seconds секунд (после 429)"""
+        with self._cond:
+            self._paused_until = max(self._paused_until, self._clock() + seconds)
+            self._cond.notify_all()
+
+    def call(self, priority: Priority, func, *args, **kwargs):
+        """Выполнить запрос к API в рамках квоты, с повторами на 429/5xx"""
+        for attempt in range(self.max_retries + 1):
+            self.acquire(priority)
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                status = api_status(e)
+                if status not in RETRY_STATUSES or attempt == self.max_retries:
+                    self._count("failed")
+                    raise
+                # Full jitter: повторы разных потоков не приходят одновременно
+                delay = self._uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                self._count("retries")
+                logger.warning(
+                    f"⏳ Google Sheets ответил {status} ({priority.name}), "
+                    f"повтор {attempt + 1}/{self.max_retries} через {delay:.1f} с"
+                )
+                if status == 429:
+                    self.pause(delay)
+                self._sleep(delay)
+
+    def usage(self) -> Dict[str, int]:
+        """Текущая загрузка квоты: запросы за минуту, ожидающие по приоритетам и счетчики"""
+        with self._cond:
+            self._expire(self._clock())
+            waiting = {p.name: 0 for p in Priority}
+            for priority, _ in self._waiting:
+                waiting[Priority(priority).name] += 1
+            return {
+                "used": len(self._calls),
+                "budget": self.per_minute,
+                **{f"waiting_{name.lower()}": count for name, count in waiting.items()},
+                **self.stats,
+            }
+
+    def report(self) -> str:
+        usage = self.usage()
+        return (
+            f"квота Sheets: {usage['used']}/{usage['budget']} за минуту, "
+            f"ожидают {sum(v for k, v in usage.items() if k.startswith('waiting_'))}, "
+            f"повторов {usage['retries']}, ожиданий {usage['throttled']}, ошибок {usage['failed']}"
+        )
@@ -0,0 +1,577 @@
+# schedule.py
+import logging
+import sys
+from dataclasses import dataclass, field
+from datetime import datetime
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, NamedTuple, Optional, Set, Tuple, Union
+
+import numpy as np
+
+from dates import detect_format, format_date, parse_start
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUS = "активно"
+TRAINING_TARIFF = "Тренинг"
+TRAINING_MAX_SEATS = 25
+SEAT_COLUMNS = [f"Студент{i}" for i in range(1, 41)]  # Студент1-40 (колонки G-AT)
+FIRST_SEAT_COLUMN = 7   # G - Студент1
+LAST_SEAT_COLUMN = 46   # AT - Студент40
+
+
+def week_key(value) -> Optional[float]:
+    """Нормализует номер недели для ключей индекса: '3', 3, '3.0' → 3.0"""
+    try:
+        return round(float(str(value).strip()), 2)
+    except (ValueError, TypeError):
+        return None
+
+
+def name_key(value: str) -> str:
+    """Username или ФИО для сравнения: без '@', пробелов по краям и регистра"""
+    return " ".join(str(value or "").lstrip().lstrip("@").split()).casefold()
+
+
+def parse_student(cell: str) -> Optional[Tuple[int, str, str]]:
+    """Ячейка студента 'user_id|full_name|username' → (user_id, full_name, username)"""
+    if not cell or '|' not in cell:
+        return None
+
+    parts = cell.split('|')
+    if len(parts) < 3:
+        return None
+
+    try:
+        user_id = int(parts[0].strip())
+    except ValueError:
+        return None
+
+    return user_id, parts[1].strip(), parts[2].strip()
+
+
+def practice_max_seats(tariff: str) -> int:
+    """Лимит мест на практике по тарифу"""
+    if tariff == "Базовый":
+        return 4
+    elif tariff == "Основной":
+        return 3
+    return 1
+
+
+def rowcol_to_a1(row: int, col: int) -> str:
+    """(5, 7) → 'G5', как gspread.utils.rowcol_to_a1 (без импорта gspread)"""
+    letters = ""
+    while col:
+        col, rem = divmod(col - 1, 26)
+        letters = chr(ord("A") + rem) + letters
+    return f"{letters}{row}"
+
+
+def short_time(time_str: str) -> str:
+    """'10:00:00' → '10:00'"""
+    if ' ' in time_str:
+        return time_str.split()[0][:5]
+    return time_str[:5]
+
+
+@dataclass(frozen=True)
+class SheetSettings:
+    """Блок листа 'Настройки', загруженный вместе со снимком расписания"""
+    current_week: int = 0   # B3
+    training_week: int = 0  # B4, если пусто - B3
+    cells: List[List[str]] = field(default_factory=list, repr=False)
+
+    def cell(self, row: int, col: int) -> str:
+        """Значение ячейки (нумерация с 1, как в gspread)"""
+        try:
+            return str(self.cells[row - 1][col - 1]).strip()
+        except IndexError:
+            return ""
+
+    @classmethod
+    def from_values(cls, values: List[List]) -> "SheetSettings":
+        settings = cls(cells=values or [])
+
+        current_week = settings._week_cell(3, "B3")
+        if current_week is None:
+            current_week = 0
+
+        training_week = settings._week_cell(4, "B4")
+        if training_week is None:
+            training_week = current_week
+
+        return cls(current_week=current_week, training_week=training_week, cells=settings.cells)
+
+    def _week_cell(self, row: int, name: str) -> Optional[int]:
+        value = self.cell(row, 2)
+        if value == "":
+            logger.warning(f"{name} пустая")
+            return None
+
+        try:
+            return int(float(value))
+        except (ValueError, TypeError) as e:
+            logger.error(f"Не число в {name}: '{value}', ошибка: {e}")
+            return None
+
+
+class UserBooking(NamedTuple):
+    """Место пользователя в строке расписания"""
+    row_index: int
+    week: Optional[float]
+    tariff: str
+    seat: int  # 1-40 (Студент1-40)
+
+
+class ScheduleRow:
+    """Строка листа 'Расписание' с уже разобранными полями.
+
+    В объекте - только ссылки на общие (интернированные) строки и номер
+    недели. Число мест, колонки A-F, отображаемые дата и время и начало
+    занятия берутся из массивов ScheduleIndex или вычисляются при обращении
+    (разбор дат кэширует модуль dates).
+    """
+
+    __slots__ = ("row_index", "week", "tariff", "status", "mentor", "date_str", "time_str", "_index")
+
+    def __init__(self, index: "ScheduleIndex", row_index: int, week: Optional[float], tariff: str, status: str,
+                 mentor: str, date_str: str, time_str: str):
+        self._index = index
+        self.row_index = row_index
+        self.week = week
+        self.tariff = tariff
+        self.status = status
+        self.mentor = mentor
+        self.date_str = date_str
+        self.time_str = time_str
+
+    @property
+    def head(self) -> Tuple[str, ...]:
+        """Колонки A-F как в таблице - для восстановления строки A:AT"""
+        index = self._index
+        return tuple(index._head_values[code] for code in index._head_codes[self.row_index - 2])
+
+    @property
+    def date_display(self) -> str:
+        return format_date(self.date_str, self._index.date_format)
+
+    @property
+    def time_display(self) -> str:
+        return short_time(self.time_str)
+
+    @property
+    def starts_at(self) -> Optional[datetime]:
+        return parse_start(self.date_str, self.time_str, self._index.date_format)
+
+    @property
+    def booked(self) -> int:
+        return int(self._index.booked[self.row_index - 2])
+
+    @property
+    def max_seats(self) -> int:
+        return int(self._index.max_seats[self.row_index - 2])
+
+    @property
+    def counted_seats(self) -> int:
+        """Сколько колонок Студент* учитывается при подсчете занятых мест"""
+        return len(SEAT_COLUMNS) if self.tariff == TRAINING_TARIFF else self.max_seats
+
+    @property
+    def available(self) -> int:
+        return self.max_seats - self.booked
+
+    def is_future(self, now: datetime = None) -> bool:
+        """Занятие в будущем (нераспознанную дату считаем будущей)"""
+        starts_at = self.starts_at
+        if starts_at is None:
+            return True
+        return starts_at > (now or datetime.now())
+
+
+class RowTable(Mapping):
+    """Строки снимка по row_index (2, 3, ...): список вместо словаря, строки идут подряд"""
+
+    __slots__ = ("_rows",)
+
+    def __init__(self, rows: List[ScheduleRow]):
+        self._rows = rows
+
+    def __getitem__(self, row_index: int) -> ScheduleRow:
+        if isinstance(row_index, (int, np.integer)) and 2 <= row_index < len(self._rows) + 2:
+            return self._rows[row_index - 2]
+        raise KeyError(row_index)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(range(2, len(self._rows) + 2))
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def values(self) -> List[ScheduleRow]:
+        return self._rows
+
+
+def _add_name(table: Dict[str, Union[int, Set[int]]], key: str, user_id: int):
+    """Имя → user_id; set заводится только для имени, общего для нескольких пользователей"""
+    current = table.get(key)
+    if current is None:
+        table[key] = user_id
+    elif isinstance(current, set):
+        current.add(user_id)
+    elif current != user_id:
+        table[key] = {current, user_id}
+
+
+def _ids_by_name(table: Dict[str, Union[int, Set[int]]], key: str) -> Set[int]:
+    found = table.get(key)
+    if found is None:
+        return set()
+    return set(found) if isinstance(found, set) else {found}
+
+
+class ScheduleIndex:
+    """Индекс снимка листа 'Расписание'.
+
+    Строится один раз на каждую загрузку данных. Запросы становятся поиском
+    по словарю с ключом (неделя, тариф, статус), поэтому их стоимость зависит
+    от размера текущей недели, а не от всей истории в таблице. Обратный индекс
+    код пользователя → позиции в матрице отвечает на "Мои записи" и проверку
+    недели за O(записей пользователя).
+
+    Блок Студент1-40 хранится только матрицей seat_codes (int32, строка снимка ×
+    место): 0 - пусто, положительный код - студент из таблицы пользователей
+    (user_id, ФИО, username - по одной интернированной копии), отрицательный -
+    непустая ячейка другого формата. Исходный текст хранится только для ячеек,
+    которые из нее не восстанавливаются. Колонки A-F хранятся кодами в общей
+    таблице значений, weeks/tariff_codes/active/date_codes/booked/max_seats - массивами, поэтому
+    запросы по всей таблице, подсчет и поиск мест - операции над массивами.
+
+    На 20 тыс. синтетических строк (benchmarks/bench_queries.py) индекс
+    занимает около 9.6 МБ против 99.6 МБ прежнего снимка (строки листа,
+    словари get_all_records, списки мест и записи пользователей), примерно
+    в 10 раз меньше; треть из этого - сама матрица мест.
+    """
+
+    def __init__(self, values: List[List]):
+        self._by_key: Dict[Tuple[float, str, str], List[ScheduleRow]] = {}
+        self._tariffs: Dict[Tuple[float, str], List[str]] = {}
+        self._added: Dict[int, List[Tuple[int, int]]] = {}  # user_id → (строка, место) записей после загрузки
+        # name_key(username/ФИО) → user_id (set - если имя у нескольких пользователей)
+        self._by_username: Dict[str, Union[int, Set[int]]] = {}
+        self._by_full_name: Dict[str, Union[int, Set[int]]] = {}
+        self._tariff_code: Dict[str, int] = {}
+        self._date_code: Dict[str, int] = {}
+        self._weeks: Dict[float, float] = {}  # один объект float на неделю
+        self._user_code: Dict[int, int] = {}  # user_id → код в seat_codes
+        self._user_ids: List[int] = [0]  # код → user_id, ФИО, username
+        self._full_names: List[str] = [""]
+        self._usernames: List[str] = [""]
+        self._opaque: Dict[int, str] = {}  # отрицательный код → текст ячейки
+        self._opaque_codes: Dict[str, int] = {}
+        self._raw_cells: Dict[Tuple[int, int], str] = {}  # (позиция, место) → текст, если не восстанавливается
+
+        self.header = [str(name) for name in values[0]] if values else []
+        columns = {name: i for i, name in enumerate(self.header)}
+        seat_cols = [columns.get(col) for col in SEAT_COLUMNS]
+        date_col = columns.get('Дата')
+        self.date_format = detect_format(
+            row[date_col] for row in values[1:] if date_col is not None and date_col < len(row)
+        )
+
+        # Позиция в массивах = row_index - 2
+        size = max(len(values) - 1, 0)
+        self.seat_codes = np.zeros((size, len(SEAT_COLUMNS)), dtype=np.int32)
+        self.weeks = np.full(size, np.nan)
+        self.tariff_codes = np.zeros(size, dtype=np.int16)
+        self.active = np.zeros(size, dtype=bool)
+        self.date_codes = np.zeros(size, dtype=np.int32)
+        self.booked = np.zeros(size, dtype=np.int16)
+        self.max_seats = np.zeros(size, dtype=np.int16)
+        counted = np.zeros(size, dtype=np.int16)
+        # Колонки A-F: коды в общей таблице значений (тарифы, даты, время повторяются из строки в строку)
+        self._head_codes = np.zeros((size, FIRST_SEAT_COLUMN - 1), dtype=np.int32)
+        self._head_values: List[str] = [""]
+        head_code: Dict[str, int] = {"": 0}
+        rows: List[ScheduleRow] = []
+        starts: List[Tuple[datetime, int]] = []
+
+        for row_index, cells in enumerate(values[1:], start=2):  # первая строка - заголовки
+            pos = row_index - 2
+            for col, cell in enumerate(cells[:FIRST_SEAT_COLUMN - 1]):
+                text = str(cell)
+                code = head_code.get(text)
+                if code is None:
+                    code = head_code[text] = len(self._head_values)
+                    self._head_values.append(text)
+                self._head_codes[pos, col] = code
+
+            # Тарифы, статусы, даты и время повторяются из строки в строку - храним по одной копии
+            def field(name: str) -> str:
+                col = columns.get(name)
+                return sys.intern(str(cells[col])) if col is not None and col < len(cells) else ''
+
+            date_parts = field('Дата').split()
+            row = ScheduleRow(
+                self, row_index,
+                week=self._week(field('Неделя')),
+                tariff=sys.intern(field('Тариф').strip()),
+                status=sys.intern(field('Статус').strip().lower()),
+                mentor=field('Наставник'),
+                date_str=sys.intern(date_parts[0]) if date_parts else "",
+                time_str=field('Время'),
+            )
+            rows.append(row)
+
+            # Тренинг занимает любые из 40 колонок, практика - только первые max_seats
+            if row.tariff == TRAINING_TARIFF:
+                self.max_seats[pos] = TRAINING_MAX_SEATS
+                counted[pos] = len(SEAT_COLUMNS)
+            else:
+                self.max_seats[pos] = counted[pos] = practice_max_seats(row.tariff)
+            if row.week is not None:
+                self.weeks[pos] = row.week
+            self.tariff_codes[pos] = self._tariff_code.setdefault(row.tariff, len(self._tariff_code))
+            self.active[pos] = row.status == ACTIVE_STATUS
+            self.date_codes[pos] = self._date_code.setdefault(row.date_str, len(self._date_code))
+
+            for seat_num, col in enumerate(seat_cols, start=1):
+                if col is None or col >= len(cells) or not cells[col]:
+                    continue
+                student = self._store_cell(pos, seat_num, str(cells[col]))
+                if student:
+                    self._add_user_names(*student)
+
+            starts_at = parse_start(row.date_str, row.time_str, self.date_format)
+            if starts_at is not None:
+                starts.append((starts_at, row_index))
+
+            if row.week is None:
+                continue
+
+            self._by_key.setdefault((row.week, row.tariff, row.status), []).append(row)
+
+            tariffs = self._tariffs.setdefault((row.week, row.status), [])
+            if row.tariff and row.tariff not in tariffs:
+                tariffs.append(row.tariff)
+
+        self.rows = RowTable(rows)
+
+        # Занятые места считаются одной операцией по всей матрице
+        in_range = np.arange(len(SEAT_COLUMNS)) < counted[:, None]
+        self.booked[:] = np.count_nonzero((self.seat_codes != 0) & in_range, axis=1)
+
+        # Обратный индекс: позиции в матрице (строка * 40 + место - 1), сгруппированные по коду
+        # пользователя; места кода c - _user_pos[_user_start[c]:_user_start[c + 1]]
+        flat = self.seat_codes.ravel()
+        occupied = np.flatnonzero(flat > 0)
+        self._user_pos = occupied[np.argsort(flat[occupied], kind="stable")].astype(np.int32)
+        counts = np.bincount(flat[self._user_pos], minlength=len(self._user_ids))
+        self._user_start = np.concatenate(([0], np.cumsum(counts)))
+
+        # Начала занятий по возрастанию (при равенстве - в порядке строк)
+        starts.sort()
+        self._start_times = np.array([starts_at for starts_at, _ in starts], dtype="datetime64[us]")
+        self._start_rows = np.array([row_index for _, row_index in starts], dtype=np.int32)
+        logger.debug(f"🗂️ Индекс расписания: {len(self.rows)} строк, {len(self._weeks)} недель")
+
+    def _week(self, value) -> Optional[float]:
+        week = week_key(value)
+        return None if week is None else self._weeks.setdefault(week, week)
+
+    def tariffs(self, week, status: str = ACTIVE_STATUS) -> List[str]:
+        """Тарифы недели в порядке появления в таблице"""
+        return list(self._tariffs.get((week_key(week), status), []))
+
+    def rows_for(self, week, tariff: str, status: str = ACTIVE_STATUS) -> List[ScheduleRow]:
+        """Строки недели с данным тарифом и статусом"""
+        return self._by_key.get((week_key(week), tariff.strip(), status), [])
+
+    def upcoming(self, since: datetime) -> List[ScheduleRow]:
+        """Строки, которые начинаются позже since, в порядке времени начала"""
+        start = np.searchsorted(self._start_times, np.datetime64(since, "us"), side="right")
+        return [self.rows[int(row_index)] for row_index in self._start_rows[start:]]
+
+    def _code(self, user_id: int, full_name: str, username: str) -> int:
+        """Код пользователя в seat_codes (имя и username - первое встреченное написание)"""
+        code = self._user_code.get(user_id)
+        if code is None:
+            code = self._user_code[user_id] = len(self._user_ids)
+            self._user_ids.append(user_id)
+            self._full_names.append(sys.intern(full_name))
+            self._usernames.append(sys.intern(username))
+        return code
+
+    def _store_cell(self, pos: int, seat_num: int, raw: str) -> Optional[Tuple[int, str, str]]:
+        """Записать ячейку места в матрицу; для ячейки студента возвращает parse_student"""
+        text = raw.strip()
+        if not text:
+            return None
+
+        student = parse_student(text)
+        if student and student[0] > 0:
+            user_id, full_name, username = student
+            code = self._code(user_id, full_name, username)
+            if raw != f"{user_id}|{self._full_names[code]}|{self._usernames[code]}":
+                self._raw_cells[(pos, seat_num)] = raw
+            self.seat_codes[pos, seat_num - 1] = code
+            return student
+
+        code = self._opaque_codes.get(raw)
+        if code is None:
+            code = -(len(self._opaque) + 1)
+            self._opaque_codes[raw] = code
+            self._opaque[code] = raw
+        self.seat_codes[pos, seat_num - 1] = code
+        return None
+
+    def cell(self, row_index: int, seat_num: int) -> str:
+        """Текст ячейки Студент{seat_num}, как в таблице"""
+        pos = row_index - 2
+        code = int(self.seat_codes[pos, seat_num - 1])
+        if code == 0:
+            return ""
+        raw = self._raw_cells.get((pos, seat_num))
+        if raw is not None:
+            return raw
+        if code < 0:
+            return self._opaque[code]
+        return f"{self._user_ids[code]}|{self._full_names[code]}|{self._usernames[code]}"
+
+    def row_values(self, row_index: int) -> Optional[List[str]]:
+        """Строка A:AT (до Студент40) из снимка или None, если такой строки нет"""
+        row = self.rows.get(row_index)
+        if row is None:
+            return None
+        return list(row.head) + [self.cell(row_index, seat_num) for seat_num in range(1, len(SEAT_COLUMNS) + 1)]
+
+    def records(self) -> List[Dict]:
+        """Строки снимка словарями, как get_all_records() (собираются по запросу)"""
+        return [dict(zip(self.header, self.row_values(row_index))) for row_index in self.rows]
+
+    def user_ids(self, row_index: int) -> List[int]:
+        """user_id студентов строки в порядке мест"""
+        return [self._user_ids[code] for code in self.seat_codes[row_index - 2] if code > 0]
+
+    def free_seat(self, row_index: int, max_seats: int) -> Optional[int]:
+        """Номер первого свободного места (1..max_seats) или None"""
+        free = np.flatnonzero(self.seat_codes[row_index - 2, :max_seats] == 0)
+        return int(free[0]) + 1 if len(free) else None
+
+    def _add_user_names(self, user_id: int, full_name: str, username: str):
+        username, full_name = name_key(username), name_key(full_name)
+        if username:
+            _add_name(self._by_username, username, user_id)
+        if full_name:
+            _add_name(self._by_full_name, full_name, user_id)
+
+    def _seats_of(self, user_id: int) -> np.ndarray:
+        """Позиции мест user_id в матрице на момент загрузки снимка"""
+        code = self._user_code.get(user_id)
+        if code is None or code + 1 >= len(self._user_start):
+            return self._user_pos[:0]
+        return self._user_pos[self._user_start[code]:self._user_start[code + 1]]
+
+    def bookings_of(self, user_id: int) -> List[UserBooking]:
+        """Все места пользователя по user_id"""
+        seats = [divmod(int(flat_pos), len(SEAT_COLUMNS)) for flat_pos in self._seats_of(user_id)]
+        places = [(pos + 2, seat + 1) for pos, seat in seats] + self._added.get(user_id, [])
+
+        bookings = []
+        for row_index, seat_num in places:
+            row = self.rows[row_index]
+            bookings.append(UserBooking(row_index, row.week, row.tariff, seat_num))
+        return bookings
+
+    def find_bookings(self, user_id: int, username: str = "", full_name: str = "") -> List[UserBooking]:
+        """Записи пользователя по user_id, username или ФИО - не больше одной на строку.
+
+        username и ФИО совпадают целиком после name_key (без '@', регистра и
+        лишних пробелов): "@Ivan " в таблице найдется по "ivan", а "Иван" по
+        "Иван Петров" - нет, иначе короткое имя находило бы чужие записи.
+        """
+        username, full_name = name_key(username), name_key(full_name)
+        user_ids = {user_id}
+        if username:
+            user_ids |= _ids_by_name(self._by_username, username)
+        if full_name:
+            user_ids |= _ids_by_name(self._by_full_name, full_name)
+
+        # Сначала места самого user_id, затем найденных по username и ФИО
+        found = self.bookings_of(user_id)
+        for other_id in sorted(user_ids - {user_id}):
+            found += self.bookings_of(other_id)
+
+        by_row = {}
+        for booking in found:
+            by_row.setdefault(booking.row_index, booking)
+        return [by_row[row_index] for row_index in sorted(by_row)]
+
+    def _user_mask(self, user_id: int) -> np.ndarray:
+        """Строки, где user_id занимает место (точное совпадение id)"""
+        code = self._user_code.get(user_id)
+        if code is None:
+            return np.zeros(len(self.seat_codes), dtype=bool)
+        return (self.seat_codes == code).any(axis=1)
+
+    def rows_with_user(self, user_id: int) -> np.ndarray:
+        """Номера строк, где user_id занимает место (точное совпадение id)"""
+        return np.flatnonzero(self._user_mask(user_id)) + 2
+
+    def is_booked_on_date(self, user_id: int, date_str: str) -> bool:
+        """Записан ли user_id на какое-либо занятие в эту дату"""
+        date_parts = str(date_str).split()
+        if not date_parts:
+            return False
+        date_code = self._date_code.get(date_parts[0])
+        if date_code is None:
+            return False
+        mask = self._user_mask(user_id) & (self.date_codes == date_code)
+        return bool(mask.any())
+
+    def nearest_week(self, tariff: str) -> Optional[float]:
+        """Минимальная неделя с активными слотами тарифа, где есть свободные места"""
+        code = self._tariff_code.get(tariff.strip())
+        if code is None:
+            return None
+        mask = (
+            (self.tariff_codes == code)
+            & self.active
+            & (self.booked < self.max_seats)
+            & ~np.isnan(self.weeks)
+        )
+        if not mask.any():
+            return None
+        return float(self.weeks[mask].min())
+
+    def user_in_row(self, user_id: int, row_index: int) -> bool:
+        code = self._user_code.get(user_id)
+        if code is None or row_index not in self.rows:
+            return False
+        return bool((self.seat_codes[row_index - 2] == code).any())
+
+    def is_booked_in_week(self, user_id: int, week, check_only_practice: bool = True) -> Optional[UserBooking]:
+        """Запись пользователя, мешающая записаться на неделю (тренинги не мешают практике)"""
+        key = week_key(week)
+        for booking in self.bookings_of(user_id):
+            if booking.week != key:
+                continue
+            if check_only_practice and booking.tariff == TRAINING_TARIFF:
+                continue
+            return booking
+        return None
+
+    def add_booking(self, row_index: int, seat_num: int, user_id: int, full_name: str, username: str):
+        """Обновить индекс на месте после успешной записи"""
+        row = self.rows.get(row_index)
+        if row is None or self.user_in_row(user_id, row_index):
+            return
+
+        pos = row_index - 2
+        was_free = self.seat_codes[pos, seat_num - 1] == 0
+        self._raw_cells.pop((pos, seat_num), None)
+        self._store_cell(pos, seat_num, f"{user_id}|{full_name}|{username}")
+        if was_free and seat_num <= row.counted_seats:
+            self.booked[pos] += 1
+        self._added.setdefault(user_id, []).append((row_index, seat_num))
+        self._add_user_names(user_id, full_name, username)
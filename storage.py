@@ -0,0 +1,158 @@
+# storage.py
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Mapping, Optional
+
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+
+logger = logging.getLogger(__name__)
+
+
+class _Record:
+    """Состояние и данные одного диалога"""
+
+    __slots__ = ("state", "data")
+
+    def __init__(self, state: Optional[str] = None, data: Optional[Dict[str, Any]] = None):
+        self.state = state
+        self.data = data or {}
+
+
+class SQLiteStorage(BaseStorage):
+    """FSM-хранилище в SQLite (WAL).
+
+    Состояния переживают перезапуск и общие для всех процессов бота на одной
+    машине. Изменения копятся в памяти и пишутся одной транзакцией через
+    flush_delay секунд (set_state + update_data одного хендлера - одна запись),
+    пока они не записаны - читаются из памяти этого процесса. Диалоги, которые
+    не менялись дольше ttl секунд, считаются пустыми и периодически удаляются.
+    """
+
+    def __init__(self, path: str, ttl: float, flush_delay: float = 0.05, key_builder: KeyBuilder = None):
+        self.path = path
+        self.ttl = ttl
+        self.flush_delay = flush_delay
+        self.key_builder = key_builder or DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")  # другие процессы пишут в тот же файл
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS fsm (
+                key TEXT PRIMARY KEY,
+                state TEXT,
+                data TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS fsm_updated_at ON fsm (updated_at)")
+        self._pending: Dict[str, _Record] = {}  # изменено, ждет записи
+        self._inflight: Dict[str, _Record] = {}  # пишется прямо сейчас
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()  # одновременно пишется не больше одной пачки
+        self._evicted_at = 0.0
+        logger.info(f"🗄️ FSM-хранилище: {path}, TTL {ttl:.0f} с")
+
+    def _load(self, key: str) -> _Record:
+        record = self._pending.get(key) or self._inflight.get(key)
+        if record is not None:
+            return record
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT state, data, updated_at FROM fsm WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[2] < time.time() - self.ttl:
+            return _Record()
+        return _Record(row[0], json.loads(row[1]))
+
+    def _modify(self, key: StorageKey) -> _Record:
+        """Запись диалога для изменения; сохранится при ближайшем сбросе"""
+        built = self.key_builder.build(key)
+        record = self._pending.get(built)
+        if record is None:
+            current = self._load(built)
+            record = self._pending[built] = _Record(current.state, dict(current.data))
+        self._schedule_flush()
+        return record
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        self._modify(key).state = state.state if isinstance(state, State) else state
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return self._load(self.key_builder.build(key)).state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            msg = f"Data must be a dict or dict-like object, got {type(data).__name__}"
+            raise DataNotDictLikeError(msg)
+        self._modify(key).data = data.copy()
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return dict(self._load(self.key_builder.build(key)).data)
+
+    def _schedule_flush(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_delay)
+        self._flush_task = None  # изменения во время записи попадут в следующую пачку
+        await self.flush()
+
+    async def flush(self):
+        """Записать накопленные изменения одной транзакцией (в потоке, не блокируя event loop)"""
+        async with self._flush_lock:
+            if not self._pending:
+                return
+
+            self._inflight, self._pending = self._pending, {}
+            try:
+                await asyncio.to_thread(self._write, self._inflight)
+            except Exception as e:
+                logger.error(f"❌ Ошибка записи FSM ({len(self._inflight)} диалогов): {e}")
+                # Более свежие изменения тех же диалогов уже в _pending - их не перетираем
+                for key, record in self._inflight.items():
+                    self._pending.setdefault(key, record)
+                self._schedule_flush()
+            finally:
+                self._inflight = {}
+
+    def _write(self, batch: Dict[str, _Record]):
+        now = time.time()
+        upserts = [
+            (key, record.state, json.dumps(record.data, ensure_ascii=False), now)
+            for key, record in batch.items() if record.state is not None or record.data
+        ]
+        deletes = [(key,) for key, record in batch.items() if record.state is None and not record.data]
+
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO fsm (key, state, data, updated_at) VALUES (?, ?, ?, ?)", upserts
+                )
+                self._conn.executemany("DELETE FROM fsm WHERE key = ?", deletes)
+                if now - self._evicted_at > min(self.ttl, 600):
+                    evicted = self._conn.execute("DELETE FROM fsm WHERE updated_at < ?", (now - self.ttl,)).rowcount
+                    self._evicted_at = now
+                    if evicted:
+                        logger.info(f"🧹 Удалено брошенных диалогов: {evicted}")
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    async def close(self) -> None:
+        if self._flush_task is not None:
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+        await self.flush()
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,55 @@
+# tests/conftest.py
+import os
+import sys
+from datetime import date, timedelta
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "benchmarks")]
+
+# config.py требует эти переменные; тесты не ходят в Telegram и Google
+os.environ.update({
+    "BOT_TOKEN": "0:test",
+    "SPREADSHEET_ID": "test",
+    "GOOGLE_CREDENTIALS_JSON": "{}",
+    "JOURNAL_PATH": ":memory:",
+    "REMINDER_LEDGER_PATH": ":memory:",
+    "SHEETS_QUOTA_PER_MINUTE": "1000000",
+})
+
+from fake_sheets import HEADER, FakeSpreadsheet, synthetic_settings  # noqa: E402
+from gsheets import GoogleSheetsManager  # noqa: E402
+
+DAY = (date.today() + timedelta(days=3)).isoformat()
+
+
+def schedule_row(tariff="Основной", week=1, students=(), day=DAY, time="10:00", status="активно"):
+    """Строка листа 'Расписание' со студентами 'user_id|Имя|@username' в Студент1.."""
+    return [tariff, str(week), day, time, status, "Наставник"] + list(students)
+
+
+def student(user_id: int) -> str:
+    return f"{user_id}|Студент {user_id}|@user{user_id}"
+
+
+@pytest.fixture
+def make_sheet():
+    """Таблица из строк schedule_row (первая строка данных - строка 2 листа)"""
+    def make(*rows, week=1):
+        return FakeSpreadsheet({
+            "Расписание": [list(HEADER)] + [list(row) for row in rows],
+            "Настройки": synthetic_settings(week),
+        })
+    return make
+
+
+@pytest.fixture
+def make_manager(tmp_path):
+    """Менеджер над FakeSpreadsheet; managers с одним path делят журнал, как процессы бота"""
+    def make(spreadsheet, journal_path=None):
+        manager = GoogleSheetsManager(str(journal_path or tmp_path / "bookings.db"))
+        manager.spreadsheet = spreadsheet
+        manager.CACHE_TTL = float("inf")
+        return manager
+    return make
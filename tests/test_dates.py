@@ -0,0 +1,87 @@
+# tests/test_dates.py
+from datetime import datetime
+
+import pytest
+
+import dates
+from dates import DATE_FORMATS, ISO_DATE, detect_format, format_date, parse_date, parse_start
+
+
+@pytest.mark.parametrize("values, expected", [
+    (["2024-12-10", "2024-12-11"], ISO_DATE),
+    (["2024-1-5"], ISO_DATE),
+    (["2024-12-10 0:00:00"], ISO_DATE),
+    (["10.12.2024", "11.12.2024"], "%d.%m.%Y"),
+    (["10/12/2024"], "%d/%m/%Y"),
+    (["10-12-2024"], "%d-%m-%Y"),
+    (["", "  ", "10.12.2024"], "%d.%m.%Y"),  # пустые ячейки не голосуют
+    (["10.12.2024", "2024-12-11", "12.12.2024"], "%d.%m.%Y"),  # большинство
+    (["вторник", "TBD"], None),
+    ([], None),
+])
+def test_detect_format(values, expected):
+    assert detect_format(values) == expected
+
+
+def test_detect_format_reads_only_a_sample():
+    values = ["10.12.2024"] * dates.DETECT_SAMPLE + ["2024-12-10"] * (dates.DETECT_SAMPLE * 2)
+    assert detect_format(iter(values)) == "%d.%m.%Y"
+
+
+@pytest.mark.parametrize("hint, expected", [
+    (None, DATE_FORMATS),
+    (ISO_DATE, DATE_FORMATS),
+    ("%d-%m-%Y", ("%d-%m-%Y", ISO_DATE, "%d.%m.%Y", "%d/%m/%Y")),
+    ("%d/%m/%Y", ("%d/%m/%Y", ISO_DATE, "%d.%m.%Y", "%d-%m-%Y")),
+])
+def test_formats_try_hint_first(hint, expected):
+    assert dates._formats(hint) == expected
+
+
+@pytest.mark.parametrize("value, hint, expected", [
+    ("2024-12-10", None, datetime(2024, 12, 10)),
+    ("2024-1-5", None, datetime(2024, 1, 5)),
+    ("2024-12-10 0:00:00", None, datetime(2024, 12, 10)),
+    ("10.12.2024", None, datetime(2024, 12, 10)),
+    ("10/12/2024", ISO_DATE, datetime(2024, 12, 10)),  # подсказка не мешает другим форматам
+    ("05-01-2024", "%d-%m-%Y", datetime(2024, 1, 5)),
+    ("32.12.2024", None, None),
+    ("", None, None),
+])
+def test_parse_date(value, hint, expected):
+    assert parse_date(value, hint) == expected
+
+
+@pytest.mark.parametrize("value, fast", [
+    ("2024-12-10", True),
+    ("2024-01-05", True),
+    ("2024-1-5", False),
+    ("2024-1-05", False),
+])
+def test_iso_dates_take_fromisoformat_fast_path(monkeypatch, value, fast):
+    calls = []
+
+    class Recording(datetime):
+        @classmethod
+        def strptime(cls, date_string, fmt):
+            calls.append(date_string)
+            return datetime.strptime(date_string, fmt)
+
+    monkeypatch.setattr(dates, "datetime", Recording)
+    assert dates._strptime(value, ISO_DATE) == datetime.strptime(value, ISO_DATE)
+    assert calls == ([] if fast else [value])
+
+
+def test_fast_path_rejects_what_strptime_rejects():
+    for value in ("2024-13-01", "2024-02-30", "2024-12-1x"):
+        with pytest.raises(ValueError):
+            dates._strptime(value, ISO_DATE)
+
+
+def test_format_date_and_start():
+    assert format_date("2024-12-10 0:00:00") == "10 декабря"
+    assert format_date("05/01/2024", "%d/%m/%Y") == "5 января"
+    assert format_date("по запросу") == "по запросу"
+    assert parse_start("2024-12-10", "10:30:00") == datetime(2024, 12, 10, 10, 30)
+    assert parse_start("2024-12-10", "") == datetime(2024, 12, 10)
+    assert parse_start("скоро", "10:30") is None
@@ -0,0 +1,71 @@
+# tests/test_gsheets.py
+import asyncio
+import functools
+import threading
+
+from conftest import schedule_row, student
+from gsheets import AsyncGoogleSheetsManager
+
+
+def test_identical_reads_share_one_call_and_survive_cancelled_waiter(make_sheet, make_manager):
+    manager = make_manager(make_sheet(schedule_row("Основной")))
+    release = threading.Event()
+    calls = []
+    get_slots_view = manager.get_slots_view
+
+    @functools.wraps(get_slots_view)
+    def slow_slots_view(*args):
+        calls.append(args)
+        release.wait(5)
+        return get_slots_view(*args)
+
+    manager.get_slots_view = slow_slots_view
+    asheets = AsyncGoogleSheetsManager(manager)
+
+    async def scenario():
+        waiters = [asyncio.ensure_future(asheets.get_slots_view("Основной", 1)) for _ in range(5)]
+        await asyncio.sleep(0.05)
+        waiters[0].cancel()
+        release.set()
+        views = await asyncio.gather(*waiters[1:])
+        return waiters[0], views
+
+    try:
+        cancelled, views = asyncio.run(scenario())
+    finally:
+        asheets._executor.shutdown()
+
+    assert calls == [("Основной", 1)]
+    assert cancelled.cancelled()
+    assert len(views[0].slots) == 1 and all(view is views[0] for view in views)
+    assert asheets.coalescing_stats() == {"get_slots_view": {"calls": 5, "coalesced": 4}}
+    assert asheets.stats_report().endswith("; чтения: get_slots_view 5 (общих 4)")
+
+
+def test_concurrent_bookings_are_merged_into_one_batch(make_sheet, make_manager):
+    manager = make_manager(make_sheet(
+        schedule_row("Основной", time="10:00"),
+        schedule_row("Основной", time="12:00", students=[student(50), student(51)]),  # одно свободное место
+    ))
+    batches = []
+    book_batch = manager.book_batch
+    manager.book_batch = lambda requests: (batches.append(requests), book_batch(requests))[1]
+    asheets = AsyncGoogleSheetsManager(manager)
+
+    async def scenario():
+        return await asyncio.gather(
+            asheets.book_slot(2, 1, "Студент 1", "@user1"),
+            asheets.book_slot(3, 1, "Студент 1", "@user1"),  # вторая практика той же недели
+            asheets.book_slot(3, 2, "Студент 2", "@user2"),
+            asheets.book_slot(3, 3, "Студент 3", "@user3"),  # место уже отдано в этой же пачке
+        )
+
+    try:
+        results = asyncio.run(scenario())
+    finally:
+        asheets._executor.shutdown()
+
+    assert results == [True, False, True, False]
+    assert [[(r.row_index, r.user_id) for r in batch] for batch in batches] == [[(2, 1), (3, 1), (3, 2), (3, 3)]]
+    index = manager.get_index()
+    assert index.user_ids(2) == [1] and index.user_ids(3) == [50, 51, 2]
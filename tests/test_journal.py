@@ -0,0 +1,200 @@
+# tests/test_journal.py
+import asyncio
+
+from config import config
+from conftest import schedule_row, student
+from fake_sheets import FakeAPIError
+from gsheets import JournalFlusher
+from schedule import FIRST_SEAT_COLUMN
+
+
+def test_flush_writes_booking_to_sheet_offline(make_sheet, make_manager):
+    sheet = make_sheet(schedule_row("Основной", students=[student(1)]))
+    manager = make_manager(sheet)
+
+    assert manager.book_slot(2, 7, "Иван", "@ivan")
+    assert manager.flush_journal() == 1
+
+    assert sheet.worksheet("Расписание").row_values(2)[7] == "7|Иван|@ivan"
+    assert manager.journal.pending() == []
+
+
+def test_journal_file_is_created_on_first_use(tmp_path):
+    from journal import BookingJournal
+
+    path = tmp_path / "bookings.db"
+    journal = BookingJournal(str(path))
+    assert not path.exists()
+
+    assert journal.pending() == []
+    assert path.exists()
+    journal.close()
+
+
+def test_refresh_keeps_booking_flushed_during_fetch(make_sheet, make_manager):
+    sheet = make_sheet(schedule_row("Основной", students=[student(1), student(2)]))
+    manager = make_manager(sheet)
+    assert manager.book_slot(2, 7, "Иван", "@ivan")
+
+    # batchGet отвечает строкой без записи, а перенос успевает до наложения журнала
+    fetch = sheet.values_batch_get
+
+    def fetch_then_flush(ranges):
+        response = fetch(ranges)
+        assert manager.flush_journal() == 1
+        return response
+
+    sheet.values_batch_get = fetch_then_flush
+    assert manager.refresh()
+    sheet.values_batch_get = fetch
+
+    index = manager.get_index()
+    assert index.user_in_row(7, 2)
+    assert index.free_seat(2, 3) is None
+    assert not manager.book_slot(2, 8, "Петр", "@petr")
+
+
+def test_processes_do_not_share_a_seat(make_sheet, make_manager, tmp_path):
+    sheet = make_sheet(
+        schedule_row("Основной", students=[student(1), student(2)]),
+        schedule_row("Основной", time="12:00"),
+    )
+    # Два процесса бота: свои снимки, общий файл журнала
+    first = make_manager(sheet, tmp_path / "shared.db")
+    second = make_manager(sheet, tmp_path / "shared.db")
+    assert first.refresh() and second.refresh()
+
+    assert first.book_slot(2, 7, "Иван", "@ivan")
+    # По снимку второго процесса в строке 2 еще есть место, но его занял первый
+    assert not second.book_slot(2, 8, "Петр", "@petr")
+    # Тот же пользователь не запишется на ту же неделю через другой процесс
+    assert not second.book_slot(3, 7, "Иван", "@ivan")
+    assert second.get_index().user_in_row(7, 2)
+
+    assert second.book_slot(3, 8, "Петр", "@petr")
+    assert first.flush_journal() == 2
+    values = sheet.worksheet("Расписание")
+    assert values.row_values(2)[8:] == ["7|Иван|@ivan"]
+    assert values.row_values(3)[6:] == ["8|Петр|@petr"]
+
+
+def test_whitespace_in_sheet_is_not_an_external_edit(make_sheet, make_manager):
+    sheet = make_sheet(schedule_row("Основной", students=[f" {student(1)} ", "", student(2)]))
+    manager = make_manager(sheet)
+    assert manager.refresh()
+    assert manager.book_slot(2, 7, "Иван", "@ivan")
+
+    row = manager._pad_row(sheet.worksheet("Расписание").get("A2:AT2"))
+    assert not manager._is_external_edit(2, row, manager.journal.pending())
+
+    row[FIRST_SEAT_COLUMN - 1] = "9|Чужой|@other"
+    assert manager._is_external_edit(2, row, manager.journal.pending())
+
+
+def test_flusher_reports_dropped_booking_and_prunes_journal(make_sheet, make_manager, monkeypatch):
+    sheet = make_sheet(
+        schedule_row("Основной", students=[student(1), student(2)]),
+        schedule_row("Основной", time="12:00"),
+    )
+    manager = make_manager(sheet)
+    assert manager.book_slot(2, 7, "Иван", "@ivan")
+    assert manager.book_slot(3, 8, "Петр", "@petr")
+    # Последнее место заняли в таблице вручную, пока запись ждала переноса
+    sheet.worksheet("Расписание").update_cell(2, FIRST_SEAT_COLUMN + 2, student(3))
+
+    reported = []
+
+    async def on_dropped(dropped):
+        reported.extend(dropped)
+
+    async def run(func, *args):
+        return func(*args)
+
+    async def flush_once():
+        flusher = JournalFlusher(run, manager.flush_journal, 60,
+                                 take_dropped=manager.take_dropped, mark_reported=manager.mark_dropped_reported,
+                                 prune=manager.prune_journal)
+        flusher.on_dropped = on_dropped
+        flusher.start()
+        flusher.notify()
+        await asyncio.sleep(0.1)
+        await flusher.stop()
+
+    # Перенесенные и отклоненные записи удаляются при первой же чистке
+    monkeypatch.setattr(config, "JOURNAL_RETENTION", -1)
+    asyncio.run(flush_once())
+
+    assert [booking.entry.user_id for booking in reported] == [7]
+    assert manager.take_dropped() == []
+    assert sheet.worksheet("Расписание").row_values(3)[6:] == ["8|Петр|@petr"]
+    assert manager.journal.overlay(0) == []
+    assert manager.journal.pending() == [] and manager.journal.dropped() == []
+
+
+def test_booking_without_seat_is_dropped_once_when_write_fails(make_sheet, make_manager):
+    sheet = make_sheet(
+        schedule_row("Основной", students=[student(1), student(2)]),
+        schedule_row("Основной", time="12:00"),
+    )
+    manager = make_manager(sheet)
+    assert manager.book_slot(2, 7, "Иван", "@ivan")
+    assert manager.book_slot(3, 8, "Петр", "@petr")
+    worksheet = sheet.worksheet("Расписание")
+    worksheet.update_cell(2, FIRST_SEAT_COLUMN + 2, student(3))
+
+    # batch_update падает: ни одна запись пачки не должна считаться отклоненной
+    write = worksheet.batch_update
+
+    def failing_write(*args, **kwargs):
+        raise FakeAPIError(400)
+
+    worksheet.batch_update = failing_write
+    try:
+        manager.flush_journal()
+    except FakeAPIError:
+        pass
+    worksheet.batch_update = write
+    assert {entry.user_id for entry in manager.journal.pending()} == {7, 8}
+    assert manager.take_dropped() == []
+
+    assert manager.flush_journal() == 1
+    dropped = manager.take_dropped()
+    assert [(booking.entry.user_id, booking.tariff) for booking in dropped] == [(7, "Основной")]
+    manager.mark_dropped_reported(dropped)
+
+    # Следующие переносы не отклоняют запись повторно
+    assert manager.flush_journal() == 0
+    assert manager.take_dropped() == []
+
+
+def test_dropped_booking_stays_in_journal_until_reported(make_sheet, make_manager):
+    sheet = make_sheet(schedule_row("Основной", students=[student(1), student(2)]))
+    manager = make_manager(sheet)
+    assert manager.book_slot(2, 7, "Иван", "@ivan")
+    sheet.worksheet("Расписание").update_cell(2, FIRST_SEAT_COLUMN + 2, student(3))
+
+    async def run(func, *args):
+        return func(*args)
+
+    async def closed_session(dropped):
+        raise RuntimeError("Session is closed")
+
+    async def stop_with(on_dropped):
+        flusher = JournalFlusher(run, manager.flush_journal, 60, take_dropped=manager.take_dropped,
+                                 mark_reported=manager.mark_dropped_reported)
+        flusher.on_dropped = on_dropped
+        flusher.start()
+        await flusher.stop()
+
+    # Остановка, когда сообщение уже не отправить: запись ждет следующего запуска
+    asyncio.run(stop_with(closed_session))
+    assert [entry.user_id for entry in manager.journal.dropped()] == [7]
+
+    reported = []
+
+    async def on_dropped(dropped):
+        reported.extend(dropped)
+
+    asyncio.run(stop_with(on_dropped))
+    assert [booking.entry.user_id for booking in reported] == [7]
+    assert manager.journal.dropped() == []
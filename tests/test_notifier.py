@@ -0,0 +1,73 @@
+# tests/test_notifier.py
+import asyncio
+from datetime import datetime, timedelta
+
+from config import config
+from conftest import DAY, schedule_row, student
+from fake_sheets import HEADER
+from gsheets import DroppedBooking
+from journal import JournalEntry
+from notifier import Notifier, ReminderLedger, ReminderScheduler
+from schedule import ScheduleIndex
+
+
+class Sheets:
+    """Снимок для планировщика вместо asheets"""
+
+    def __init__(self, index):
+        self.index = index
+
+    async def get_index(self, priority=None):
+        return self.index
+
+
+class Sender:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, chat_id, text, **kwargs):
+        self.sent.append(chat_id)
+        return True
+
+
+def scheduler_for(index, ledger):
+    notifier = Notifier(bot=None, sheets=Sheets(index), ledger=ledger)
+    notifier.sender = Sender()
+    return ReminderScheduler(notifier), notifier.sender
+
+
+def test_reminder_is_sent_once_across_restarts(tmp_path):
+    starts_at = datetime.now() + timedelta(hours=23, minutes=30)
+    row = schedule_row("Основной", students=[student(1), student(2)],
+                       day=starts_at.date().isoformat(), time=starts_at.strftime("%H:%M"))
+    index = ScheduleIndex([HEADER, row])
+    path = tmp_path / "reminders.db"
+
+    first, first_sender = scheduler_for(index, ReminderLedger(str(path)))
+    assert asyncio.run(first.run_due()) == 2
+    assert sorted(first_sender.sent) == [1, 2]
+
+    # Новый процесс с тем же журналом: напоминание не уходит повторно
+    second, second_sender = scheduler_for(index, ReminderLedger(str(path)))
+    assert asyncio.run(second.run_due()) == 0
+    assert second_sender.sent == []
+
+
+def test_ledger_file_is_created_on_first_use(tmp_path):
+    path = tmp_path / "reminders.db"
+    ledger = ReminderLedger(str(path))
+    assert not path.exists()
+
+    assert ledger.sent(2, datetime.now()) == set()
+    assert path.exists()
+    ledger.close()
+
+
+def test_dropped_booking_is_reported_to_student_and_admin(monkeypatch):
+    monkeypatch.setattr(config, "ADMIN_CHAT_ID", 100)
+    notifier = Notifier(bot=None, sheets=Sheets(None), ledger=None)
+    notifier.sender = Sender()
+    entry = JournalEntry("practice:2:7", "practice", 2, 7, "Иван <3", "@ivan", 3)
+
+    assert asyncio.run(notifier.notify_dropped([DroppedBooking(entry, "Основной", DAY, "10:00")])) == 1
+    assert notifier.sender.sent == [7, 100]
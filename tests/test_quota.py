@@ -0,0 +1,164 @@
+# tests/test_quota.py
+import threading
+import time
+
+import pytest
+
+from config import config
+from fake_sheets import FakeAPIError
+from gsheets import GoogleSheetsManager
+from quota import Priority, QuotaGovernor
+
+
+class Clock:
+    """Часы для QuotaGovernor: время двигает только тест"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, quota: QuotaGovernor, seconds: float):
+        self.now += seconds
+        with quota._cond:  # ожидающие пересчитывают время по новым часам
+            quota._cond.notify_all()
+
+
+def start_acquire(quota: QuotaGovernor, priority: Priority, granted: list) -> threading.Thread:
+    thread = threading.Thread(target=lambda: (quota.acquire(priority), granted.append(priority)), daemon=True)
+    thread.start()
+    return thread
+
+
+def wait_until(condition, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "не дождались"
+        time.sleep(0.005)
+
+
+def waiting(quota: QuotaGovernor) -> int:
+    return sum(count for name, count in quota.usage().items() if name.startswith("waiting_"))
+
+
+def test_webhook_processes_share_one_quota(monkeypatch, tmp_path):
+    monkeypatch.setattr(config, "SHEETS_QUOTA_PER_MINUTE", 60)
+    monkeypatch.setattr(config, "SHEETS_QUOTA_RESERVE", 15)
+    monkeypatch.setattr(config, "RUN_MODE", "webhook")
+    monkeypatch.setattr(config, "WEBHOOK_PROCESSES", 4)
+
+    quota = GoogleSheetsManager(str(tmp_path / "bookings.db")).quota
+    assert (quota.per_minute, quota.reserve) == (15, 3)
+
+    monkeypatch.setattr(config, "RUN_MODE", "polling")
+    quota = GoogleSheetsManager(str(tmp_path / "bookings.db")).quota
+    assert (quota.per_minute, quota.reserve) == (60, 15)
+
+
+def test_waiters_are_served_by_priority():
+    clock = Clock()
+    quota = QuotaGovernor(per_minute=3, reserve=0, clock=clock)
+    for _ in range(3):
+        quota.acquire(Priority.READ)
+
+    granted = []
+    threads = []
+    for priority in (Priority.NOTIFY, Priority.REFRESH, Priority.READ, Priority.WRITE):
+        threads.append(start_acquire(quota, priority, granted))
+        wait_until(lambda: waiting(quota) == len(threads))
+
+    clock.advance(quota, 60)  # окно освободилось: три места на четверых
+    wait_until(lambda: len(granted) == 3)
+    assert granted == [Priority.WRITE, Priority.READ, Priority.REFRESH]
+
+    clock.advance(quota, 60)
+    for thread in threads:
+        thread.join(2)
+    assert granted[-1] == Priority.NOTIFY
+
+
+def test_background_requests_leave_reserve_to_bookings():
+    clock = Clock()
+    quota = QuotaGovernor(per_minute=3, reserve=1, clock=clock)
+    quota.acquire(Priority.READ)
+    quota.acquire(Priority.READ)
+
+    granted = []
+    refresh = start_acquire(quota, Priority.REFRESH, granted)
+    wait_until(lambda: waiting(quota) == 1)
+    time.sleep(0.05)
+    assert granted == []  # последнее место - не для фонового обновления
+
+    quota.acquire(Priority.WRITE)  # а запись его получает сразу
+    assert quota.usage()["used"] == 3 and granted == []
+
+    clock.advance(quota, 60)
+    refresh.join(2)
+    assert granted == [Priority.REFRESH]
+
+
+def test_retries_use_capped_exponential_backoff_with_jitter():
+    bounds, sleeps = [], []
+    errors = [FakeAPIError(503), FakeAPIError(500), FakeAPIError(503)]
+
+    def uniform(low, high):
+        bounds.append((low, high))
+        return high / 2
+
+    def flaky():
+        if errors:
+            raise errors.pop(0)
+        return "ok"
+
+    quota = QuotaGovernor(per_minute=100, reserve=0, base_delay=1, max_delay=3,
+                          clock=Clock(), sleep=sleeps.append, uniform=uniform)
+    assert quota.call(Priority.READ, flaky) == "ok"
+    assert bounds == [(0, 1), (0, 2), (0, 3)]
+    assert sleeps == [0.5, 1.0, 1.5]
+    assert quota.usage()["retries"] == 3
+
+
+def test_rate_limit_pauses_every_caller():
+    clock = Clock()
+    granted = []
+    others = []
+
+    def sleep(seconds):
+        # Пока идет пауза после 429, квоту не получает и запрос другого потока
+        others.append(start_acquire(quota, Priority.WRITE, granted))
+        wait_until(lambda: waiting(quota) == 1)
+        time.sleep(0.05)
+        assert granted == []
+        clock.advance(quota, seconds)
+        others[0].join(2)
+
+    answers = [FakeAPIError(429)]
+
+    def limited():
+        if answers:
+            raise answers.pop(0)
+        return clock.now
+
+    quota = QuotaGovernor(per_minute=100, reserve=0, clock=clock, sleep=sleep, uniform=lambda low, high: 4.0)
+    assert quota.call(Priority.READ, limited) == 4.0
+    assert granted == [Priority.WRITE]
+
+
+def test_retries_stop_after_limit_and_skip_client_errors():
+    attempts = []
+
+    def failing(status):
+        attempts.append(status)
+        raise FakeAPIError(status)
+
+    quota = QuotaGovernor(per_minute=100, reserve=0, max_retries=2,
+                          clock=Clock(), sleep=lambda seconds: None, uniform=lambda low, high: 0.0)
+    with pytest.raises(FakeAPIError):
+        quota.call(Priority.WRITE, failing, 503)
+    assert attempts == [503] * 3
+
+    with pytest.raises(FakeAPIError):
+        quota.call(Priority.WRITE, failing, 400)
+    assert attempts == [503] * 3 + [400]
+    assert (quota.usage()["retries"], quota.usage()["failed"]) == (2, 2)
@@ -0,0 +1,98 @@
+# tests/test_rate_limit.py
+import asyncio
+
+import pytest
+from aiogram.types import CallbackQuery, User
+
+from config import config
+from middleware.rate_limit import RateLimitMiddleware, UserRateLimiter
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+ANSWERS = []
+
+
+class Callback(CallbackQuery):
+    """CallbackQuery, который запоминает ответы вместо запроса к Telegram"""
+
+    async def answer(self, text=None, **kwargs):
+        ANSWERS.append(text)
+
+
+def callback(data: str, user_id: int = 1) -> Callback:
+    return Callback(id="1", from_user=User(id=user_id, is_bot=False, first_name="Студент"),
+                    chat_instance="chat", data=data)
+
+
+@pytest.fixture
+def middleware(monkeypatch):
+    monkeypatch.setattr(config, "MAX_REQUESTS_PER_MINUTE", 60)
+    monkeypatch.setattr(config, "RATE_LIMIT_BURST", 5)
+    monkeypatch.setattr(config, "EXPENSIVE_REQUESTS_PER_MINUTE", 6)
+    monkeypatch.setattr(config, "EXPENSIVE_RATE_LIMIT_BURST", 2)
+    ANSWERS.clear()
+    return RateLimitMiddleware()
+
+
+def test_burst_is_allowed_then_rejected_until_emission_interval():
+    clock = Clock()
+    limiter = UserRateLimiter(per_minute=30, burst=3, clock=clock)  # интервал 2 с
+
+    assert [limiter.hit(1) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert limiter.hit(1) == pytest.approx(2.0)
+    assert limiter.hit(2) == 0.0  # у другого пользователя свой бакет
+
+    clock.now += 1.5
+    assert limiter.hit(1) == pytest.approx(0.5)
+    clock.now += 0.5
+    assert limiter.hit(1) == 0.0  # через интервал - снова одно место
+    assert limiter.hit(1) > 0
+
+
+def test_idle_users_are_evicted():
+    clock = Clock()
+    limiter = UserRateLimiter(per_minute=60, burst=2, evict_interval=10, clock=clock)
+    limiter.hit(1)
+    limiter.hit(2)
+    assert len(limiter) == 2
+
+    clock.now += 11  # бакеты обоих снова полны
+    limiter.hit(3)
+    assert len(limiter) == 1
+
+
+def test_expensive_callbacks_have_stricter_limit(middleware):
+    handled = []
+
+    async def handler(event, data):
+        handled.append(event.data)
+
+    async def press(data: str, times: int):
+        for _ in range(times):
+            await middleware(handler, callback(data), {})
+
+    asyncio.run(press("slot:5", 3))
+    asyncio.run(press("back_to_menu", 5))
+
+    # Дорогие: burst 2, третье нажатие отклонено; дешевые проходят все пять
+    assert handled == ["slot:5"] * 2 + ["back_to_menu"] * 5
+    assert ANSWERS == ["⏳ Слишком часто, подождите 10 с"]
+
+
+def test_rejected_callback_is_answered(middleware):
+    async def handler(event, data):
+        return "handled"
+
+    async def press():
+        return [await middleware(handler, callback("back_to_menu"), {}) for _ in range(6)]
+
+    assert asyncio.run(press()) == ["handled"] * 5 + [None]
+    # Без answer() у пользователя крутились бы "часики" на кнопке
+    assert ANSWERS == ["⏳ Слишком часто, подождите 1 с"]
@@ -0,0 +1,43 @@
+# tests/test_schedule.py
+from conftest import schedule_row, student
+from fake_sheets import HEADER
+from schedule import ScheduleIndex
+
+
+def test_find_bookings_normalises_username_and_full_name():
+    index = ScheduleIndex([
+        HEADER,
+        schedule_row("Основной", time="10:00", students=["11| Иван  Петров |@Ivan_P "]),
+        schedule_row("Основной", time="12:00", students=["12|иван петров|нет"]),
+        schedule_row("Основной", time="14:00", students=[student(13)]),
+    ])
+
+    # Новый user_id (другой аккаунт), но тот же username без '@' и в другом регистре
+    assert [b.row_index for b in index.find_bookings(99, username="ivan_p")] == [2]
+    assert [b.row_index for b in index.find_bookings(99, username="@IVAN_P")] == [2]
+    assert [b.row_index for b in index.find_bookings(99, full_name="Иван Петров ")] == [2, 3]
+    # Совпадение целиком, а не подстрокой
+    assert index.find_bookings(99, username="ivan", full_name="Иван") == []
+
+
+def test_index_restores_rows_and_counts_seats():
+    rows = [
+        schedule_row("Базовый", students=[student(1), "", " запись вручную ", "21|  Имя |@u21 "]),
+        schedule_row("Тренинг", week=2, students=[""] * 30 + [student(1)]),
+        schedule_row("Основной"),  # строка без колонок мест
+    ]
+    index = ScheduleIndex([HEADER] + rows)
+
+    # Ячейки восстанавливаются как в таблице, включая нестандартные
+    for row_index, row in enumerate(rows, start=2):
+        assert index.row_values(row_index) == row + [""] * (len(HEADER) - len(row))
+    assert [index.rows[2].booked, index.rows[3].booked, index.rows[4].booked] == [3, 1, 0]
+    assert index.rows[3].max_seats == 25
+    assert [(b.row_index, b.week, b.seat) for b in index.bookings_of(1)] == [(2, 1.0, 1), (3, 2.0, 31)]
+    assert index.free_seat(2, 4) == 2
+
+    index.add_booking(2, 2, 7, "Новый", "@new")
+    assert index.rows[2].booked == 4
+    assert index.cell(2, 2) == "7|Новый|@new"
+    assert index.is_booked_in_week(7, 1).row_index == 2
+    assert [b.row_index for b in index.find_bookings(99, username="new")] == [2]
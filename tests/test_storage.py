@@ -0,0 +1,87 @@
+# tests/test_storage.py
+import asyncio
+import sqlite3
+
+from aiogram.fsm.storage.base import StorageKey
+
+from states import BookingStates
+from storage import SQLiteStorage
+
+KEY = StorageKey(bot_id=1, chat_id=10, user_id=10)
+
+
+def rows(path) -> list:
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT key, state, data FROM fsm").fetchall()
+
+
+def test_handler_changes_are_written_in_one_batch(tmp_path):
+    path = str(tmp_path / "fsm.db")
+
+    async def scenario():
+        storage = SQLiteStorage(path, ttl=3600, flush_delay=0.01)
+        writes = []
+        write = storage._write
+        storage._write = lambda batch: (writes.append(dict(batch)), write(batch))
+
+        await storage.set_state(KEY, BookingStates.choose_slot)
+        await storage.update_data(KEY, {"tariff": "Основной"})
+        # Пока изменения не записаны, этот процесс читает их из памяти, а файл пуст
+        assert await storage.get_state(KEY) == BookingStates.choose_slot.state
+        assert await storage.get_data(KEY) == {"tariff": "Основной"}
+        assert rows(path) == []
+
+        await asyncio.sleep(0.05)
+        await storage.close()
+        return writes
+
+    writes = asyncio.run(scenario())
+    assert len(writes) == 1 and len(writes[0]) == 1
+    assert [(state, data) for _, state, data in rows(path)] == [
+        (BookingStates.choose_slot.state, '{"tariff": "Основной"}')
+    ]
+
+
+def test_state_survives_restart_and_cleared_dialog_is_deleted(tmp_path):
+    path = str(tmp_path / "fsm.db")
+
+    async def scenario():
+        storage = SQLiteStorage(path, ttl=3600)
+        await storage.set_state(KEY, BookingStates.choose_slot)
+        await storage.close()
+
+        storage = SQLiteStorage(path, ttl=3600)
+        restored = await storage.get_state(KEY)
+        # state.clear(): пустой диалог удаляется при ближайшей записи, а не ждет TTL
+        await storage.set_state(KEY, None)
+        await storage.set_data(KEY, {})
+        await storage.flush()
+        remaining = rows(path)
+        await storage.close()
+        return restored, remaining
+
+    restored, remaining = asyncio.run(scenario())
+    assert restored == BookingStates.choose_slot.state
+    assert remaining == []
+
+
+def test_expired_dialog_reads_empty_and_is_evicted(tmp_path):
+    path = str(tmp_path / "fsm.db")
+    other = StorageKey(bot_id=1, chat_id=20, user_id=20)
+
+    async def scenario():
+        storage = SQLiteStorage(path, ttl=60)
+        await storage.set_state(KEY, BookingStates.choose_slot)
+        await storage.set_data(KEY, {"tariff": "Основной"})
+        await storage.close()
+        with sqlite3.connect(path) as conn:  # диалог не менялся два TTL
+            conn.execute("UPDATE fsm SET updated_at = updated_at - 120")
+
+        storage = SQLiteStorage(path, ttl=60)
+        expired = (await storage.get_state(KEY), await storage.get_data(KEY))
+        await storage.set_state(other, BookingStates.choose_slot)
+        await storage.close()
+        return expired
+
+    assert asyncio.run(scenario()) == (None, {})
+    assert [key for key, _, _ in rows(path)] == [SQLiteStorage(path, ttl=60).key_builder.build(other)]
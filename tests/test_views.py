@@ -0,0 +1,44 @@
+# tests/test_views.py
+from gsheets import SlotsView
+from views import ViewCache
+
+
+def slot(row_index: int, available: int = 2) -> dict:
+    return {'row_index': row_index, 'date': "01.09", 'time': "10:00", 'available': available, 'max_seats': 3}
+
+
+def test_slots_are_cached_per_snapshot_version():
+    cache = ViewCache()
+    first = cache.slots("Основной", SlotsView(1, 1, [slot(2), slot(3)], False))
+    assert cache.slots("Основной", SlotsView(1, 1, [slot(2), slot(3)], False)) is first
+    cache.slots("Основной", SlotsView(1, 1, [slot(3)], False))  # другой набор строк
+    cache.slots("Базовый", SlotsView(1, 1, [slot(2), slot(3)], False))
+    assert (cache.hits, cache.misses) == (1, 3)
+
+    # Новая версия снимка: свободные места могли измениться - экран строится заново
+    text, _ = cache.slots("Основной", SlotsView(2, 1, [slot(2, available=1), slot(3)], False))
+    assert "(1/3 мест)" in text
+    assert (cache.hits, cache.misses) == (1, 4)
+
+
+def test_stale_view_is_not_stored_and_keeps_newer_entries():
+    cache = ViewCache()
+    fresh = cache.slots("Основной", SlotsView(2, 1, [slot(2, available=1)], False))
+
+    # Ответ, собранный по старому снимку, пришел позже нового
+    stale, _ = cache.slots("Основной", SlotsView(1, 1, [slot(2)], False))
+    assert "(2/3 мест)" in stale
+    assert cache.stats()["version"] == 2
+    assert cache.slots("Основной", SlotsView(2, 1, [slot(2, available=1)], False)) is fresh
+    cache.slots("Основной", SlotsView(1, 1, [slot(2)], False))
+    assert (cache.hits, cache.misses) == (1, 3)
+
+
+def test_full_cache_drops_old_versions_first():
+    cache = ViewCache(max_entries=2)
+    cache.slots("Основной", SlotsView(1, 1, [slot(2)], False))
+    newer = cache.slots("Основной", SlotsView(2, 1, [slot(2)], False))
+    cache.slots("Основной", SlotsView(2, 1, [slot(3)], False))
+
+    assert cache.stats()["entries"] == 2
+    assert cache.slots("Основной", SlotsView(2, 1, [slot(2)], False)) is newer
@@ -0,0 +1,64 @@
+# tests/test_webhook.py
+import asyncio
+
+from aiogram import Bot, Dispatcher, Router
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.types import Message
+from aiohttp import web
+from aiogram.webhook.aiohttp_server import setup_application
+
+from storage import SQLiteStorage
+from webhook import QueuedRequestHandler
+
+
+def message_update(update_id: int, user_id: int) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Студент"},
+            "text": "привет",
+        },
+    }
+
+
+def test_queued_updates_are_handled_before_storage_closes(tmp_path):
+    path = str(tmp_path / "fsm.db")
+
+    async def serve_and_stop():
+        router = Router()
+
+        @router.message()
+        async def slow_handler(message: Message, state: FSMContext):
+            await asyncio.sleep(0.05)
+            await state.set_state("booking:confirmed")
+
+        dp = Dispatcher(storage=SQLiteStorage(path, ttl=3600, flush_delay=0))
+        dp.include_router(router)
+        bot = Bot(token="0:test")
+
+        app = web.Application()
+        setup_application(app, dp, bot=bot)
+        handler = QueuedRequestHandler(dp, bot, workers=2, queue_size=10)
+        handler.register(app, path="/webhook")
+
+        app.freeze()
+        await app.startup()
+        for user_id in (1, 2, 3):
+            handler._queue.put_nowait(message_update(user_id, user_id))
+        # Остановка сразу после приема: апдейты в очереди еще не обработаны
+        await app.shutdown()
+        await app.cleanup()
+
+        storage = SQLiteStorage(path, ttl=3600)
+        states = [
+            await storage.get_state(StorageKey(bot_id=0, chat_id=user_id, user_id=user_id))
+            for user_id in (1, 2, 3)
+        ]
+        await storage.close()
+        return states
+
+    assert asyncio.run(serve_and_stop()) == ["booking:confirmed"] * 3
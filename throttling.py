@@ -0,0 +1,38 @@
+# throttling.py
+import asyncio
+import threading
+import time
+
+
+class TokenBucket:
+    """Общий лимит частоты запросов (token bucket в форме GCRA).
+
+    acquire() резервирует ближайший свободный слот и ждет его. Состояние -
+    одно число под threading.Lock, без привязки к event loop, поэтому один
+    экземпляр можно делить между потоками и циклами событий.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._interval = 1 / rate
+        self._tat = 0.0  # теоретическое время прихода следующего запроса
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Занять слот; возвращает, сколько секунд нужно подождать до него"""
+        with self._lock:
+            now = time.monotonic()
+            tat = max(self._tat, now)
+            self._tat = tat + self._interval
+            return max(0.0, tat - now - (self.burst - 1) * self._interval)
+
+    async def acquire(self):
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def pause(self, seconds: float):
+        """Не выдавать слоты ближайшие seconds секунд (например, после RetryAfter)"""
+        with self._lock:
+            self._tat = max(self._tat, time.monotonic() + seconds)
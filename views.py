@@ -0,0 +1,85 @@
+# views.py
+import logging
+from typing import Dict, Tuple
+
+from aiogram.types import InlineKeyboardMarkup
+
+from gsheets import SlotsView
+from keyboards import slots_keyboard, tariffs_keyboard
+
+logger = logging.getLogger(__name__)
+
+MAX_ENTRIES = 512
+
+
+def render_slots(tariff: str, week: float, slots: list) -> Tuple[str, InlineKeyboardMarkup]:
+    """Текст со списком слотов и клавиатура выбора слота"""
+    slots_text = "\n".join([
+        f"{i}. {slot['date']} {slot['time']} ({slot['available']}/{slot['max_seats']} мест)"
+        for i, slot in enumerate(slots, 1)
+    ])
+    text = (
+        f"📅 Тариф: <b>{tariff}</b>\n"
+        f"🗓️ Неделя: <b>{int(week)}</b>\n\n"
+        f"🕐 Выберите удобное время:\n\n{slots_text}"
+    )
+    return text, slots_keyboard(slots, tariff, week)
+
+
+class ViewCache:
+    """Готовые тексты и клавиатуры выбора тарифа и слота.
+
+    Экран слотов одинаков для всех, кто видит один и тот же набор строк,
+    поэтому ключ - (версия снимка, тариф, неделя, строки): любая загрузка
+    или запись меняет свободные места, и новая версия просто не находит
+    старых записей. Записи прошлых версий удаляются, когда кэш заполнен, а
+    ответ по снимку старше последнего виденного не сохраняется вовсе.
+    Различие между пользователями (скрытые строки, где пользователь уже
+    записан) входит в ключ как кортеж строк, так что почти все попадают в
+    одну запись.
+    """
+
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._version = None  # последняя виденная версия снимка
+        self._slots: Dict[tuple, Tuple[str, InlineKeyboardMarkup]] = {}
+        self._tariffs: Dict[tuple, InlineKeyboardMarkup] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def slots(self, tariff: str, view: SlotsView) -> Tuple[str, InlineKeyboardMarkup]:
+        """Текст и клавиатура слотов из SlotsView (слоты уже отфильтрованы для пользователя)"""
+        key = (view.version, tariff, view.week, tuple(slot['row_index'] for slot in view.slots))
+        rendered = self._slots.get(key)
+        if rendered is not None:
+            self.hits += 1
+            return rendered
+
+        self.misses += 1
+        rendered = render_slots(tariff, view.week, view.slots)
+        if self._version is not None and view.version < self._version:
+            return rendered  # снимок уже заменен: такой экран больше никто не запросит
+        self._version = view.version
+
+        if len(self._slots) >= self.max_entries:
+            self._slots = {k: v for k, v in self._slots.items() if k[0] == self._version}
+            if len(self._slots) >= self.max_entries:
+                self._slots.clear()
+        self._slots[key] = rendered
+        return rendered
+
+    def tariffs(self, tariffs: list) -> InlineKeyboardMarkup:
+        """Клавиатура выбора тарифа (набор тарифов меняется редко)"""
+        key = tuple(tariffs)
+        markup = self._tariffs.get(key)
+        if markup is None:
+            if len(self._tariffs) >= self.max_entries:
+                self._tariffs.clear()
+            markup = self._tariffs[key] = tariffs_keyboard(tariffs)
+        return markup
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "version": self._version, "entries": len(self._slots)}
+
+
+view_cache = ViewCache()
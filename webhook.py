@@ -0,0 +1,129 @@
+# webhook.py
+import asyncio
+import logging
+import signal
+from typing import Any, Dict
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+
+class QueuedRequestHandler(SimpleRequestHandler):
+    """Прием апдейтов от Telegram с ограниченным пулом обработчиков.
+
+    Апдейт кладется в очередь и Telegram сразу получает 200, а обрабатывают
+    очередь workers задач. Если очередь заполнена, отвечаем 503: Telegram
+    придержит апдейт и пришлет его повторно, а не будет копиться в памяти.
+    """
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, workers: int, queue_size: int,
+                 secret_token: str = None, **data: Any):
+        super().__init__(dispatcher, bot, handle_in_background=True, secret_token=secret_token, **data)
+        self.workers = workers
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._tasks = []
+        self.rejected = 0
+
+    def register(self, app: web.Application, /, path: str, **kwargs: Any) -> None:
+        app.on_startup.append(self._start)
+        # Очередь дообрабатывается первой: хендлерам еще нужны FSM-хранилище и
+        # сессия бота, которые закрывают shutdown диспетчера и super().close()
+        app.on_shutdown.insert(0, self._drain)
+        super().register(app, path=path, **kwargs)
+
+    async def _start(self, *args):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logger.info(f"📥 Обработчиков апдейтов: {self.workers}, очередь: {self._queue.maxsize}")
+
+    async def _handle_request_background(self, bot: Bot, request: web.Request) -> web.Response:
+        try:
+            self._queue.put_nowait(await request.json(loads=bot.session.json_loads))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            if self.rejected % 100 == 1:
+                logger.warning(f"⚠️ Очередь апдейтов заполнена, Telegram повторит доставку (отклонено: {self.rejected})")
+            return web.Response(status=503, headers={"Retry-After": "1"})
+        return web.json_response({}, dumps=bot.session.json_dumps)
+
+    async def _worker(self):
+        while True:
+            update: Dict[str, Any] = await self._queue.get()
+            try:
+                await self._background_feed_update(self.bot, update)
+            except Exception as e:
+                logger.error(f"❌ Ошибка обработки апдейта {update.get('update_id')}: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _drain(self, *args):
+        await self.drain()
+
+    async def drain(self) -> None:
+        """Дообработать принятые апдейты и остановить обработчиков"""
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=config.WEBHOOK_DRAIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ Не дообработано апдейтов: {self._queue.qsize()}")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def close(self) -> None:
+        """Остановить обработчиков (если еще работают) и закрыть сессию бота"""
+        await self.drain()
+        await super().close()
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot, primary: bool = True):
+    """Запустить aiohttp-сервер для вебхука и работать до SIGINT/SIGTERM.
+
+    Несколько процессов слушают один порт (SO_REUSEPORT), ядро распределяет
+    между ними соединения от reverse proxy. Вебхук в Telegram регистрирует
+    только основной процесс.
+    """
+    app = web.Application()
+    # Остановка: очередь апдейтов (register ставит ее первой), shutdown
+    # диспетчера (напоминания, FSM), затем закрытие сессии бота
+    setup_application(app, dp, bot=bot)
+    handler = QueuedRequestHandler(
+        dp, bot,
+        workers=config.WEBHOOK_WORKERS,
+        queue_size=config.WEBHOOK_QUEUE_SIZE,
+        secret_token=config.WEBHOOK_SECRET or None,
+    )
+    handler.register(app, path=config.WEBHOOK_PATH)
+
+    runner = web.AppRunner(app, handle_signals=False)
+    await runner.setup()
+    site = web.TCPSite(runner, config.WEBHOOK_HOST, config.WEBHOOK_PORT, reuse_port=config.WEBHOOK_REUSE_PORT)
+    await site.start()
+    logger.info(f"🌐 Вебхук слушает {config.WEBHOOK_HOST}:{config.WEBHOOK_PORT}{config.WEBHOOK_PATH}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:  # Windows
+            pass
+
+    try:
+        if primary and config.WEBHOOK_URL:
+            await bot.set_webhook(
+                url=config.WEBHOOK_URL.rstrip("/") + config.WEBHOOK_PATH,
+                secret_token=config.WEBHOOK_SECRET or None,
+                max_connections=config.WEBHOOK_MAX_CONNECTIONS,
+                allowed_updates=dp.resolve_used_update_types(),
+            )
+            logger.info(f"✅ Вебхук зарегистрирован: {config.WEBHOOK_URL}")
+        await stop.wait()
+    finally:
+        await runner.cleanup()